@@ -0,0 +1,210 @@
+"""
+Native async implementations of hot read endpoints.
+
+DRF views are synchronous, so under ASGI every request holds a worker
+thread for its whole lifetime. The views registered here serve ``GET`` on
+the same URLs with the async ORM instead: authentication, permission
+checks, pagination and serialization run on the event loop, and a thread
+is only borrowed for the queries themselves. Every other method (and
+browsable-API requests) still goes to the DRF viewset, and responses are
+rendered with the API's configured JSON renderer so clients see the same
+bytes.
+
+The async views must load everything the serializer touches up front
+(``select_related``/``prefetch_related``); a lazy query from the event
+loop raises ``SynchronousOnlyOperation`` rather than silently blocking.
+"""
+
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.http import Http404, HttpResponse, HttpResponseBase
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from core.renderers import default_renderer
+from core.throttling import acheck, view_priority
+from users.authentication import principal_cache
+
+_jwt = JWTAuthentication()
+_renderer = default_renderer()
+_throttle = BaseThrottle()
+
+
+def render(data, status=200, allow=None, headers=None):
+    response = HttpResponse(
+        _renderer.render(data),
+        status=status,
+        content_type=_renderer.media_type,
+    )
+    response['Vary'] = 'Accept'
+    if allow:
+        response['Allow'] = allow
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def error_response(exc, allow=None):
+    """Render an API exception the way ``APIView.handle_exception`` does."""
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound()
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        exc.auth_header = _jwt.authenticate_header(None)
+    response = exception_handler(exc, {})
+    headers = {
+        name: response[name] for name in ('WWW-Authenticate', 'Retry-After') if response.has_header(name)
+    }
+    return render(response.data, status=response.status_code, allow=allow, headers=headers)
+
+
+async def authenticate(request):
+    """
+    Return the user for the request's JWT, or ``None`` when no token is
+    sent. Invalid tokens raise ``AuthenticationFailed``/``InvalidToken``.
+    """
+    header = _jwt.get_header(request)
+    if header is None:
+        return None
+    raw_token = _jwt.get_raw_token(header)
+    if raw_token is None:
+        return None
+    token = _jwt.get_validated_token(raw_token)
+    try:
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+    user = await principal_cache.aget(user_id)
+    if user is None:
+        raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+    return user
+
+
+def require_user(user):
+    if user is None:
+        raise exceptions.NotAuthenticated()
+    return user
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """``PageNumberPagination`` whose count and page fetch use the async ORM."""
+
+    async def apaginate_queryset(self, queryset, request):
+        self.request = request
+        paginator = Paginator(queryset, self.page_size)
+        # Assigning the cached property keeps Paginator from counting synchronously
+        paginator.count = await queryset.acount()
+
+        page_number = request.GET.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise exceptions.NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+
+        bottom = (number - 1) * paginator.per_page
+        objects = [obj async for obj in queryset[bottom:bottom + paginator.per_page]]
+        self.page = Page(objects, number, paginator)
+        return objects
+
+    def get_paginated_data(self, data):
+        return self.get_paginated_response(data).data
+
+
+def wants_browsable_api(request, kwargs):
+    fmt = kwargs.get('format')
+    if fmt is not None:
+        return fmt != 'json'
+    return 'text/html' in request.META.get('HTTP_ACCEPT', '')
+
+
+def allowed_methods(sync_view):
+    """The ``Allow`` header DRF would send for a router-generated viewset view."""
+    actions = sync_view.actions
+    available = set(actions) | {'options'}
+    if 'get' in actions:
+        available.add('head')
+    return ', '.join(
+        method.upper() for method in sync_view.cls.http_method_names if method in available
+    )
+
+
+def client_key(request):
+    """
+    Rate-limit key for requests not yet authenticated: the bearer token
+    (one per login) if sent, else the client IP.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if header:
+        return f'token:{hashlib.sha1(header.encode()).hexdigest()[:20]}'
+    return f'ip:{_throttle.get_ident(request)}'
+
+
+def with_sync_fallback(async_view, sync_view):
+    """
+    Serve JSON ``GET``s with ``async_view`` and everything else with
+    ``sync_view``. ``async_view`` returns response data, or a response of
+    its own (a 304, or one with extra headers).
+    """
+    sync_view_async = sync_to_async(sync_view)
+    allow = allowed_methods(sync_view)
+    priority = view_priority(sync_view.cls, sync_view.actions.get('get'))
+    source = sync_view.cls.__name__
+
+    async def view(request, *args, **kwargs):
+        if request.method != 'GET' or wants_browsable_api(request, kwargs):
+            return await sync_view_async(request, *args, **kwargs)
+        kwargs.pop('format', None)
+        # The DRF throttle, before authenticating so refusals stay cheap
+        wait = await acheck(priority, client_key(request), source)
+        if wait is not None:
+            return error_response(exceptions.Throttled(wait), allow)
+        try:
+            data = await async_view(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return error_response(exc, allow)
+        if isinstance(data, HttpResponseBase):
+            # The headers DRF's finalize_response adds to every response
+            data['Allow'] = allow
+            patch_vary_headers(data, ('Accept',))
+            return data
+        return render(data, allow=allow)
+
+    view.csrf_exempt = True
+    # Same label in request metrics as the viewset action it stands in for
+    view.cls = getattr(sync_view, 'cls', None)
+    view.actions = getattr(sync_view, 'actions', None)
+    view.initkwargs = getattr(sync_view, 'initkwargs', None)
+    view.__name__ = async_view.__name__
+    view.__module__ = async_view.__module__
+    return view
+
+
+def async_reads(urlpatterns, views):
+    """
+    Swap the callbacks of the named router patterns for async ``GET``
+    handlers, keeping the patterns (and format-suffix variants) unchanged.
+    """
+    patched = []
+    for pattern in urlpatterns:
+        async_view = views.get(getattr(pattern, 'name', None))
+        if isinstance(pattern, URLPattern) and async_view is not None:
+            pattern = URLPattern(
+                pattern.pattern,
+                with_sync_fallback(async_view, pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            )
+        patched.append(pattern)
+    return patched
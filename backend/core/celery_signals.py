@@ -0,0 +1,280 @@
+"""
+Celery signal hooks recording per-task metrics in the shared registry.
+
+Besides runtime and query counts, every published message is stamped with
+its enqueue time so the worker can record how long it waited in the queue,
+and periodic (beat) tasks hold a short-lived "running" marker so a run that
+starts before the previous one finished is counted as an overlap.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+)
+from django.conf import settings
+
+from .instrumentation import QueryStats
+from .metrics import SIZE_BUCKETS, histogram_quantile, merge_snapshots, registry
+
+logger = logging.getLogger(__name__)
+
+ENQUEUED_AT_HEADER = 'zotpot_enqueued_at'
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0)
+RUNTIME_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+task_runs = registry.counter(
+    'zotpot_task_runs_total',
+    'Celery task executions by task name and final state.',
+    ['task', 'state'],
+)
+task_duration = registry.histogram(
+    'zotpot_task_duration_seconds',
+    'Celery task runtime by task name.',
+    ['task'],
+    buckets=RUNTIME_BUCKETS,
+)
+task_queue_latency = registry.histogram(
+    'zotpot_task_queue_latency_seconds',
+    'Time between a task being enqueued (or its ETA) and a worker starting it.',
+    ['task'],
+    buckets=LATENCY_BUCKETS,
+)
+task_retries = registry.counter(
+    'zotpot_task_retries_total',
+    'Celery task retries by task name.',
+    ['task'],
+)
+task_failures = registry.counter(
+    'zotpot_task_failures_total',
+    'Celery task failures by task name and exception type.',
+    ['task', 'exception'],
+)
+task_overlaps = registry.counter(
+    'zotpot_task_overlaps_total',
+    'Periodic task runs that started while a previous run was still going.',
+    ['task'],
+)
+task_in_progress = registry.gauge(
+    'zotpot_task_in_progress',
+    'Celery tasks currently executing.',
+    ['task'],
+)
+task_queries = registry.counter(
+    'zotpot_task_db_queries_total',
+    'Database queries issued by Celery tasks.',
+    ['task'],
+)
+task_query_seconds = registry.counter(
+    'zotpot_task_db_query_seconds_total',
+    'Time spent in database queries by Celery tasks.',
+    ['task'],
+)
+task_result_bytes = registry.histogram(
+    'zotpot_task_result_bytes',
+    'Serialized task result size by task name.',
+    ['task'],
+    buckets=SIZE_BUCKETS,
+)
+
+_running = {}
+
+
+class RunMarkers:
+    """
+    "Task X is running" markers for periodic tasks.
+
+    Stored in the metrics Redis so runs in different worker processes see
+    each other; without it, markers only cover the current process.
+    """
+
+    prefix = 'zotpot:task-running:'
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, task_id, timeout):
+        """Mark ``name`` as running; return the id of a run already holding it."""
+        client = registry._shared_client()
+        if client is not None:
+            try:
+                if client.set(self.prefix + name, task_id, nx=True, ex=timeout):
+                    return None
+                holder = client.get(self.prefix + name)
+                return holder.decode() if holder else 'unknown'
+            except Exception:
+                return None
+
+        now = time.monotonic()
+        with self._lock:
+            holder = self._local.get(name)
+            if holder is not None and holder[1] > now:
+                return holder[0]
+            self._local[name] = (task_id, now + timeout)
+            return None
+
+    def release(self, name, task_id):
+        client = registry._shared_client()
+        if client is not None:
+            try:
+                holder = client.get(self.prefix + name)
+                if holder is not None and holder.decode() == task_id:
+                    client.delete(self.prefix + name)
+            except Exception:
+                pass
+            return
+
+        with self._lock:
+            holder = self._local.get(name)
+            if holder is not None and holder[0] == task_id:
+                del self._local[name]
+
+
+run_markers = RunMarkers()
+_periodic_names = None
+
+
+def periodic_task_names(app):
+    global _periodic_names
+    if _periodic_names is None:
+        schedule = app.conf.beat_schedule or {}
+        _periodic_names = {entry['task'] for entry in schedule.values()}
+    return _periodic_names
+
+
+def _timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    if headers is not None:
+        # Overwrite rather than setdefault: retries reuse the original headers
+        headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect
+def start_task_metrics(task_id=None, task=None, **kwargs):
+    name = task.name
+    request = task.request
+
+    enqueued_at = _timestamp(getattr(request, ENQUEUED_AT_HEADER, None))
+    if enqueued_at is not None:
+        # A countdown/ETA task is not late until its ETA has passed
+        eta = _timestamp(getattr(request, 'eta', None))
+        ready_at = max(enqueued_at, eta) if eta else enqueued_at
+        task_queue_latency.observe(max(time.time() - ready_at, 0.0), task=name)
+
+    periodic = name in periodic_task_names(task.app)
+    if periodic:
+        timeout = getattr(settings, 'CELERY_TASK_OVERLAP_TIMEOUT', 3600)
+        holder = run_markers.acquire(name, task_id, timeout)
+        if holder is not None:
+            task_overlaps.inc(task=name)
+            logger.warning('Periodic task %s (%s) started while run %s is still going',
+                           name, task_id, holder)
+
+    task_in_progress.inc(task=name)
+    stats = QueryStats()
+    stats.start()
+    _running[task_id] = (time.perf_counter(), stats, periodic)
+
+
+@task_postrun.connect
+def finish_task_metrics(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is None:
+        return
+    start, stats, periodic = started
+    stats.stop()
+
+    name = task.name
+    task_in_progress.dec(task=name)
+    if periodic:
+        run_markers.release(name, task_id)
+
+    task_runs.inc(task=name, state=state or 'UNKNOWN')
+    task_duration.observe(time.perf_counter() - start, task=name)
+    if stats.count:
+        task_queries.inc(stats.count, task=name)
+        task_query_seconds.inc(stats.duration, task=name)
+    try:
+        task_result_bytes.observe(len(json.dumps(retval, default=str)), task=name)
+    except (TypeError, ValueError):
+        pass
+
+    registry.maybe_publish()
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    task_retries.inc(task=sender.name)
+
+
+@task_failure.connect
+def count_task_failure(sender=None, exception=None, **kwargs):
+    task_failures.inc(task=sender.name, exception=type(exception).__name__)
+
+
+def _by_task(metric):
+    totals = {}
+    for key, value in (metric or {}).get('values', {}).items():
+        totals[key[0]] = totals.get(key[0], 0) + value
+    return totals
+
+
+def task_summary(snapshots=None):
+    """Per-task rows (runs, failures, retries, overlaps, runtime and latency quantiles)."""
+    merged = merge_snapshots(snapshots)
+    runs = _by_task(merged.get('zotpot_task_runs_total'))
+    retries = _by_task(merged.get('zotpot_task_retries_total'))
+    failures = _by_task(merged.get('zotpot_task_failures_total'))
+    overlaps = _by_task(merged.get('zotpot_task_overlaps_total'))
+    running = _by_task(merged.get('zotpot_task_in_progress'))
+
+    def quantiles(metric_name):
+        metric = merged.get(metric_name)
+        if metric is None:
+            return {}
+        result = {}
+        for (name,), (counts, total, count) in metric['values'].items():
+            result[name] = {
+                'mean': total / count if count else None,
+                'p50': histogram_quantile(0.5, metric['buckets'], counts),
+                'p95': histogram_quantile(0.95, metric['buckets'], counts),
+                'p99': histogram_quantile(0.99, metric['buckets'], counts),
+            }
+        return result
+
+    runtime = quantiles('zotpot_task_duration_seconds')
+    latency = quantiles('zotpot_task_queue_latency_seconds')
+
+    rows = []
+    for name in sorted(set(runs) | set(runtime) | set(latency) | set(running)):
+        rows.append({
+            'task': name,
+            'runs': runs.get(name, 0),
+            'failures': failures.get(name, 0),
+            'retries': retries.get(name, 0),
+            'overlaps': overlaps.get(name, 0),
+            'running': running.get(name, 0),
+            'runtime': runtime.get(name, {}),
+            'queue_latency': latency.get(name, {}),
+        })
+    return rows
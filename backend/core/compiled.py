@@ -0,0 +1,350 @@
+"""
+Compiled read-only serializers.
+
+DRF serializes an object by walking its fields generically: a
+``get_attribute`` call that loops over the source path, ``SkipField``
+handling and a ``to_representation`` dispatch per field, plus the same for
+every nested serializer. On a page of products with variants, or an order
+with items, that walk is most of the response time.
+
+``compile_serializer`` turns a serializer class into a plain function,
+generated once from its fields, that builds the same dict with direct
+attribute reads and the conversions inlined. Field types it does not know
+call the field's own ``to_representation``, and attribute paths it cannot
+resolve from the model (methods, dotted paths with nullable hops) go through
+DRF's ``get_attribute``, so the output always matches the serializer; the
+``check_compiled_serializers`` command compares the two over real rows.
+
+Serializers that override ``to_representation`` are not compiled.
+``CompiledSerializerMixin`` uses compiled serializers for a viewset's read
+actions when the response is JSON; the browsable API still gets the real
+serializer, which it needs for its forms.
+"""
+
+import datetime
+import decimal
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.db import models
+from django.utils import timezone
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.fields import ISO_8601, SkipField
+from rest_framework.serializers import ReturnDict, ReturnList
+from rest_framework.settings import api_settings
+
+_compiled = {}
+_file_url_caches = []
+MAX_FILE_URLS = 10000
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def _overrides(field, base, name='to_representation'):
+    return getattr(type(field), name) is not getattr(base, name)
+
+
+_SKIP = object()
+
+
+def _attribute(field, unwrap_pk):
+    """DRF's lookup for ``field``, returning ``_SKIP`` for ``SkipField``."""
+    get_attribute = field.get_attribute
+
+    def attribute(instance):
+        try:
+            value = get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        if isinstance(value, relations.PKOnlyObject):
+            if value.pk is None or unwrap_pk:
+                return value.pk
+        elif unwrap_pk and isinstance(value, models.Model):
+            return value.pk
+        return value
+
+    return attribute
+
+
+def _pk_field(field):
+    return (
+        isinstance(field, relations.PrimaryKeyRelatedField)
+        and field.pk_field is None
+        and not _overrides(field, relations.PrimaryKeyRelatedField)
+    )
+
+
+class _Compiler:
+    def __init__(self):
+        self.namespace = {
+            'OrderedDict': OrderedDict,
+            'Decimal': decimal.Decimal,
+            'BaseManager': models.manager.BaseManager,
+            'ObjectDoesNotExist': ObjectDoesNotExist,
+            '_SKIP': _SKIP,
+            '_iso_datetime': _iso_datetime,
+        }
+        self.counter = 0
+
+    def name(self, prefix, value):
+        self.counter += 1
+        name = f'_{prefix}{self.counter}'
+        self.namespace[name] = value
+        return name
+
+    def compile(self, serializer):
+        if _overrides(serializer, serializers.Serializer):
+            raise NotCompilable(f'{type(serializer).__name__} overrides to_representation')
+        self.counter += 1
+        function_name = f'_serialize{self.counter}'
+        lines = [f'def {function_name}(instance, request, env):', '    ret = OrderedDict()']
+        for field in serializer._readable_fields:
+            lines.extend('    ' + line for line in self.field(serializer, field))
+        lines.append('    return ret')
+        exec('\n'.join(lines), self.namespace)
+        return self.namespace[function_name]
+
+    def field(self, serializer, field):
+        getter = self.getter(serializer, field)
+        # Primary keys come out of the lookup unwrapped, ready to output
+        slow = self.name('attribute', _attribute(field, unwrap_pk=_pk_field(field)))
+        if getter is None:
+            lines = [f'value = {slow}(instance)']
+        else:
+            lines = [
+                'try:',
+                f'    value = {getter}',
+                'except ObjectDoesNotExist:',
+                '    value = None',
+                'except Exception:',
+                # Let DRF decide: a default, None, a skipped field or the error
+                f'    value = {slow}(instance)',
+            ]
+        return lines + [
+            'if value is not _SKIP:',
+            f'    ret[{field.field_name!r}] = None if value is None else {self.converter(field)}',
+        ]
+
+    def getter(self, serializer, field):
+        """A direct attribute expression for ``field``'s value, if safe."""
+        model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+        attrs = field.source_attrs
+        if model is None or len(attrs) != 1 or not attrs[0].isidentifier():
+            return None
+        attr = attrs[0]
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # Properties are read as attributes; methods would need calling
+            if isinstance(getattr(model, attr, None), property):
+                return f'instance.{attr}'
+            return None
+        if _pk_field(field):
+            if model_field.concrete and (model_field.many_to_one or model_field.one_to_one):
+                return f'instance.{model_field.attname}'
+            return None
+        if model_field.many_to_many:
+            return None
+        return f'instance.{attr}'
+
+    def converter(self, field):
+        """An expression converting ``value`` (never ``None``) like ``field.to_representation``."""
+        if isinstance(field, serializers.ListSerializer):
+            child = self.name('serialize', self.compile(field.child))
+            return (
+                f'[{child}(item, request, env) for item in '
+                f'(value.all() if isinstance(value, BaseManager) else value)]'
+            )
+        if isinstance(field, serializers.Serializer):
+            nested = self.name('serialize', self.compile(field))
+            return f'{nested}(value, request, env)'
+        if _pk_field(field):
+            return 'value'
+
+        to_representation = self.name('to_representation', field.to_representation)
+        kind = type(field)
+        if kind is drf_fields.IntegerField:
+            return 'int(value)'
+        if kind in (drf_fields.CharField, drf_fields.EmailField, drf_fields.SlugField, drf_fields.URLField):
+            return 'str(value)'
+        if kind is drf_fields.BooleanField:
+            return f'(value if value is True or value is False else {to_representation}(value))'
+        if kind is drf_fields.ChoiceField:
+            choices = self.name('choices', field.choice_strings_to_values.get)
+            return f"(value if value == '' else {choices}(str(value), value))"
+        if kind is drf_fields.ReadOnlyField:
+            return 'value'
+        if kind is drf_fields.JSONField and not field.binary:
+            return 'value'
+        if kind is drf_fields.DecimalField:
+            fast = self.decimal(field)
+            if fast is not None:
+                return f'({fast} if value.__class__ is Decimal else {to_representation}(value))'
+        if kind in (drf_fields.FileField, drf_fields.ImageField):
+            return self.file(field)
+        if kind is drf_fields.DateTimeField and not hasattr(field, 'timezone'):
+            output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+            if output_format is not None and output_format.lower() == ISO_8601:
+                return f'_iso_datetime(value, env.tz, {to_representation})'
+        return f'{to_representation}(value)'
+
+    def decimal(self, field):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.decimal_places is None:
+            return None
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        # DecimalField.quantize, with its exponent and context built once
+        exponent = self.name('exponent', decimal.Decimal('.1') ** field.decimal_places)
+        context = self.name('context', context)
+        rounding = self.name('rounding', field.rounding)
+        return f"'{{:f}}'.format(value.quantize({exponent}, rounding={rounding}, context={context}))"
+
+    def file(self, field):
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return '(value.name if value else None)'
+        url = self.name('file_url', _file_url_function())
+        return f'{url}(value, request, env.origin)'
+
+
+def _file_url_function():
+    """
+    ``FileField.to_representation`` with ``use_url`` for one field. URLs of
+    files on the local filesystem storage depend only on the name and the
+    request's origin, so they are remembered.
+    """
+    urls = {}
+    _file_url_caches.append(urls)
+    cacheable = None
+
+    def file_url(value, request, origin):
+        nonlocal cacheable
+        if not value:
+            return None
+        if cacheable is None:
+            cacheable = isinstance(value.storage, FileSystemStorage)
+        if cacheable:
+            url = urls.get((value.name, origin))
+            if url is not None:
+                return url
+        try:
+            url = value.url
+        except AttributeError:
+            return None
+        if request is not None:
+            # A relative URL would resolve against the request path
+            if not url.startswith('/') and '://' not in url:
+                return request.build_absolute_uri(url)
+            url = request.build_absolute_uri(url)
+        if cacheable:
+            if len(urls) >= MAX_FILE_URLS:
+                urls.clear()
+            urls[value.name, origin] = url
+        return url
+
+    return file_url
+
+
+def _clear_file_urls(**kwargs):
+    for urls in _file_url_caches:
+        urls.clear()
+
+
+setting_changed.connect(_clear_file_urls)
+
+
+def _iso_datetime(value, tz, to_representation):
+    """``DateTimeField.to_representation`` for aware datetimes, with the timezone looked up once."""
+    if value.__class__ is not datetime.datetime or tz is None or value.utcoffset() is None:
+        return to_representation(value)
+    try:
+        value = value.astimezone(tz)
+    except OverflowError:
+        return to_representation(value)
+    text = value.isoformat()
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+def compile_serializer(serializer_class):
+    """
+    The compiled ``function(instance, request, env)`` for ``serializer_class``,
+    or ``None`` if it can't be compiled. Compiled once per class.
+    """
+    try:
+        return _compiled[serializer_class]
+    except KeyError:
+        pass
+    try:
+        function = _Compiler().compile(serializer_class())
+    except NotCompilable:
+        function = None
+    _compiled[serializer_class] = function
+    return function
+
+
+class Env:
+    """Per-response values the compiled functions would otherwise look up per field."""
+
+    __slots__ = ('tz', 'origin')
+
+    def __init__(self, request):
+        self.tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        # Scheme and host that absolute file URLs are built on
+        self.origin = request.build_absolute_uri('/') if request is not None else None
+
+
+class CompiledSerializer:
+    """The read side of a serializer (``.data``) backed by a compiled function."""
+
+    def __init__(self, function, instance=None, many=False, context=None, **kwargs):
+        self.function = function
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        function = self.function
+        request = self.context.get('request')
+        env = Env(request)
+        if self.many:
+            iterable = self.instance.all() if isinstance(self.instance, models.manager.BaseManager) else self.instance
+            return ReturnList([function(item, request, env) for item in iterable], serializer=self)
+        return ReturnDict(function(self.instance, request, env), serializer=self)
+
+
+def serialize(serializer_class, instance, many=False, context=None):
+    """``serializer_class(instance, many=many, context=context).data``, compiled when possible."""
+    function = compile_serializer(serializer_class)
+    if function is None:
+        return serializer_class(instance, many=many, context=context).data
+    return CompiledSerializer(function, instance, many=many, context=context).data
+
+
+class CompiledSerializerMixin:
+    """
+    Serialize read actions (``compiled_actions``) with the compiled form of
+    the view's serializer class when rendering JSON.
+    """
+
+    compiled_actions = ('list', 'retrieve')
+
+    def get_serializer(self, *args, **kwargs):
+        if (
+            self.action in self.compiled_actions
+            and 'data' not in kwargs
+            and getattr(getattr(self.request, 'accepted_renderer', None), 'format', None) == 'json'
+        ):
+            function = compile_serializer(self.get_serializer_class())
+            if function is not None:
+                kwargs.setdefault('context', self.get_serializer_context())
+                return CompiledSerializer(function, *args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
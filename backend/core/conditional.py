@@ -0,0 +1,176 @@
+"""
+Conditional ``GET`` (``ETag``/``Last-Modified``) for list and detail reads.
+
+Clients poll order and product detail far more often than those rows
+change. Before running the serializer, a view computes a validator for the
+response from timestamps alone, with one aggregate query over the same
+queryset it would serialize: the newest ``updated_at`` of the rows, the
+newest timestamp of each related table the representation nests
+(``conditional_fields``), and row counts so deletions change it too. When
+the client's ``If-None-Match``/``If-Modified-Since`` still matches, the
+response is a bodiless 304.
+
+Related rows without a timestamp of their own (product variants and
+images) bump their parent's ``updated_at`` when saved or deleted instead,
+or are covered by a lookup on their id, whose count changes when one is
+deleted (order items).
+"""
+
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+Validators = namedtuple('Validators', ['etag', 'last_modified'])
+
+
+def _one_to_many(model, field):
+    """
+    Split a lookup at its first reverse foreign key, reached directly
+    (``'payments__updated_at'``) or through forward relations
+    (``'customer__addresses__updated_at'``): ``(path to the parent, the
+    relation, the rest)``, with no relation when there is none.
+    """
+    parts = field.split('__')
+    for index, name in enumerate(parts[:-1]):
+        relation = model._meta.get_field(name)
+        if relation.one_to_many:
+            return '__'.join(parts[:index]), relation, '__'.join(parts[index + 1:])
+        if not relation.is_relation:
+            break
+        model = relation.related_model
+    return '', None, field
+
+
+def _aggregates(model, fields):
+    """
+    Annotations and aggregates for one query over the parent rows. Nested
+    rows reached through a reverse foreign key are summarised per parent in
+    a correlated subquery, so several of them never multiply each other in
+    one join.
+    """
+    annotations = {}
+    aggregates = {'count': Count('pk')}
+    for index, field in enumerate(fields):
+        prefix, relation, rest = _one_to_many(model, field)
+        if relation is not None:
+            parent = relation.field.name
+            rows = relation.related_model._default_manager.filter(
+                **{parent: OuterRef(prefix or 'pk')}
+            ).order_by().values(parent)
+            annotations[f'_max{index}'] = Subquery(rows.annotate(value=Max(rest)).values('value'))
+            annotations[f'_count{index}'] = Subquery(rows.annotate(value=Count('pk')).values('value'))
+            aggregates[f'max{index}'] = Max(f'_max{index}')
+            aggregates[f'count{index}'] = Sum(f'_count{index}')
+        else:
+            aggregates[f'max{index}'] = Max(field)
+    return annotations, aggregates
+
+
+def _values(queryset, fields):
+    annotations, aggregates = _aggregates(queryset.model, fields)
+    return queryset.order_by().annotate(**annotations), aggregates
+
+
+def _validators(values, fmt, detail):
+    if detail and not values['count']:
+        # Missing or not visible: let the view answer as usual
+        return None
+    # Id lookups (``'items__id'``) count rows but are not times
+    timestamps = [
+        value for name, value in values.items()
+        if name.startswith('max') and isinstance(value, datetime)
+    ]
+    state = ','.join(f'{name}={values[name]!r}' for name in sorted(values))
+    digest = hashlib.sha1(f'{fmt};{state}'.encode()).hexdigest()
+    return Validators(
+        etag=f'W/"{digest[:32]}"',
+        # HTTP dates have whole seconds
+        last_modified=int(max(timestamps).timestamp()) if timestamps else None,
+    )
+
+
+def validators_for(queryset, fields, fmt='json', detail=False):
+    """
+    ``Validators`` for a response rendering ``queryset`` in ``fmt``, or
+    ``None`` when ``detail`` is set and the queryset is empty.
+    """
+    queryset, aggregates = _values(queryset, fields)
+    values = queryset.aggregate(**aggregates)
+    return _validators(values, fmt, detail)
+
+
+async def avalidators_for(queryset, fields, fmt='json', detail=False):
+    """``validators_for`` with the async ORM."""
+    queryset, aggregates = _values(queryset, fields)
+    values = await queryset.aaggregate(**aggregates)
+    return _validators(values, fmt, detail)
+
+
+def validator_headers(validators):
+    headers = {'ETag': validators.etag}
+    if validators.last_modified is not None:
+        headers['Last-Modified'] = http_date(validators.last_modified)
+    return headers
+
+
+def not_modified(request, validators):
+    """The 304 (or 412) response if the request's preconditions say so."""
+    if validators is None:
+        return None
+    response = get_conditional_response(
+        request, etag=validators.etag, last_modified=validators.last_modified
+    )
+    if response is not None:
+        for name, value in validator_headers(validators).items():
+            response[name] = value
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer ``list`` and ``retrieve`` with 304 when the client's copy is
+    current, and send ``ETag``/``Last-Modified`` with full responses.
+
+    ``conditional_fields`` names the timestamps that change whenever the
+    representation does: the model's own ``updated_at`` plus, for nested
+    related rows, their timestamps as lookups (``'payments__updated_at'``).
+    """
+
+    conditional_fields = ('updated_at',)
+
+    def get_validators(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        detail = self.action == 'retrieve'
+        if detail:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, ValidationError):
+                return None
+        fmt = getattr(self.request.accepted_renderer, 'format', 'json')
+        try:
+            return validators_for(queryset, self.conditional_fields, fmt, detail)
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def conditional(self, handler, request, *args, **kwargs):
+        validators = self.get_validators()
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        response = handler(request, *args, **kwargs)
+        if validators is not None and response.status_code == 200:
+            for name, value in validator_headers(validators).items():
+                response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,470 @@
+"""
+Deterministic synthetic data for scale testing.
+
+Rows are generated as plain tuples with explicit primary keys, so foreign
+keys can be wired up without reading anything back, and written in chunks
+with ``COPY`` on PostgreSQL or ``bulk_create`` elsewhere. Distributions:
+
+* product popularity is Zipf-like (a few products dominate order lines);
+* addresses and agent positions cluster around a handful of city hubs;
+* orders follow lunch/dinner peaks, and delivered orders carry a tracking
+  trail that moves from the agent's start point to the customer.
+"""
+
+import csv
+import io
+import json
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connections, models, transaction
+
+from orders.models import Order, OrderItem, OrderTracking, Payment
+from products.models import Category, Product, ProductImage, ProductVariant
+from users.models import Address, DeliveryAgent, User
+
+HUBS = [
+    # (latitude, longitude, weight)
+    (12.9716, 77.5946, 0.30),
+    (12.9352, 77.6245, 0.20),
+    (13.0358, 77.5970, 0.15),
+    (12.9121, 77.6446, 0.15),
+    (12.9698, 77.7500, 0.10),
+    (13.0100, 77.5100, 0.10),
+]
+
+# Share of orders by hour of day (UTC+5:30 local peaks at 13:00 and 20:00)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 7, 10, 12, 9, 6, 5, 5, 6, 8, 12, 13, 10, 6, 3]
+
+STATUS_FLOW = ['pending', 'confirmed', 'preparing', 'out_for_delivery', 'delivered']
+NULL = '\\N'
+
+
+class Writer:
+    """Insert tuples for one model in chunks, via COPY where available."""
+
+    def __init__(self, using='default', chunk_size=20000):
+        self.connection = connections[using]
+        self.using = using
+        self.chunk_size = chunk_size
+        self.use_copy = self.connection.vendor == 'postgresql'
+        self.counts = {}
+
+    def write(self, model, fields, rows):
+        columns = [model._meta.get_field(name).column for name in fields]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._flush(model, fields, columns, chunk)
+                chunk = []
+        if chunk:
+            self._flush(model, fields, columns, chunk)
+
+    def _converters(self, model, fields):
+        """Per-column text conversions COPY needs, resolved once per flush."""
+        converters = []
+        for index, name in enumerate(fields):
+            field = model._meta.get_field(name)
+            if isinstance(field, models.JSONField):
+                converters.append((index, json.dumps))
+            elif isinstance(field, models.DateTimeField):
+                converters.append((index, datetime.isoformat))
+        return converters
+
+    def _flush(self, model, fields, columns, rows):
+        if self.use_copy:
+            converters = self._converters(model, fields)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                if converters:
+                    row = list(row)
+                    for index, convert in converters:
+                        if row[index] is not None:
+                            row[index] = convert(row[index])
+                writer.writerow([NULL if value is None else value for value in row])
+            buffer.seek(0)
+            with self.connection.cursor() as cursor:
+                cursor.cursor.copy_expert(
+                    f'COPY {model._meta.db_table} ({", ".join(columns)}) '
+                    f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')",
+                    buffer,
+                )
+        else:
+            with explicit_timestamps(model):
+                model.objects.using(self.using).bulk_create(
+                    [model(**dict(zip(fields, row))) for row in rows],
+                    batch_size=999 // len(fields) or 1,
+                )
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(rows)
+
+    def reset_sequences(self, models):
+        statements = self.connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with self.connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep generated created_at/updated_at values."""
+    toggled = []
+    for field in model._meta.concrete_fields:
+        for flag in ('auto_now', 'auto_now_add'):
+            if getattr(field, flag, False):
+                setattr(field, flag, False)
+                toggled.append((field, flag))
+    try:
+        yield
+    finally:
+        for field, flag in toggled:
+            setattr(field, flag, True)
+
+
+def next_id(model, using):
+    last = model.objects.using(using).order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+class DatasetGenerator:
+    def __init__(self, orders, customers, agents, products, categories=40, days=365,
+                 end=None, seed=42, using='default', chunk_size=20000, stdout=None):
+        self.rng = random.Random(seed)
+        self.orders = orders
+        self.customers = customers
+        self.agents = agents
+        self.products = products
+        self.categories = categories
+        self.days = days
+        self.end = end or datetime.combine(datetime.now(dt_timezone.utc).date(), dt_time(), dt_timezone.utc)
+        self.seed = seed
+        self.using = using
+        self.writer = Writer(using=using, chunk_size=chunk_size)
+        self.stdout = stdout
+
+        self.hub_weights = [hub[2] for hub in HUBS]
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def point_near_hub(self, spread=0.03):
+        lat, lng, _ = self.rng.choices(HUBS, weights=self.hub_weights)[0]
+        return round(lat + self.rng.gauss(0, spread), 6), round(lng + self.rng.gauss(0, spread), 6)
+
+    def run(self):
+        """
+        Generate everything, committing the catalog, the people and each
+        chunk of orders on their own, so a failure late in a large run keeps
+        what was written before it.
+        """
+        try:
+            with transaction.atomic(using=self.using):
+                self.generate_catalog()
+            with transaction.atomic(using=self.using):
+                self.generate_people()
+            self.generate_orders()
+        finally:
+            # Committed rows have explicit ids, even if the run stopped early
+            self.writer.reset_sequences([
+                Category, Product, ProductVariant, ProductImage, User, Address,
+                DeliveryAgent, Order, OrderItem, OrderTracking, Payment,
+            ])
+        return self.writer.counts
+
+    # Catalog
+
+    def generate_catalog(self):
+        rng = self.rng
+        created = self.end - timedelta(days=self.days + 30)
+
+        category_start = next_id(Category, self.using)
+        self.category_ids = list(range(category_start, category_start + self.categories))
+        self.writer.write(
+            Category,
+            ['id', 'name', 'description', 'image', 'is_active', 'created_at', 'updated_at'],
+            (
+                (category_id, f'Category {index}', '', None, True, created, created)
+                for index, category_id in enumerate(self.category_ids)
+            ),
+        )
+
+        product_start = next_id(Product, self.using)
+        self.product_ids = list(range(product_start, product_start + self.products))
+        self.product_prices = [Decimal(rng.randint(20, 900)) for _ in self.product_ids]
+        self.product_names = [f'Product {index}' for index in range(self.products)]
+        self.writer.write(
+            Product,
+            ['id', 'category_id', 'name', 'description', 'price', 'image', 'stock',
+             'stock_shards', 'is_available', 'created_at', 'updated_at'],
+            (
+                (
+                    product_id, rng.choice(self.category_ids), self.product_names[index],
+                    'Synthetic product', self.product_prices[index], f'products/{product_id}.jpg',
+                    rng.randint(0, 500), 0, True, created, created,
+                )
+                for index, product_id in enumerate(self.product_ids)
+            ),
+        )
+
+        # Zipf-like popularity over a shuffled ranking
+        ranking = list(range(self.products))
+        rng.shuffle(ranking)
+        weights = [0.0] * self.products
+        for rank, index in enumerate(ranking, start=1):
+            weights[index] = 1 / rank ** 1.1
+        self.product_cum_weights = list(_accumulate(weights))
+
+        variant_id = next_id(ProductVariant, self.using)
+        self.product_variants = {}
+        variant_rows = []
+        for index, product_id in enumerate(self.product_ids):
+            for name, adjustment in (('Regular', 0), ('Large', 15), ('Family', 40))[:rng.randint(0, 3)]:
+                variant_rows.append((
+                    variant_id, product_id, name, Decimal(adjustment), rng.randint(0, 200), True,
+                ))
+                self.product_variants.setdefault(index, []).append((variant_id, Decimal(adjustment), name))
+                variant_id += 1
+        self.writer.write(
+            ProductVariant,
+            ['id', 'product_id', 'name', 'price_adjustment', 'stock', 'is_available'],
+            variant_rows,
+        )
+
+        image_id = next_id(ProductImage, self.using)
+        image_rows = []
+        # What Product.primary_image_url() gives, for the order item snapshots
+        self.product_image_urls = []
+        for product_id in self.product_ids:
+            primary = f'products/{product_id}.jpg'
+            for position in range(rng.randint(0, 3)):
+                image = f'products/{product_id}-{position}.jpg'
+                image_rows.append((image_id, product_id, image, position == 0, created))
+                image_id += 1
+                if position == 0:
+                    primary = image
+            self.product_image_urls.append(default_storage.url(primary))
+        self.writer.write(ProductImage, ['id', 'product_id', 'image', 'is_primary', 'created_at'], image_rows)
+        self.log(f'catalog: {self.products} products, {len(variant_rows)} variants, {len(image_rows)} images')
+
+    # Users, addresses and agents
+
+    def generate_people(self):
+        rng = self.rng
+        password = make_password('zotpot-synthetic')
+        joined = self.end - timedelta(days=self.days + 30)
+
+        user_start = next_id(User, self.using)
+        self.customer_ids = list(range(user_start, user_start + self.customers))
+        self.agent_ids = list(range(user_start + self.customers, user_start + self.customers + self.agents))
+        tag = f's{self.seed}u{user_start}'
+
+        def users():
+            for user_id in self.customer_ids:
+                yield self._user_row(user_id, tag, 'customer', password, joined)
+            for user_id in self.agent_ids:
+                yield self._user_row(user_id, tag, 'delivery_agent', password, joined)
+
+        self.writer.write(
+            User,
+            ['id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+             'is_staff', 'is_active', 'date_joined', 'phone', 'role', 'avatar', 'fcm_token',
+             'updated_at'],
+            users(),
+        )
+
+        address_id = next_id(Address, self.using)
+        self.customer_addresses = []
+        address_rows = []
+        for user_id in self.customer_ids:
+            addresses = []
+            for position in range(1 if rng.random() < 0.75 else 2):
+                lat, lng = self.point_near_hub()
+                address_rows.append((
+                    address_id, user_id, 'Home' if position == 0 else 'Office',
+                    f'{rng.randint(1, 999)} Main Road', '', 'Bengaluru', 'Karnataka',
+                    f'560{rng.randint(0, 99):03d}', 'India', position == 0,
+                    Decimal(str(lat)), Decimal(str(lng)), joined,
+                ))
+                addresses.append((address_id, lat, lng))
+                address_id += 1
+            self.customer_addresses.append(addresses)
+        self.writer.write(
+            Address,
+            ['id', 'user_id', 'title', 'address_line1', 'address_line2', 'city', 'state',
+             'postal_code', 'country', 'is_default', 'latitude', 'longitude', 'updated_at'],
+            address_rows,
+        )
+
+        agent_id = next_id(DeliveryAgent, self.using)
+        agent_rows = []
+        for offset, user_id in enumerate(self.agent_ids):
+            lat, lng = self.point_near_hub(spread=0.05)
+            agent_rows.append((
+                agent_id + offset, user_id, f'KA{rng.randint(1, 60):02d}S{offset:06d}',
+                rng.choice(['bike', 'scooter', 'bicycle']), f'DL{offset:08d}', rng.random() < 0.6,
+                {'latitude': lat, 'longitude': lng}, Decimal(f'{rng.uniform(3.5, 5):.2f}'), 0, joined,
+            ))
+        self.writer.write(
+            DeliveryAgent,
+            ['id', 'user_id', 'vehicle_number', 'vehicle_type', 'license_number', 'is_available',
+             'current_location', 'rating', 'total_deliveries', 'updated_at'],
+            agent_rows,
+        )
+        self.log(f'people: {self.customers} customers, {len(address_rows)} addresses, {self.agents} agents')
+
+    def _user_row(self, user_id, tag, role, password, joined):
+        return (
+            user_id, password, False, f'{tag}-{user_id}', 'Synthetic', role.title(),
+            f'{tag}-{user_id}@synthetic.zotpot.local', False, True, joined,
+            f'9{user_id % 10 ** 9:09d}', role, None, '', joined,
+        )
+
+    # Orders and everything hanging off them
+
+    def generate_orders(self):
+        order_start = next_id(Order, self.using)
+        item_id = next_id(OrderItem, self.using)
+        tracking_id = next_id(OrderTracking, self.using)
+        payment_id = next_id(Payment, self.using)
+        chunk = self.writer.chunk_size
+
+        for first in range(0, self.orders, chunk):
+            count = min(chunk, self.orders - first)
+            orders, items, tracking, payments = [], [], [], []
+            for offset in range(count):
+                index = first + offset
+                order_rows = self._order(order_start + index, index, item_id, tracking_id, payment_id)
+                orders.append(order_rows[0])
+                items.extend(order_rows[1])
+                tracking.extend(order_rows[2])
+                payments.extend(order_rows[3])
+                item_id += len(order_rows[1])
+                tracking_id += len(order_rows[2])
+                payment_id += len(order_rows[3])
+
+            with transaction.atomic(using=self.using):
+                self.writer.write(Order, ORDER_FIELDS, orders)
+                self.writer.write(OrderItem, ITEM_FIELDS, items)
+                self.writer.write(OrderTracking, TRACKING_FIELDS, tracking)
+                self.writer.write(Payment, PAYMENT_FIELDS, payments)
+            self.log(f'orders: {first + count}/{self.orders}')
+
+    def _created_at(self, index):
+        rng = self.rng
+        day = int(index * self.days / max(self.orders, 1))
+        hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        start = self.end - timedelta(days=self.days - day)
+        return start + timedelta(hours=hour, minutes=rng.randint(0, 59), seconds=rng.randint(0, 59))
+
+    def _order(self, order_id, index, item_id, tracking_id, payment_id):
+        rng = self.rng
+        created = self._created_at(index)
+        customer = rng.randrange(self.customers)
+        address_id, address_lat, address_lng = rng.choice(self.customer_addresses[customer])
+
+        # Everything older than a few hours has finished
+        age = self.end - created
+        if age > timedelta(hours=3):
+            status = 'cancelled' if rng.random() < 0.05 else 'delivered'
+        else:
+            status = rng.choice(STATUS_FLOW)
+
+        agent_id = None if status in ('pending', 'cancelled') else rng.choice(self.agent_ids)
+
+        items = []
+        subtotal = Decimal('0.00')
+        chosen = rng.choices(range(self.products), cum_weights=self.product_cum_weights, k=rng.randint(1, 5))
+        for product_index in dict.fromkeys(chosen):
+            price = self.product_prices[product_index]
+            variant_id = None
+            variant_name = ''
+            variants = self.product_variants.get(product_index)
+            if variants and rng.random() < 0.5:
+                variant_id, adjustment, variant_name = rng.choice(variants)
+                price += adjustment
+            quantity = rng.randint(1, 4)
+            total = price * quantity
+            subtotal += total
+            items.append((
+                item_id + len(items), order_id, self.product_ids[product_index], variant_id, quantity, price, total,
+                self.product_names[product_index], variant_name, self.product_image_urls[product_index],
+            ))
+
+        delivery_fee = Decimal('40.00') if subtotal < 500 else Decimal('0.00')
+        payment_status = {
+            'delivered': 'paid',
+            'cancelled': 'refunded' if rng.random() < 0.5 else 'failed',
+        }.get(status, 'paid' if rng.random() < 0.7 else 'pending')
+
+        steps = STATUS_FLOW[:STATUS_FLOW.index(status) + 1] if status != 'cancelled' else ['pending', 'cancelled']
+        tracking = []
+        moment = created
+        for step in steps:
+            tracking.append((tracking_id + len(tracking), order_id, step, None,
+                             f'Order status changed to {step}', moment))
+            if step == 'out_for_delivery':
+                moment = self._trail(tracking, tracking_id, order_id, moment, address_lat, address_lng)
+            moment += timedelta(minutes=rng.randint(2, 12))
+        updated = tracking[-1][-1]
+
+        payments = []
+        if payment_status != 'pending':
+            payments.append((
+                payment_id, order_id, rng.choice(['stripe', 'razorpay']),
+                f'pay_{rng.getrandbits(64):016x}', subtotal + delivery_fee, payment_status,
+                created, updated,
+            ))
+
+        order = (
+            order_id, self.customer_ids[customer], agent_id, status, payment_status, address_id,
+            subtotal, delivery_fee, subtotal + delivery_fee, '',
+            created + timedelta(minutes=35) if agent_id else None, created, updated,
+        )
+        return order, items, tracking, payments
+
+    def _trail(self, tracking, tracking_id, order_id, moment, address_lat, address_lng):
+        """Append location pings moving from a nearby start point to the address."""
+        rng = self.rng
+        points = rng.randint(3, 10)
+        bearing = rng.uniform(0, 2 * math.pi)
+        distance = rng.uniform(0.01, 0.04)
+        lat = address_lat + distance * math.cos(bearing)
+        lng = address_lng + distance * math.sin(bearing)
+        for step in range(1, points + 1):
+            moment += timedelta(seconds=rng.randint(60, 180))
+            fraction = step / points
+            location = {
+                'latitude': round(lat + (address_lat - lat) * fraction + rng.gauss(0, 0.0003), 6),
+                'longitude': round(lng + (address_lng - lng) * fraction + rng.gauss(0, 0.0003), 6),
+            }
+            tracking.append((tracking_id + len(tracking), order_id, 'out_for_delivery', location,
+                             'Delivery agent location updated', moment))
+        return moment
+
+
+ORDER_FIELDS = [
+    'id', 'customer_id', 'delivery_agent_id', 'status', 'payment_status', 'delivery_address_id',
+    'subtotal', 'delivery_fee', 'total', 'notes', 'estimated_delivery_time', 'created_at', 'updated_at',
+]
+ITEM_FIELDS = [
+    'id', 'order_id', 'product_id', 'variant_id', 'quantity', 'price', 'total',
+    'product_name', 'variant_name', 'product_image',
+]
+TRACKING_FIELDS = ['id', 'order_id', 'status', 'location', 'description', 'created_at']
+PAYMENT_FIELDS = ['id', 'order_id', 'provider', 'payment_id', 'amount', 'status', 'created_at', 'updated_at']
+
+
+def _accumulate(values):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
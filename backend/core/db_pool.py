@@ -0,0 +1,324 @@
+"""
+Per-process database connection pool.
+
+Django opens a new database connection for every request, task and
+``database_sync_to_async`` call (``CONN_MAX_AGE = 0``), or keeps one per
+thread forever (``CONN_MAX_AGE = None``). Under ASGI and Celery both go
+wrong: the first churns connections, the second multiplies them by the
+thread count until Postgres hits ``max_connections``. The pool sits under
+Django's connection handling instead. Closing a connection returns it to
+the pool, and opening one takes an idle connection if there is one.
+
+The pool itself is driver-agnostic. ``core.postgresql_pool`` plugs it into
+the PostgreSQL backend.
+"""
+
+import os
+import threading
+import time
+import weakref
+from functools import partial
+
+from django.db import OperationalError
+
+from .metrics import registry
+
+pool_connections = registry.gauge(
+    'zotpot_db_pool_connections',
+    'Pooled database connections by alias and state (in_use/idle).',
+    ['alias', 'state'],
+)
+pool_waiting = registry.gauge(
+    'zotpot_db_pool_waiting',
+    'Threads waiting for a pooled database connection.',
+    ['alias'],
+)
+pool_wait_seconds = registry.histogram(
+    'zotpot_db_pool_wait_seconds',
+    'Time spent waiting for a pooled database connection.',
+    ['alias'],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+pool_opened = registry.counter(
+    'zotpot_db_pool_connections_opened_total',
+    'Database connections opened by the pool.',
+    ['alias'],
+)
+pool_closed = registry.counter(
+    'zotpot_db_pool_connections_closed_total',
+    'Database connections closed by the pool, by reason.',
+    ['alias', 'reason'],
+)
+pool_timeouts = registry.counter(
+    'zotpot_db_pool_timeouts_total',
+    'Connection requests that gave up waiting for the pool.',
+    ['alias'],
+)
+
+DEFAULTS = {
+    'MAX_SIZE': 10,  # Connections per process
+    'MIN_IDLE': 0,  # Idle connections kept when trimming
+    'TIMEOUT': 10.0,  # Seconds to wait for a free connection
+    'MAX_LIFETIME': 1800.0,  # Seconds before a connection is replaced
+    'MAX_IDLE': 300.0,  # Seconds an idle connection is kept
+    'CHECK_AFTER': 30.0,  # Idle seconds after which a connection is pinged before reuse
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class _Entry:
+    __slots__ = ('connection', 'created', 'released')
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created = now
+        self.released = now
+
+
+class ConnectionPool:
+    """
+    A bounded LIFO pool of connections for one database alias.
+
+    ``connect()`` opens a raw connection, ``check(connection)`` returns
+    whether an idle connection still works, ``reset(connection)`` makes a
+    returned connection safe to reuse (returning ``False`` discards it) and
+    ``close(connection)`` closes it.
+
+    Checked-out connections are only weakly referenced: one that is dropped
+    without being released (a thread dying with its connection open) frees
+    its slot when it is garbage collected.
+    """
+
+    def __init__(self, alias, connect, check, reset, close, options=None):
+        self.alias = alias
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self._close = close
+        options = dict(DEFAULTS, **(options or {}))
+        self.max_size = options['MAX_SIZE']
+        self.min_idle = options['MIN_IDLE']
+        self.timeout = options['TIMEOUT']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.max_idle = options['MAX_IDLE']
+        self.check_after = options['CHECK_AFTER']
+
+        self._cond = threading.Condition()
+        self._idle = []  # LIFO: the most recently used connection is warmest
+        self._in_use = {}  # id(connection) -> (_Entry, weakref to connection)
+        self._pending = 0  # Slots claimed by acquire() but not handed out yet
+        self._waiting = 0
+        self._pid = os.getpid()
+        self._inherited = []
+
+    # Public API
+
+    def acquire(self, connect=None):
+        """
+        Return a connection, opening one (with ``connect`` if given) when no
+        idle connection is usable. Raises ``PoolTimeout`` when the pool stays
+        full for ``TIMEOUT`` seconds.
+        """
+        start = time.monotonic()
+        entry = self._reserve(start + self.timeout)
+        if entry is not None:
+            # Expiry and health checks run outside the lock; a stale
+            # connection's slot is reused for a fresh one.
+            reason = self._stale_reason(entry, time.monotonic())
+            if reason is not None:
+                self._discard(entry.connection, reason)
+                entry = None
+        pool_wait_seconds.observe(time.monotonic() - start, alias=self.alias)
+
+        if entry is None:
+            try:
+                connection = (connect or self._connect)()
+            except Exception:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify()
+                raise
+            entry = _Entry(connection, time.monotonic())
+            pool_opened.inc(alias=self.alias)
+
+        connection, entry.connection = entry.connection, None
+        key = id(connection)
+        with self._cond:
+            self._pending -= 1
+            self._in_use[key] = (entry, weakref.ref(connection, partial(self._lost, key)))
+            self._publish()
+        return connection
+
+    def release(self, connection):
+        with self._cond:
+            self._after_fork()
+            checked_out = self._in_use.pop(id(connection), None)
+            self._publish()
+        if checked_out is None:
+            # Not ours (e.g. opened before a fork); just close it
+            self._discard(connection, 'foreign')
+            return
+
+        entry = checked_out[0]
+        now = time.monotonic()
+        reason = None
+        if now - entry.created >= self._lifetime(entry):
+            reason = 'lifetime'
+        else:
+            try:
+                if not self._reset(connection):
+                    reason = 'unusable'
+            except Exception:
+                reason = 'unusable'
+
+        if reason is not None:
+            self._discard(connection, reason)
+            with self._cond:
+                self._cond.notify()
+            return
+
+        entry.connection = connection
+        entry.released = now
+        with self._cond:
+            self._idle.append(entry)
+            expired = self._trim(now)
+            self._publish()
+            self._cond.notify()
+        for old in expired:
+            self._discard(old.connection, 'idle')
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._publish()
+        for entry in idle:
+            self._discard(entry.connection, 'shutdown')
+
+    def stats(self):
+        with self._cond:
+            return {
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+            }
+
+    # Internals
+
+    def _reserve(self, deadline):
+        """
+        Claim a slot, waiting until ``deadline`` for one. Returns an idle
+        entry to reuse, or ``None`` when the caller should open a connection.
+        """
+        with self._cond:
+            self._after_fork()
+            while True:
+                if self._idle:
+                    self._pending += 1
+                    return self._idle.pop()
+                if len(self._in_use) + self._pending < self.max_size:
+                    self._pending += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    pool_timeouts.inc(alias=self.alias)
+                    raise PoolTimeout(
+                        f'No database connection available for {self.alias!r} within '
+                        f'{self.timeout:g}s (pool size {self.max_size})'
+                    )
+                self._waiting += 1
+                pool_waiting.set(self._waiting, alias=self.alias)
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    pool_waiting.set(self._waiting, alias=self.alias)
+
+    def _stale_reason(self, entry, now):
+        if now - entry.created >= self._lifetime(entry):
+            return 'lifetime'
+        if now - entry.released >= self.max_idle:
+            return 'idle'
+        if now - entry.released >= self.check_after:
+            try:
+                if not self._check(entry.connection):
+                    return 'unhealthy'
+            except Exception:
+                return 'unhealthy'
+        return None
+
+    def _lost(self, key, ref):
+        # Weakref callback: a checked-out connection was garbage collected
+        with self._cond:
+            checked_out = self._in_use.get(key)
+            if checked_out is not None and checked_out[1] is ref:
+                del self._in_use[key]
+                pool_closed.inc(alias=self.alias, reason='leaked')
+                self._publish()
+                self._cond.notify()
+
+    def _trim(self, now):
+        # Lock held. Idle connections are reused newest first, so the ones at
+        # the bottom of the stack are those that have sat unused longest.
+        expired = []
+        while len(self._idle) > self.min_idle and now - self._idle[0].released >= self.max_idle:
+            expired.append(self._idle.pop(0))
+        return expired
+
+    def _lifetime(self, entry):
+        # +/-10% jitter so connections opened together are not all replaced together
+        jitter = (id(entry) % 21 - 10) / 100
+        return self.max_lifetime * (1 + jitter)
+
+    def _discard(self, connection, reason):
+        pool_closed.inc(alias=self.alias, reason=reason)
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+    def _after_fork(self):
+        # Lock held. Connections inherited from the parent share its sockets:
+        # closing them (or letting them be collected) would end the parent's
+        # sessions, so idle ones are parked for the life of the process.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._inherited.extend(entry.connection for entry in self._idle)
+            self._idle = []
+            self._in_use = {}
+            self._pending = 0
+            self._waiting = 0
+
+    def _publish(self):
+        pool_connections.set(len(self._in_use), alias=self.alias, state='in_use')
+        pool_connections.set(len(self._idle), alias=self.alias, state='idle')
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """The process-wide pool for ``alias``, created with ``factory()`` on first use."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = factory()
+    return pool
+
+
+def close_pools():
+    """
+    Close idle connections and forget every pool. Connections still checked
+    out are closed when they are released.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
@@ -0,0 +1,219 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Reads go to the primary unless the current request or task has opted in to
+replicas:
+
+* DRF views opt in per action with ``ReplicaReadMixin`` (safe ``list`` and
+  ``retrieve`` requests by default);
+* Celery tasks declare ``database='replica'`` or ``database='primary'`` in
+  their decorator; tasks without it use the primary;
+* any other code can wrap reads in ``use_replica()`` / ``use_primary()``.
+
+Writes always go to the primary. When a request writes, its user is
+pinned to the primary for ``REPLICA_PIN_SECONDS`` so their next reads see
+their own changes even if the replicas lag.
+
+Replicas come from ``DATABASE_REPLICA_URLS``. Locally, two SQLite files work:
+``DATABASE_URL=sqlite:///primary.sqlite3`` and
+``DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3``. Migrate both
+(``migrate --database=replica_1``).
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+class RoutingState:
+    """Per request/task routing choice, and whether anything was written."""
+
+    __slots__ = ('mode', 'wrote')
+
+    def __init__(self, mode=None):
+        self.mode = mode
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+@contextmanager
+def _routing(mode):
+    token = _state.set(RoutingState(mode))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def use_replica():
+    """Context manager/decorator sending reads inside it to a replica."""
+    return _routing(REPLICA)
+
+
+def use_primary():
+    """Context manager/decorator keeping reads inside it on the primary."""
+    return _routing(PRIMARY)
+
+
+# Stickiness
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id, seconds=None):
+    seconds = seconds if seconds is not None else getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    cache.set(_pin_key(user_id), 1, seconds)
+
+
+async def apin_to_primary(user_id, seconds=None):
+    seconds = seconds if seconds is not None else getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    await cache.aset(_pin_key(user_id), 1, seconds)
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+
+async def ais_pinned(user_id):
+    return user_id is not None and await cache.aget(_pin_key(user_id)) is not None
+
+
+def allow_replica_reads():
+    """Let the rest of the current request read from replicas."""
+    state = _state.get()
+    if state is not None and state.mode is None:
+        state.mode = REPLICA
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        # Reads after a write in the same request stay on the primary
+        if state is None or state.mode != REPLICA or state.wrote or not self.replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Gives each request its own routing state and pins users who wrote to
+    the primary. Place it before anything that queries the database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            user_id = self._user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            # A lazy session user may still need a query to resolve
+            user_id = await sync_to_async(self._user_id)(request)
+            if user_id is not None:
+                await apin_to_primary(user_id)
+        return response
+
+    def _user_id(self, request):
+        # DRF copies the token-authenticated user onto the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.id
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    DRF viewset mixin: safe requests to ``replica_actions`` read from a
+    replica, unless the user is pinned to the primary by a recent write.
+    """
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and self.action in self.replica_actions:
+            user = request.user
+            if not (user.is_authenticated and is_pinned(user.id)):
+                allow_replica_reads()
+
+
+# Celery: tasks choose with @shared_task(database='replica' | 'primary')
+
+_task_tokens = {}
+
+
+@task_prerun.connect
+def start_task_routing(task_id=None, task=None, **kwargs):
+    mode = REPLICA if getattr(task, 'database', None) == REPLICA else PRIMARY
+    _task_tokens[task_id] = _state.set(RoutingState(mode))
+
+
+@task_postrun.connect
+def finish_task_routing(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        try:
+            _state.reset(token)
+        except ValueError:
+            # Reset from a different context (eager tasks); drop the state
+            _state.set(None)
@@ -0,0 +1,151 @@
+"""
+``Idempotency-Key`` support for unsafe API actions.
+
+Clients that may retry a request (checkout on a flaky mobile network) send
+a unique ``Idempotency-Key`` header. The first request with a key runs
+normally and its response is stored for ``IDEMPOTENCY_KEY_TTL`` seconds;
+repeats get the stored response back, marked ``Idempotent-Replayed: true``,
+without running the action again. A repeat that arrives while the first
+attempt is still running waits for it (up to ``IDEMPOTENCY_WAIT``) rather
+than running in parallel.
+
+Keys are scoped to the user and the request path. Reusing a key with a
+different body is rejected with 422. Server errors (5xx) are not stored,
+so the client can retry them with the same key. Requests without the
+header are not affected.
+
+Entries live in the default Django cache, which is Redis in production;
+``cache.add`` makes claiming a key atomic across processes.
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http.request import RawPostDataException
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import registry
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+REPLAY_HEADERS = ('Location',)
+MAX_KEY_LENGTH = 255
+# Outcomes that say nothing final about the request and may be retried
+UNSTORED_STATUSES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+idempotent_requests = registry.counter(
+    'zotpot_idempotent_requests_total',
+    'Requests carrying an Idempotency-Key, by view action and outcome '
+    '(executed/replayed/waited/in_progress/mismatch).',
+    ['view', 'outcome'],
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        # The stream was already consumed (multipart); fall back to the parsed data
+        body = json.dumps(request.data, sort_keys=True, default=str).encode()
+    return hashlib.sha256(request.method.encode() + b' ' + body).hexdigest()
+
+
+def _cache_keys(request, key):
+    user_id = request.user.pk if request.user.is_authenticated else 'anonymous'
+    scope = hashlib.sha256(f'{request.method} {request.path} {key}'.encode()).hexdigest()
+    base = f'idempotency:{user_id}:{scope}'
+    return f'{base}:response', f'{base}:lock'
+
+
+def _replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    for name, value in stored['headers'].items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _error(message, status_code):
+    return Response({'error': message}, status=status_code)
+
+
+def idempotent(ttl=None, wait=None, lock_timeout=None):
+    """
+    Decorate a DRF view method (``create`` or an ``@action``) so that
+    requests sending ``Idempotency-Key`` run at most once per key.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None:
+                return method(view, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return _error(f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters.', status.HTTP_400_BAD_REQUEST)
+
+            label = f'{type(view).__name__}.{getattr(view, "action", None) or method.__name__}'
+            # Read the body before the view parses it; DRF can't re-read the stream
+            fingerprint = _fingerprint(request)
+            response_key, lock_key = _cache_keys(request, key)
+            deadline = time.monotonic() + (wait if wait is not None else _setting('IDEMPOTENCY_WAIT', 10))
+            delay = 0.02
+            waited = False
+            owner = uuid.uuid4().hex
+
+            while True:
+                stored = cache.get(response_key)
+                if stored is not None:
+                    if stored['fingerprint'] != fingerprint:
+                        idempotent_requests.inc(view=label, outcome='mismatch')
+                        return _error(
+                            f'{HEADER} was already used with a different request.',
+                            status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        )
+                    idempotent_requests.inc(view=label, outcome='waited' if waited else 'replayed')
+                    return _replay(stored)
+
+                timeout = lock_timeout if lock_timeout is not None else _setting('IDEMPOTENCY_LOCK_TIMEOUT', 60)
+                if cache.add(lock_key, owner, timeout):
+                    break
+                # Another attempt with this key is running: wait for its result
+                if time.monotonic() >= deadline:
+                    idempotent_requests.inc(view=label, outcome='in_progress')
+                    response = _error(
+                        f'A request with this {HEADER} is still being processed.',
+                        status.HTTP_409_CONFLICT,
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                waited = True
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+            try:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code < 500 and response.status_code not in UNSTORED_STATUSES:
+                    cache.set(response_key, {
+                        'fingerprint': fingerprint,
+                        'status': response.status_code,
+                        'data': response.data,
+                        'headers': {name: response[name] for name in REPLAY_HEADERS if response.has_header(name)},
+                    }, ttl if ttl is not None else _setting('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+            finally:
+                if cache.get(lock_key) == owner:
+                    cache.delete(lock_key)
+            idempotent_requests.inc(view=label, outcome='executed')
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,80 @@
+"""
+Helpers shared by the HTTP middleware and the Celery signal hooks.
+"""
+
+import contextvars
+import logging
+import time
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+slow_query_logger = logging.getLogger('zotpot.slow_queries')
+
+
+class QueryStats:
+    """
+    Counts and times the queries issued while it is active.
+
+    When ``slow_threshold`` (seconds) is set, queries at least that slow
+    are kept with their SQL so the caller can log them.
+    """
+
+    def __init__(self, slow_threshold=None):
+        self.count = 0
+        self.duration = 0.0
+        self.slow_threshold = slow_threshold
+        self.slow = []
+        self._token = None
+
+    def start(self):
+        self._token = _current_stats.set(self)
+
+    def stop(self):
+        if self._token is not None:
+            _current_stats.reset(self._token)
+            self._token = None
+
+    def record(self, elapsed, alias, sql, params):
+        self.count += 1
+        self.duration += elapsed
+        if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+            self.slow.append((elapsed, alias, sql, params))
+
+    def log_slow(self, label):
+        for elapsed, alias, sql, params in self.slow:
+            slow_query_logger.warning(
+                '%s: %.1f ms on %s: %s; params=%r',
+                label, elapsed * 1000, alias, sql, params
+            )
+
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(time.perf_counter() - start, context['connection'].alias, sql, params)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Installed once per connection wrapper, so requests and tasks only pay
+    # for setting a context variable rather than wrapping every alias.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def view_label(view_func, method):
+    """``ViewSet.action`` for DRF viewsets, ``module.function`` otherwise."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{getattr(view_func, "__name__", type(view_func).__name__)}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
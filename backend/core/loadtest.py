@@ -0,0 +1,360 @@
+"""
+In-process load-test harness for the REST and WebSocket APIs.
+
+Virtual users drive ``zotpot.asgi.application`` directly over ASGI, so a
+run needs no external server, load generator or WebSocket client library;
+it measures the Django/Channels stack exactly as deployed. Use it with
+``zotpot.settings_loadtest`` (SQLite or ``LOADTEST_DATABASE_URL`` plus the
+in-memory channel layer) through ``manage.py loadtest``.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+
+API = '/api/v1'
+WS_TIMEOUT = 5
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint label."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.iterations = {}
+
+    def record(self, label, elapsed, ok=True):
+        self.samples.setdefault(label, []).append(elapsed)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def iteration(self, scenario):
+        self.iterations[scenario] = self.iterations.get(scenario, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            endpoints[label] = {
+                'requests': len(ordered),
+                'errors': self.errors.get(label, 0),
+                'throughput_rps': round(len(ordered) / duration, 2),
+                'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+                'p90_ms': round(percentile(ordered, 0.90) * 1000, 3),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+                'max_ms': round(ordered[-1] * 1000, 3),
+            }
+        return {
+            'endpoints': endpoints,
+            'scenarios': {
+                name: {'iterations': count, 'throughput_ips': round(count / duration, 2)}
+                for name, count in sorted(self.iterations.items())
+            },
+        }
+
+
+class ASGIClient:
+    """Minimal HTTP/WebSocket client speaking ASGI to an application object."""
+
+    def __init__(self, application, token=None):
+        self.application = application
+        self.token = token
+
+    def _headers(self, extra=()):
+        headers = [(b'host', b'testserver'), (b'content-type', b'application/json')]
+        if self.token:
+            headers.append((b'authorization', f'Bearer {self.token}'.encode()))
+        return headers + list(extra)
+
+    async def request(self, method, path, data=None):
+        url = urlsplit(path)
+        body = json.dumps(data).encode() if data is not None else b''
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': url.query.encode(),
+            'root_path': '',
+            'headers': self._headers([(b'content-length', str(len(body)).encode())]),
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        request_sent = False
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # The client never disconnects mid-request
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+
+        await self.application(scope, receive, send)
+        payload = b''.join(response['body'])
+        return response['status'], json.loads(payload) if payload.startswith((b'{', b'[')) else payload
+
+    def websocket(self, path):
+        return WebSocketSession(self.application, path, self.token)
+
+
+class WebSocketSession:
+    def __init__(self, application, path, token=None):
+        url = urlsplit(path)
+        query = url.query
+        if token:
+            query = f'{query}&token={token}' if query else f'token={token}'
+        self.scope = {
+            'type': 'websocket',
+            'asgi': {'version': '3.0'},
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver')],
+            'subprotocols': [],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        self.application = application
+        self.inbound = asyncio.Queue()
+        self.outbound = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        self.task = asyncio.ensure_future(
+            self.application(self.scope, self.inbound.get, self.outbound.put)
+        )
+        await self.inbound.put({'type': 'websocket.connect'})
+        message = await asyncio.wait_for(self.outbound.get(), WS_TIMEOUT)
+        return message['type'] == 'websocket.accept'
+
+    async def send_json(self, data):
+        await self.inbound.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive_json(self, timeout=WS_TIMEOUT):
+        message = await asyncio.wait_for(self.outbound.get(), timeout)
+        if message['type'] != 'websocket.send':
+            raise ConnectionError(f'Socket closed: {message}')
+        return json.loads(message['text'])
+
+    async def close(self):
+        await self.inbound.put({'type': 'websocket.disconnect', 'code': 1000})
+        try:
+            await asyncio.wait_for(self.task, WS_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.task.cancel()
+
+
+def seed(customers=20, agents=20, products=50):
+    """Create (or reuse) the fixed data set the scenarios run against."""
+    from orders.models import Order
+    from products.models import Category, Product, ProductVariant
+    from users.models import Address, DeliveryAgent
+
+    User = get_user_model()
+    rng = random.Random(1)
+
+    admin, _ = User.objects.get_or_create(
+        email='loadtest-admin@zotpot.local',
+        defaults={'username': 'loadtest-admin', 'role': User.Role.ADMIN, 'is_staff': True},
+    )
+
+    if not Product.objects.filter(name__startswith='Loadtest ').exists():
+        category = Category.objects.create(name='Loadtest groceries')
+        for index in range(products):
+            product = Product.objects.create(
+                category=category,
+                name=f'Loadtest product {index}',
+                description='Synthetic product for load testing',
+                price=Decimal(rng.randint(20, 500)),
+                image='products/loadtest.jpg',
+                stock=10 ** 6,
+            )
+            ProductVariant.objects.create(
+                product=product,
+                name='Large',
+                price_adjustment=Decimal('10.00'),
+                stock=10 ** 6,
+            )
+
+    customer_users = []
+    for index in range(customers):
+        user, created = User.objects.get_or_create(
+            email=f'loadtest-customer-{index}@zotpot.local',
+            defaults={'username': f'loadtest-customer-{index}'},
+        )
+        if created:
+            Address.objects.create(
+                user=user,
+                title='Home',
+                address_line1=f'{index} Loadtest Street',
+                city='Bengaluru',
+                state='Karnataka',
+                postal_code='560001',
+                latitude=Decimal('12.971600') + Decimal(rng.randint(-500, 500)) / 10000,
+                longitude=Decimal('77.594600') + Decimal(rng.randint(-500, 500)) / 10000,
+            )
+        customer_users.append(user)
+
+    agent_orders = []
+    for index in range(agents):
+        user, created = User.objects.get_or_create(
+            email=f'loadtest-agent-{index}@zotpot.local',
+            defaults={'username': f'loadtest-agent-{index}', 'role': User.Role.DELIVERY_AGENT},
+        )
+        if created:
+            DeliveryAgent.objects.create(
+                user=user,
+                vehicle_number=f'KA01LT{index:04d}',
+                vehicle_type='bike',
+                license_number=f'LT{index:06d}',
+            )
+        order = Order.objects.filter(delivery_agent=user, status=Order.Status.OUT_FOR_DELIVERY).first()
+        if order is None:
+            customer = customer_users[index % len(customer_users)]
+            order = Order.objects.create(
+                customer=customer,
+                delivery_agent=user,
+                delivery_address=customer.addresses.first(),
+                status=Order.Status.OUT_FOR_DELIVERY,
+                subtotal=Decimal('100.00'),
+                delivery_fee=Decimal('40.00'),
+                total=Decimal('140.00'),
+            )
+        agent_orders.append((user, order))
+
+    return {
+        'admin': admin,
+        'customers': customer_users,
+        'addresses': {user.id: user.addresses.first().id for user in customer_users},
+        'agent_orders': agent_orders,
+        'product_ids': list(
+            Product.objects.filter(name__startswith='Loadtest ').values_list('id', flat=True)
+        ),
+    }
+
+
+async def timed(recorder, label, call):
+    """Await a client request, recording its latency; failures count as errors."""
+    start = time.perf_counter()
+    try:
+        status, body = await call
+    except Exception:
+        recorder.record(label, time.perf_counter() - start, ok=False)
+        return None, None
+    recorder.record(label, time.perf_counter() - start, ok=status is not None and status < 400)
+    return status, body
+
+
+async def customer_checkout(client, recorder, rng, product_ids, address_id):
+    """Browse the catalog, price a cart, then place an order."""
+    await timed(recorder, 'GET /products/categories/', client.request('GET', f'{API}/products/categories/'))
+    page = rng.randint(1, 3)
+    await timed(recorder, 'GET /products/products/', client.request('GET', f'{API}/products/products/?page={page}'))
+    query = f'product+{rng.randint(0, 9)}'
+    await timed(recorder, 'GET /products/products/search/', client.request('GET', f'{API}/products/products/search/?q={query}'))
+
+    # Quote: re-read current price and availability of every cart line
+    cart = rng.sample(product_ids, k=min(3, len(product_ids)))
+    for product_id in cart:
+        await timed(recorder, 'GET /products/products/{id}/', client.request('GET', f'{API}/products/products/{product_id}/'))
+
+    order = {
+        'delivery_address_id': address_id,
+        'notes': 'loadtest',
+        'order_items': [{'product_id': product_id, 'quantity': rng.randint(1, 3)} for product_id in cart],
+    }
+    status, body = await timed(recorder, 'POST /orders/orders/', client.request('POST', f'{API}/orders/orders/', order))
+    if status == 201:
+        await timed(recorder, 'GET /orders/orders/{id}/', client.request('GET', f'{API}/orders/orders/{body["id"]}/'))
+    recorder.iteration('customer_checkout')
+
+
+async def agent_tracking(session, recorder, rng, pings):
+    """Stream location frames and time each round trip through the order group."""
+    lat, lng = 12.9716, 77.5946
+    for _ in range(pings):
+        lat += rng.uniform(-0.0005, 0.0005)
+        lng += rng.uniform(-0.0005, 0.0005)
+        start = time.perf_counter()
+        await session.send_json({'type': 'location_update', 'location': {'latitude': lat, 'longitude': lng}})
+        try:
+            await session.receive_json()
+            recorder.record('WS location_update round trip', time.perf_counter() - start)
+        except (asyncio.TimeoutError, ConnectionError):
+            recorder.record('WS location_update round trip', time.perf_counter() - start, ok=False)
+    recorder.iteration('agent_tracking')
+
+
+async def admin_listing(client, recorder):
+    """Page through the admin listings."""
+    await timed(recorder, 'GET /orders/orders/ (admin)', client.request('GET', f'{API}/orders/orders/'))
+    await timed(recorder, 'GET /auth/delivery-agents/', client.request('GET', f'{API}/auth/delivery-agents/'))
+    await timed(recorder, 'GET /auth/users/', client.request('GET', f'{API}/auth/users/'))
+    recorder.iteration('admin_listing')
+
+
+async def run(application, fixtures, tokens, duration, customers, agents, admins, pings=20, seed_value=42):
+    """Run all scenarios concurrently for ``duration`` seconds."""
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    async def customer_user(index):
+        rng = random.Random(seed_value + index)
+        user = fixtures['customers'][index % len(fixtures['customers'])]
+        client = ASGIClient(application, tokens[user.id])
+        address_id = fixtures['addresses'][user.id]
+        while time.monotonic() < deadline:
+            await customer_checkout(client, recorder, rng, fixtures['product_ids'], address_id)
+
+    async def agent_user(index):
+        rng = random.Random(seed_value + 1000 + index)
+        user, order = fixtures['agent_orders'][index % len(fixtures['agent_orders'])]
+        session = ASGIClient(application, tokens[user.id]).websocket(f'/ws/tracking/order/{order.id}/')
+        if not await session.connect():
+            recorder.record('WS connect', 0, ok=False)
+            return
+        try:
+            while time.monotonic() < deadline:
+                await agent_tracking(session, recorder, rng, pings)
+        finally:
+            await session.close()
+
+    async def admin_user(index):
+        client = ASGIClient(application, tokens[fixtures['admin'].id])
+        while time.monotonic() < deadline:
+            await admin_listing(client, recorder)
+
+    started = time.monotonic()
+    await asyncio.gather(
+        *[customer_user(i) for i in range(customers)],
+        *[agent_user(i) for i in range(agents)],
+        *[admin_user(i) for i in range(admins)],
+    )
+    return recorder.summary(time.monotonic() - started)
@@ -0,0 +1,153 @@
+import asyncio
+import statistics
+import threading
+import time
+from types import ModuleType
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from django.db import connections
+from django.test import override_settings
+from django.urls import path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import loadtest
+from core.async_views import with_sync_fallback
+from orders.async_views import order_detail, order_tracking_list
+from orders.models import OrderTracking
+from orders.views import OrderTrackingViewSet, OrderViewSet
+from products.async_views import product_detail
+from products.views import ProductViewSet
+
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+
+def bench_urlconf():
+    """The three endpoints twice: plain DRF views under sync/, async views under async/."""
+    sync_views = {
+        'order': OrderViewSet.as_view(DETAIL_ACTIONS),
+        'tracking': OrderTrackingViewSet.as_view({'get': 'list'}),
+        'product': ProductViewSet.as_view(DETAIL_ACTIONS),
+    }
+    async_views = {
+        'order': with_sync_fallback(order_detail, sync_views['order']),
+        'tracking': with_sync_fallback(order_tracking_list, sync_views['tracking']),
+        'product': with_sync_fallback(product_detail, sync_views['product']),
+    }
+    urlpatterns = []
+    for prefix, views in (('sync', sync_views), ('async', async_views)):
+        urlpatterns += [
+            path(f'{prefix}/orders/<pk>/', views['order']),
+            path(f'{prefix}/orders/<order_pk>/tracking/', views['tracking']),
+            path(f'{prefix}/products/<pk>/', views['product']),
+        ]
+    urlconf = ModuleType('bench_async_views_urls')
+    urlconf.urlpatterns = urlpatterns
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent-request capacity of the async read views against '
+        'the sync DRF views they replace, in-process over ASGI. Run with '
+        '--settings=zotpot.settings_loadtest.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--requests', type=int, default=600, help='Requests per run')
+        parser.add_argument('--concurrency', default='1,10,50,100',
+                            help='Comma-separated in-flight request levels')
+        parser.add_argument('--db-latency-ms', type=float, default=2.0,
+                            help='Simulated network round trip added to every query')
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+        fixtures = loadtest.seed(customers=5, agents=5, products=20)
+        customer = fixtures['customers'][0]
+        _, order = next(
+            (agent, order) for agent, order in fixtures['agent_orders'] if order.customer_id == customer.id
+        )
+        if OrderTracking.objects.filter(order=order).count() < 30:
+            OrderTracking.objects.bulk_create([
+                OrderTracking(order=order, status=order.status, description='Bench ping',
+                              location={'latitude': 12.97, 'longitude': 77.59 + index / 1000})
+                for index in range(30)
+            ])
+        token = str(AccessToken.for_user(customer))
+        paths = [
+            f'orders/{order.id}/',
+            f'orders/{order.id}/tracking/',
+            f'products/{fixtures["product_ids"][0]}/',
+        ]
+
+        latency = options['db_latency_ms'] / 1000
+        if latency:
+            def delay(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+
+            def add_delay(sender, connection, **kwargs):
+                connection.execute_wrappers.append(delay)
+
+            connection_created.connect(add_delay, weak=False)
+            for connection in connections.all():
+                connection.close()
+
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+        client = loadtest.ASGIClient(application, token)
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        self.stdout.write(
+            f'{"mode":6} {"conc":>5} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"threads":>8} {"errors":>7}'
+        )
+        with override_settings(ROOT_URLCONF=bench_urlconf()):
+            for concurrency in levels:
+                for mode in ('sync', 'async'):
+                    result = asyncio.run(self._run(client, mode, paths, concurrency, options['requests']))
+                    self.stdout.write(
+                        f'{mode:6} {concurrency:>5} {result["rps"]:>8.0f} {result["p50"]:>8.1f} '
+                        f'{result["p95"]:>8.1f} {result["threads"]:>8} {result["errors"]:>7}'
+                    )
+
+    async def _run(self, client, mode, paths, concurrency, total):
+        semaphore = asyncio.Semaphore(concurrency)
+        timings = []
+        errors = 0
+        peak_threads = threading.active_count()
+        done = False
+
+        async def sample_threads():
+            nonlocal peak_threads
+            while not done:
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        async def one(index):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                status, _ = await client.request('GET', f'/{mode}/{paths[index % len(paths)]}')
+                timings.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+
+        sampler = asyncio.create_task(sample_threads())
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(total)))
+        elapsed = time.perf_counter() - start
+        done = True
+        await sampler
+
+        timings.sort()
+        return {
+            'rps': total / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p95': loadtest.percentile(timings, 0.95) * 1000,
+            'threads': peak_threads,
+            'errors': errors,
+        }
@@ -0,0 +1,141 @@
+import statistics
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+
+from core import db_pool, loadtest
+from tracking.ingest import record_agent_location
+
+DIRECT_ENGINE = 'django.db.backends.postgresql'
+POOLED_ENGINE = 'core.postgresql_pool'
+
+
+def counter_total(counter):
+    return sum(value for _, value in counter.snapshot()['values'])
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare connection churn and latency of the tracking ingest path with '
+        'and without the connection pool. Each worker thread handles pings '
+        'the way the tracking consumers and Celery tasks do: query, then close '
+        'its connection. Needs PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--pings', type=int, default=5000, help='Pings per run')
+        parser.add_argument('--concurrency', default='8,32,64',
+                            help='Comma-separated worker thread counts')
+        parser.add_argument('--pool-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        base = dict(connections.settings['default'])
+        if base['ENGINE'] not in (DIRECT_ENGINE, POOLED_ENGINE):
+            raise CommandError('bench_db_pool needs a PostgreSQL default database.')
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+        fixtures = loadtest.seed(customers=10, agents=20, products=10)
+        agent_ids = [agent.id for agent, _ in fixtures['agent_orders']]
+
+        opened = []
+        connection_created.connect(lambda **kwargs: opened.append(1), weak=False)
+
+        self.stdout.write(
+            f'{"mode":7} {"threads":>7} {"pings/s":>8} {"p50 ms":>7} {"p99 ms":>7} '
+            f'{"opened":>7} {"peak conns":>10} {"errors":>6}'
+        )
+        for concurrency in [int(level) for level in options['concurrency'].split(',')]:
+            for mode in ('direct', 'pooled'):
+                if mode == 'direct':
+                    settings_dict = dict(base, ENGINE=DIRECT_ENGINE, CONN_MAX_AGE=0)
+                else:
+                    settings_dict = dict(
+                        base, ENGINE=POOLED_ENGINE, CONN_MAX_AGE=0,
+                        POOL=dict(base.get('POOL') or {}, MAX_SIZE=options['pool_size']),
+                    )
+                result = self._run(settings_dict, agent_ids, concurrency, options['pings'], opened)
+                self.stdout.write(
+                    f'{mode:7} {concurrency:>7} {result["rate"]:>8.0f} {result["p50"]:>7.2f} '
+                    f'{result["p99"]:>7.2f} {result["opened"]:>7} {result["peak"]:>10} '
+                    f'{result["errors"]:>6}'
+                )
+
+    def _run(self, settings_dict, agent_ids, concurrency, total, opened):
+        # Worker threads are new for every run, so their connections are
+        # built from the settings swapped in here.
+        connections.close_all()
+        db_pool.close_pools()
+        connections.settings['default'] = settings_dict
+        del connections['default']
+
+        pooled = settings_dict['ENGINE'] == POOLED_ENGINE
+        opened.clear()
+        pool_opened = counter_total(db_pool.pool_opened)
+
+        timings = []
+        errors = []
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        done = threading.Event()
+        peak = [0]
+
+        def work():
+            while True:
+                with lock:
+                    index = next(remaining, None)
+                if index is None:
+                    break
+                location = {'latitude': 12.9 + index % 100 / 1000, 'longitude': 77.5 + index % 37 / 1000}
+                start = time.perf_counter()
+                try:
+                    # What database_sync_to_async does around each call
+                    close_old_connections()
+                    record_agent_location(agent_ids[index % len(agent_ids)], location)
+                except Exception as exc:
+                    errors.append(exc)
+                finally:
+                    close_old_connections()
+                timings.append(time.perf_counter() - start)
+            connections.close_all()
+
+        def sample():
+            # A connection of its own, outside the pool
+            wrapper = connections['default']
+            raw = wrapper.Database.connect(**wrapper.get_connection_params())
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                while not done.is_set():
+                    cursor.execute(
+                        'SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()'
+                    )
+                    peak[0] = max(peak[0], cursor.fetchone()[0] - 1)
+                    time.sleep(0.01)
+            raw.close()
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        workers = [threading.Thread(target=work) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+
+        timings.sort()
+        return {
+            'rate': total / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p99': loadtest.percentile(timings, 0.99) * 1000,
+            'opened': counter_total(db_pool.pool_opened) - pool_opened if pooled else len(opened),
+            'peak': peak[0],
+            'errors': len(errors),
+        }
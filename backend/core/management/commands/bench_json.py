@@ -0,0 +1,131 @@
+import io
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework import parsers, renderers
+
+from core import loadtest
+from core.renderers import JSONParser, JSONRenderer, orjson_available
+from orders.models import Order, OrderItem, OrderTracking
+from orders.serializers import OrderSerializer
+from products.models import Product
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare encode/decode time and bytes of the API JSON renderer and '
+        'parser against DRF\'s defaults on realistic order and product pages.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--iterations', type=int, default=200, help='Encodes per page and engine')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--tracking', type=int, default=25, help='Tracking updates per order')
+        parser.add_argument('--items', type=int, default=3, help='Items per order')
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+        if not orjson_available():
+            self.stdout.write('orjson is not installed; the API renderer uses its stdlib fallback.')
+
+        fixtures = loadtest.seed(customers=10, agents=options['page_size'], products=20)
+        orders = [order for _, order in fixtures['agent_orders']]
+        self._fill_orders(orders, fixtures['product_ids'], options['items'], options['tracking'])
+
+        pages = {
+            'orders': self._page(OrderSerializer(self._orders(orders), many=True).data),
+            'products': self._page(ProductSerializer(
+                Product.objects.filter(id__in=fixtures['product_ids'][:options['page_size']])
+                .select_related('category').prefetch_related('variants', 'additional_images'),
+                many=True,
+            ).data),
+        }
+
+        engines = [
+            ('drf', renderers.JSONRenderer(), parsers.JSONParser()),
+            ('api', JSONRenderer(), JSONParser()),
+        ]
+        self.stdout.write(
+            f'{"page":9} {"engine":7} {"bytes":>7} {"encode us":>10} {"decode us":>10} {"speedup":>8} {"same":>5}'
+        )
+        for name, data in pages.items():
+            baseline_content = None
+            baseline_time = None
+            for label, renderer, parser in engines:
+                content, encode_us = self._encode(renderer, data, options['iterations'])
+                decode_us = self._decode(parser, content, options['iterations'])
+                if baseline_content is None:
+                    baseline_content, baseline_time = content, encode_us
+                self.stdout.write(
+                    f'{name:9} {label:7} {len(content):>7} {encode_us:>10.1f} {decode_us:>10.1f} '
+                    f'{baseline_time / encode_us:>7.1f}x {str(content == baseline_content):>5}'
+                )
+
+    def _fill_orders(self, orders, product_ids, items, tracking):
+        products = Product.objects.in_bulk(product_ids)
+        for index, order in enumerate(orders):
+            if not order.items.exists():
+                lines = []
+                for offset in range(items):
+                    product = products[product_ids[(index + offset) % len(product_ids)]]
+                    quantity = offset + 1
+                    lines.append(OrderItem(
+                        order=order, product=product, quantity=quantity,
+                        price=product.price, total=product.price * quantity,
+                        product_name=product.name, product_image=product.primary_image_url(),
+                    ))
+                OrderItem.objects.bulk_create(lines)
+            missing = tracking - order.tracking_updates.count()
+            if missing > 0:
+                OrderTracking.objects.bulk_create([
+                    OrderTracking(
+                        order=order, status=order.status, description='Location updated',
+                        location={
+                            'latitude': float(Decimal('12.9716') + Decimal(step) / 10000),
+                            'longitude': float(Decimal('77.5946') + Decimal(step) / 10000),
+                            'address': '80 Feet Road, Koramangala',
+                        },
+                    )
+                    for step in range(missing)
+                ])
+
+    def _orders(self, orders):
+        return Order.objects.filter(id__in=[order.id for order in orders]).select_related(
+            'customer__delivery_profile',
+            'delivery_agent__delivery_profile',
+            'delivery_address',
+        ).prefetch_related(
+            'customer__addresses',
+            'delivery_agent__addresses',
+            'items',
+            'tracking_updates',
+            'payments',
+        )
+
+    def _page(self, results):
+        # What PageNumberPagination wraps list responses in
+        return {'count': len(results), 'next': None, 'previous': None, 'results': results}
+
+    def _encode(self, renderer, data, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            content = renderer.render(data, 'application/json', {})
+            timings.append(time.perf_counter() - start)
+        return content, statistics.median(timings) * 1e6
+
+    def _decode(self, parser, content, iterations):
+        timings = []
+        for _ in range(iterations):
+            stream = io.BytesIO(content)
+            start = time.perf_counter()
+            parser.parse(stream, 'application/json', {})
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1e6
+
@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import JsonResponse
+from django.test import RequestFactory, override_settings
+
+from core.middleware import MetricsMiddleware
+
+
+def sample_view(request):
+    # Three cheap queries, roughly what a small detail endpoint issues
+    with connection.cursor() as cursor:
+        for _ in range(3):
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    return JsonResponse({'id': 1, 'status': 'pending', 'items': list(range(20))})
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of MetricsMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        plain = sample_view
+
+        instrumented = MetricsMiddleware(sample_view)
+        # Resolve the label as URL dispatch would
+        def with_view(request):
+            instrumented.process_view(request, sample_view, (), {})
+            return sample_view(request)
+        instrumented.get_response = with_view
+
+        baseline, measured = [], []
+        # Production settings: no debug cursor recording every query
+        with override_settings(DEBUG=False):
+            for _ in range(options['rounds']):
+                baseline.append(self._run(plain, factory, options['requests']))
+                measured.append(self._run(instrumented, factory, options['requests']))
+
+        base = statistics.median(baseline)
+        instr = statistics.median(measured)
+        self.stdout.write(f'baseline:     {base:8.2f} us/request')
+        self.stdout.write(f'instrumented: {instr:8.2f} us/request')
+        self.stdout.write(f'overhead:     {instr - base:8.2f} us/request ({(instr / base - 1) * 100:.1f}%)')
+
+    def _run(self, handler, factory, count):
+        requests = [factory.get('/api/v1/orders/1/') for _ in range(count)]
+        start = time.perf_counter()
+        for request in requests:
+            handler(request)
+        return (time.perf_counter() - start) * 1e6 / count
@@ -0,0 +1,77 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.compiled import CompiledSerializer, compile_serializer
+from products.models import Category, Product, ProductImage, ProductVariant
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF and compiled serialization time of a product page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+        size = options['page_size']
+        self._seed(size)
+
+        # Loaded once: only serialization is timed
+        products = list(
+            Product.objects.filter(name__startswith='Bench product ')
+            .select_related('category').prefetch_related('variants', 'additional_images')[:size]
+        )
+        context = {'request': RequestFactory().get('/api/v1/products/products/', HTTP_HOST='api.zotpot.test')}
+        function = compile_serializer(ProductSerializer)
+
+        drf = self._time(lambda: ProductSerializer(products, many=True, context=context).data, options['iterations'])
+        compiled = self._time(
+            lambda: CompiledSerializer(function, products, many=True, context=context).data, options['iterations']
+        )
+        same = (
+            ProductSerializer(products, many=True, context=context).data
+            == CompiledSerializer(function, products, many=True, context=context).data
+        )
+        self.stdout.write(f'{len(products)} products, median of {options["iterations"]} runs')
+        self.stdout.write(f'drf       {drf * 1000:8.2f} ms')
+        self.stdout.write(f'compiled  {compiled * 1000:8.2f} ms  {drf / compiled:.1f}x  identical: {same}')
+
+    def _seed(self, size):
+        existing = Product.objects.filter(name__startswith='Bench product ').count()
+        if existing >= size:
+            return
+        category, _ = Category.objects.get_or_create(name='Bench groceries')
+        for index in range(existing, size):
+            product = Product.objects.create(
+                category=category,
+                name=f'Bench product {index}',
+                description='Synthetic product for serializer benchmarks',
+                price=Decimal(20 + index % 480) + Decimal('0.99'),
+                image='products/bench.jpg',
+                stock=index % 7,
+            )
+            ProductVariant.objects.bulk_create([
+                ProductVariant(product=product, name=name, price_adjustment=Decimal(adjustment), stock=index % 5)
+                for name, adjustment in (('Small', '-5.00'), ('Large', '10.50'))
+            ])
+            ProductImage.objects.bulk_create([
+                ProductImage(product=product, image=f'products/bench-{index}-{side}.jpg', is_primary=not side)
+                for side in range(2)
+            ])
+
+    def _time(self, run, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
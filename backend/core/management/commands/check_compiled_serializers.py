@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from core.compiled import CompiledSerializer, compile_serializer
+from core.renderers import JSONRenderer
+from orders.models import Order, OrderItem, OrderTracking, Payment
+from orders.serializers import (
+    OrderItemSerializer,
+    OrderSerializer,
+    OrderTrackingSerializer,
+    PaymentSerializer,
+)
+from products.models import Category, Product, ProductImage, ProductVariant
+from products.serializers import (
+    CategoryDetailSerializer,
+    CategorySerializer,
+    ProductImageSerializer,
+    ProductSerializer,
+    ProductVariantSerializer,
+)
+from users.models import Address
+from users.serializers import AddressSerializer, UserSerializer
+
+
+def cases():
+    """Serializers served compiled, with querysets of the rows they render."""
+    return [
+        (ProductSerializer, Product.objects.select_related('category').prefetch_related(
+            'variants', 'additional_images')),
+        (ProductVariantSerializer, ProductVariant.objects.select_related('product')),
+        (ProductImageSerializer, ProductImage.objects.all()),
+        (CategorySerializer, Category.objects.all()),
+        (CategoryDetailSerializer, Category.objects.prefetch_related(
+            'products__category', 'products__variants', 'products__additional_images')),
+        (OrderSerializer, Order.objects.select_related(
+            'customer__delivery_profile', 'delivery_agent__delivery_profile', 'delivery_address',
+        ).prefetch_related(
+            'customer__addresses',
+            'delivery_agent__addresses',
+            'items',
+            'tracking_updates',
+            'payments',
+        )),
+        (OrderItemSerializer, OrderItem.objects.all()),
+        (OrderTrackingSerializer, OrderTracking.objects.all()),
+        (PaymentSerializer, Payment.objects.all()),
+        (UserSerializer, get_user_model().objects.select_related('delivery_profile').prefetch_related('addresses')),
+        (AddressSerializer, Address.objects.all()),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Render stored rows with each compiled serializer and its DRF '
+        'serializer and fail on any difference in the JSON bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help='Rows checked per serializer')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        # Absolute file URLs depend on the request; check with and without one
+        contexts = [{}, {'request': RequestFactory().get('/api/v1/', HTTP_HOST='api.zotpot.test')}]
+        failures = 0
+
+        for serializer_class, queryset in cases():
+            name = serializer_class.__name__
+            function = compile_serializer(serializer_class)
+            if function is None:
+                self.stdout.write(f'{name:28} not compilable; served by DRF')
+                continue
+            rows = list(queryset.order_by('pk')[:options['limit']])
+            mismatched = 0
+            for context in contexts:
+                for row in rows:
+                    expected = renderer.render(serializer_class(row, context=context).data)
+                    actual = renderer.render(CompiledSerializer(function, row, context=context).data)
+                    if actual != expected:
+                        mismatched += 1
+                        if mismatched == 1:
+                            self.stderr.write(f'{name} pk={row.pk}:\n  drf:      {expected[:400]}\n'
+                                              f'  compiled: {actual[:400]}')
+                expected = renderer.render(serializer_class(rows, many=True, context=context).data)
+                actual = renderer.render(CompiledSerializer(function, rows, many=True, context=context).data)
+                if actual != expected:
+                    mismatched += 1
+            failures += mismatched
+            status = 'ok' if not mismatched else f'{mismatched} mismatches'
+            self.stdout.write(f'{name:28} {len(rows):5} rows  {status}')
+
+        if failures:
+            raise CommandError(f'{failures} compiled renderings differ from DRF')
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the REST/WebSocket load-test scenarios in-process and report '
+        'throughput and latency percentiles per endpoint as JSON. '
+        'Use with DJANGO_SETTINGS_MODULE=zotpot.settings_loadtest.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--customers', type=int, default=10, help='Concurrent browse/checkout users')
+        parser.add_argument('--agents', type=int, default=10, help='Concurrent agents streaming locations')
+        parser.add_argument('--admins', type=int, default=2, help='Concurrent admin listing users')
+        parser.add_argument('--pings', type=int, default=20, help='Location frames per agent iteration')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='Previous JSON report to diff p50/p99 against')
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+        fixtures = loadtest.seed(
+            customers=max(options['customers'], 1),
+            agents=max(options['agents'], 1),
+        )
+        users = [fixtures['admin'], *fixtures['customers'], *(user for user, _ in fixtures['agent_orders'])]
+        tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+
+        from zotpot.asgi import application
+
+        summary = asyncio.run(loadtest.run(
+            application,
+            fixtures,
+            tokens,
+            duration=options['duration'],
+            customers=options['customers'],
+            agents=options['agents'],
+            admins=options['admins'],
+            pings=options['pings'],
+            seed_value=options['seed'],
+        ))
+
+        report = {
+            'meta': {
+                'commit': self._commit(),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'duration': options['duration'],
+                'customers': options['customers'],
+                'agents': options['agents'],
+                'admins': options['admins'],
+                'pings': options['pings'],
+                'seed': options['seed'],
+            },
+            **summary,
+        }
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                fp.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            self._compare(options['compare'], report)
+
+    def _commit(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, report):
+        with open(path) as fp:
+            previous = json.load(fp)
+
+        self.stderr.write(f"{'endpoint':45s} {'p50 ms':>18s} {'p99 ms':>18s}")
+        for label, current in report['endpoints'].items():
+            before = previous.get('endpoints', {}).get(label)
+            if before is None:
+                continue
+            self.stderr.write(
+                f"{label:45s} "
+                f"{before['p50_ms']:8.2f} -> {current['p50_ms']:7.2f} "
+                f"{before['p99_ms']:8.2f} -> {current['p99_ms']:7.2f}"
+            )
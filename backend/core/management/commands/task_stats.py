@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from core.celery_signals import task_summary
+
+SORT_KEYS = {
+    'p95': lambda row: row['runtime'].get('p95') or 0,
+    'mean': lambda row: row['runtime'].get('mean') or 0,
+    'latency': lambda row: row['queue_latency'].get('p95') or 0,
+    'runs': lambda row: row['runs'],
+    'failures': lambda row: row['failures'],
+}
+
+
+def _seconds(value):
+    if value is None:
+        return '-'
+    if value < 1:
+        return f'{value * 1000:.0f}ms'
+    return f'{value:.1f}s'
+
+
+class Command(BaseCommand):
+    help = 'Show the slowest Celery tasks from the metrics published by workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='p95')
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rows = sorted(task_summary(), key=SORT_KEYS[options['sort']], reverse=True)
+        if not rows:
+            self.stdout.write('No task metrics published yet (is METRICS_SHARED_URL set?).')
+            return
+
+        header = (f'{"task":45} {"runs":>7} {"fail":>5} {"retry":>5} {"overlap":>7} '
+                  f'{"mean":>7} {"p95":>7} {"p99":>7} {"queue p95":>9}')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows[:options['limit']]:
+            runtime, latency = row['runtime'], row['queue_latency']
+            self.stdout.write(
+                f'{row["task"][:45]:45} {row["runs"]:>7} {row["failures"]:>5} '
+                f'{row["retries"]:>5} {row["overlaps"]:>7} '
+                f'{_seconds(runtime.get("mean")):>7} {_seconds(runtime.get("p95")):>7} '
+                f'{_seconds(runtime.get("p99")):>7} {_seconds(latency.get("p95")):>9}'
+            )
@@ -0,0 +1,276 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Metrics are plain counters, gauges and fixed-bucket histograms guarded by a
+lock per metric, cheap enough to leave on in production. Each process
+(web, ASGI, Celery worker) keeps its own registry; when
+``METRICS_SHARED_URL`` points at Redis, processes periodically publish a
+snapshot there and the metrics endpoint merges them.
+"""
+
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple([str(labels.get(name, '')) for name in self.labelnames])
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'kind': self.kind,
+                'help': self.documentation,
+                'labelnames': list(self.labelnames),
+                'values': [[list(key), self._dump(value)] for key, value in self._values.items()],
+            }
+
+    def _dump(self, value):
+        return value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    def _dump(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self._publish_interval = None
+        self._client = None
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    # Cross-process sharing
+
+    @property
+    def process_key(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def _shared_client(self):
+        url = getattr(settings, 'METRICS_SHARED_URL', None)
+        if not url:
+            return None
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(url)
+        return self._client
+
+    def maybe_publish(self):
+        """Publish this process's snapshot if the publish interval has passed."""
+        if self._publish_interval is None:
+            self._publish_interval = getattr(settings, 'METRICS_PUBLISH_INTERVAL', 15)
+        now = time.monotonic()
+        if now - self._last_publish < self._publish_interval:
+            return
+        self._last_publish = now
+        client = self._shared_client()
+        if client is None:
+            return
+        try:
+            client.hset('zotpot:metrics', self.process_key, json.dumps({
+                'time': time.time(),
+                'metrics': self.snapshot(),
+            }))
+        except Exception:
+            pass  # Metrics must never break the request or task
+
+    def collect(self):
+        """Snapshots of this process plus every live peer that published one."""
+        snapshots = [self.snapshot()]
+        client = self._shared_client()
+        if client is None:
+            return snapshots
+
+        max_age = getattr(settings, 'METRICS_PUBLISH_INTERVAL', 15) * 4
+        try:
+            published = client.hgetall('zotpot:metrics')
+        except Exception:
+            return snapshots
+        for key, payload in published.items():
+            key = key.decode() if isinstance(key, bytes) else key
+            if key == self.process_key:
+                continue
+            data = json.loads(payload)
+            if time.time() - data['time'] > max_age:
+                client.hdel('zotpot:metrics', key)
+                continue
+            snapshots.append(data['metrics'])
+        return snapshots
+
+
+registry = Registry()
+
+
+def _merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, values={}))
+            for key, value in metric['values']:
+                key = tuple(key)
+                current = target['values'].get(key)
+                if current is None:
+                    target['values'][key] = value
+                elif metric['kind'] == 'histogram':
+                    target['values'][key] = [
+                        [a + b for a, b in zip(current[0], value[0])],
+                        current[1] + value[1],
+                        current[2] + value[2],
+                    ]
+                else:
+                    # Gauges are summed too: they track per-process totals
+                    # such as in-use connections or in-flight requests
+                    target['values'][key] = current + value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labelnames, key, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_prometheus(snapshots=None):
+    """Render merged snapshots in the Prometheus text exposition format."""
+    merged = merge_snapshots(snapshots)
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        labelnames = metric['labelnames']
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["kind"]}')
+        for key in sorted(metric['values']):
+            value = metric['values'][key]
+            if metric['kind'] != 'histogram':
+                lines.append(f'{name}{_labels(labelnames, key)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'], counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f'{name}_bucket{_labels(labelnames, key, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{name}_bucket{_labels(labelnames, key, le)} {count}')
+            lines.append(f'{name}_sum{_labels(labelnames, key)} {total}')
+            lines.append(f'{name}_count{_labels(labelnames, key)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def merge_snapshots(snapshots=None):
+    """Merge per-process snapshots into ``{name: metric}`` with tuple keys."""
+    return _merge(snapshots if snapshots is not None else registry.collect())
+
+
+def histogram_quantile(quantile, buckets, counts):
+    """
+    Estimate a quantile from bucket counts, interpolating linearly inside
+    the bucket as Prometheus does. Observations above the last bound are
+    reported as that bound.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(buckets, counts):
+        if count and cumulative + count >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return buckets[-1]
@@ -0,0 +1,144 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .instrumentation import QueryStats, view_label
+from .metrics import SIZE_BUCKETS, registry
+
+http_requests = registry.counter(
+    'zotpot_http_requests_total',
+    'HTTP requests by view action, method and status.',
+    ['view', 'method', 'status'],
+)
+http_duration = registry.histogram(
+    'zotpot_http_request_duration_seconds',
+    'HTTP request latency by view action.',
+    ['view'],
+)
+http_queries = registry.counter(
+    'zotpot_http_db_queries_total',
+    'Database queries issued while serving requests, by view action.',
+    ['view'],
+)
+http_query_seconds = registry.counter(
+    'zotpot_http_db_query_seconds_total',
+    'Time spent in database queries while serving requests, by view action.',
+    ['view'],
+)
+http_response_bytes = registry.histogram(
+    'zotpot_http_response_bytes',
+    'Serialized response payload size by view action.',
+    ['view'],
+    buckets=SIZE_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """
+    Records per-action request counts, latency, database query count/time
+    and response size. Queries slower than ``METRICS_SLOW_QUERY_MS`` are
+    logged with their SQL for staff requests sending ``X-Slow-Query-Log: 1``
+    (or all requests when ``METRICS_SLOW_QUERY_LOG`` is on).
+
+    Works in both sync and async chains, so async views are not forced
+    back onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'METRICS_SLOW_QUERY_MS', 100) / 1000
+        self.log_all = getattr(settings, 'METRICS_SLOW_QUERY_LOG', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, start = self._begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            stats.stop()
+        self._finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, start = self._begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            stats.stop()
+        self._finish(request, response, stats, start)
+        return response
+
+    def _begin(self, request):
+        # request.META rather than request.headers, which is rebuilt per request;
+        # the SQL is only logged if the user turns out to be staff
+        capture = self.log_all or request.META.get('HTTP_X_SLOW_QUERY_LOG') == '1'
+        stats = QueryStats(self.slow_threshold if capture else None)
+        request._metrics_view = 'unresolved'
+        start = time.perf_counter()
+        stats.start()
+        return stats, start
+
+    def _finish(self, request, response, stats, start):
+        elapsed = time.perf_counter() - start
+
+        view = request._metrics_view
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_duration.observe(elapsed, view=view)
+        if stats.count:
+            http_queries.inc(stats.count, view=view)
+            http_query_seconds.inc(stats.duration, view=view)
+        if not response.streaming:
+            http_response_bytes.observe(len(response.content), view=view)
+        if stats.slow and (self.log_all or self._is_staff(request)):
+            stats.log_slow(f'{request.method} {request.path} ({view})')
+
+        registry.maybe_publish()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_label(view_func, request.method)
+
+    def _is_staff(self, request):
+        # Set by the session middleware, or by DRF once a view authenticated
+        # the request (e.g. with a JWT); not known before the view runs
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can sit in an async middleware chain. Static lookups
+    are in-memory (or a filesystem check with autorefresh), so they run
+    inline; everything else is awaited without a thread hop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,64 @@
+"""
+PostgreSQL backend whose connections come from a per-process pool.
+
+Use ``ENGINE = 'core.postgresql_pool'`` with the pool's options under
+``POOL`` (see ``core.db_pool.DEFAULTS``) and ``CONN_MAX_AGE = 0``: Django
+still "closes" its connection after every request, task and
+``database_sync_to_async`` call, but closing hands the connection back to
+the pool, which has already rolled back any open transaction.
+"""
+
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from core.db_pool import ConnectionPool, get_pool
+
+# libpq's PGTransactionStatusType, shared by psycopg2 and psycopg 3
+TRANSACTION_IDLE = 0
+TRANSACTION_UNKNOWN = 4
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return True
+
+
+def reset_connection(connection):
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == TRANSACTION_UNKNOWN:
+        return False
+    if status != TRANSACTION_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, lambda: ConnectionPool(
+            self.alias,
+            connect=None,
+            check=check_connection,
+            reset=reset_connection,
+            close=lambda connection: connection.close(),
+            options=self.settings_dict.get('POOL'),
+        ))
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        # The parent sets this when it opens a connection; a reused one
+        # already has the configured level applied.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,78 @@
+"""
+Primary-key relations resolved in bulk for nested ``many=True`` writes.
+
+A ``PrimaryKeyRelatedField`` runs one query per value, so a checkout with a
+product and a variant on each line costs two SELECTs a line before anything
+is saved. ``BulkListSerializer`` collects the ids every item sends for its
+``BulkPrimaryKeyRelatedField`` fields and fetches each field's queryset with
+one ``in_bulk``; the fields then find their objects in memory. The item
+serializer's ``validate`` sees resolved objects, so checks across relations
+(a variant of the right product) need no further queries either.
+
+Used on its own, outside a ``BulkListSerializer``, the field behaves exactly
+like ``PrimaryKeyRelatedField``.
+"""
+
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError
+from rest_framework import relations, serializers
+
+
+class BulkPrimaryKeyRelatedField(relations.PrimaryKeyRelatedField):
+    """``PrimaryKeyRelatedField`` reading the objects its list serializer fetched."""
+
+    def to_pk(self, data):
+        """``data`` as a key of ``in_bulk``'s result; raises for anything that isn't a pk."""
+        if isinstance(data, bool):
+            raise TypeError('A boolean is not a primary key')
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def to_internal_value(self, data):
+        objects = getattr(self.parent, 'bulk_objects', {}).get(self.field_name)
+        if objects is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, ValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return objects[pk]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ``ListSerializer`` fetching the objects of the child's bulk fields with
+    one query per field, before the items are validated.
+    """
+
+    def to_internal_value(self, data):
+        fields = [
+            field for field in self.child._writable_fields
+            if isinstance(field, BulkPrimaryKeyRelatedField)
+        ]
+        if not fields or not isinstance(data, list):
+            return super().to_internal_value(data)
+        self.child.bulk_objects = {field.field_name: self.fetch(field, data) for field in fields}
+        try:
+            return super().to_internal_value(data)
+        finally:
+            del self.child.bulk_objects
+
+    def fetch(self, field, data):
+        pks = set()
+        for item in data:
+            if not isinstance(item, Mapping) or item.get(field.field_name) is None:
+                continue
+            try:
+                pks.add(field.to_pk(item[field.field_name]))
+            except (TypeError, ValueError, ValidationError, serializers.ValidationError):
+                # The field reports it when the item is validated
+                continue
+        if not pks:
+            return {}
+        return field.get_queryset().in_bulk(pks)
@@ -0,0 +1,105 @@
+"""
+Faster JSON rendering and parsing for the API.
+
+``JSONRenderer`` and ``JSONParser`` are drop-in replacements for DRF's,
+selected in ``REST_FRAMEWORK``. With orjson installed they encode and
+decode in C, several times faster than the stdlib on nested serializer
+output; without it they fall back to the stdlib ``json`` module.
+
+Output matches DRF's renderer byte for byte for everything serializers
+produce: compact separators, UTF-8 rather than ``\\u`` escapes, ``Z`` for UTC
+datetimes, decimals as numbers, lazy translation strings forced, and
+U+2028/U+2029 escaped. Differences are limited to float spelling
+(``1e16`` vs ``1e+16``) and non-finite floats, which orjson writes as
+``null``. Indented output (the browsable API, ``Accept: ...; indent=4``)
+and anything orjson refuses, such as integers wider than 64 bits, are
+rendered by the stdlib.
+"""
+
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def orjson_available():
+    return orjson is not None
+
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    # Types orjson has no native form for (Decimal, Promise, QuerySet, ...),
+    # converted the way DRF's encoder does
+    return _drf_encoder.default(obj)
+
+
+def _escape_line_separators(content):
+    # Keeps the output a strict JavaScript subset, as DRF does
+    for raw, escaped in LINE_SEPARATORS:
+        if raw in content:
+            content = content.replace(raw, escaped)
+    return content
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's ``JSONRenderer``, encoding with orjson when available."""
+
+    # UTC as "Z", like DRF's encoder
+    orjson_options = orjson.OPT_UTC_Z if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return self.render_stdlib(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=_default, option=self.orjson_options)
+        except (orjson.JSONEncodeError, TypeError):
+            return self.render_stdlib(data, accepted_media_type, renderer_context)
+        return _escape_line_separators(content)
+
+    def render_stdlib(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF's ``JSONParser``, decoding with orjson when available."""
+
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read() if stream is not None else b''
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as exc:
+            if not self.strict and (b'NaN' in content or b'Infinity' in content):
+                # Non-standard constants the stdlib accepts unless STRICT_JSON
+                return super().parse(io.BytesIO(content), media_type, parser_context)
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+def default_renderer():
+    """The first configured renderer, which the async views render with."""
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]()
@@ -0,0 +1,324 @@
+"""
+Priority-aware rate limiting and load shedding.
+
+Every API action belongs to a priority class: ``checkout`` (placing and
+paying for orders), ``tracking`` (agent location updates and the tracking
+streams) or ``browsing`` (everything else, the default). Views choose
+theirs with ``priority_class`` and per-action ``priority_classes``.
+
+Two things can turn a request away, with 429 and ``Retry-After``:
+
+* Rate limits. Each class has a token-bucket budget (``RATE_LIMITS``) per
+  user, or per client IP for anonymous requests. Buckets live in Redis
+  (``RATE_LIMIT_URL``) so every process shares them; without it they are
+  per process.
+* Load shedding. The process tracks its in-flight requests and, under
+  ASGI, how late the event loop runs timers. When either passes its share
+  of ``LOAD_SHEDDING`` limits, the low-priority classes are refused before
+  doing any work: browsing first, then tracking. Checkout is never shed.
+
+Tracking sockets apply the same rules by dropping frames instead, and
+location fan-out is shed before frames are numbered (tracking/fanout.py).
+"""
+
+import asyncio
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+CHECKOUT = 'checkout'
+TRACKING = 'tracking'
+BROWSING = 'browsing'
+
+DEFAULT_RATE_LIMITS = {
+    CHECKOUT: {'rate': '30/min', 'burst': 10},
+    TRACKING: {'rate': '60/min', 'burst': 10},
+    BROWSING: {'rate': '120/min', 'burst': 40},
+}
+DEFAULT_LOAD_SHEDDING = {
+    'MAX_IN_FLIGHT': 200,  # Concurrent requests per process
+    'MAX_LOOP_LAG': 0.2,  # Seconds the event loop runs behind
+    # Load, as a fraction of the limits above, at which each class is shed
+    'SHED_AT': {BROWSING: 0.7, TRACKING: 0.9},
+}
+
+requests_refused = registry.counter(
+    'zotpot_requests_refused_total',
+    'Requests and frames refused, by priority class, source and reason (rate/shed).',
+    ['priority', 'source', 'reason'],
+)
+in_flight_gauge = registry.gauge(
+    'zotpot_http_in_flight',
+    'HTTP requests currently being served by this process.',
+)
+loop_lag_gauge = registry.gauge(
+    'zotpot_event_loop_lag_seconds',
+    'How late the event loop last ran a timer (ASGI processes).',
+)
+load_gauge = registry.gauge(
+    'zotpot_load_ratio',
+    'Process load as a fraction of its shedding limits.',
+)
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """``'60/min'`` -> tokens per second."""
+    count, period = rate.split('/')
+    return int(count) / PERIODS[period]
+
+
+# Token buckets
+
+# KEYS[1]: bucket; ARGV: tokens per second, capacity. Returns
+# {allowed, seconds until the next token}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring((1 - tokens) / rate)}
+"""
+
+
+class TokenBucket:
+    """A single in-process bucket."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'at')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.at = time.monotonic()
+
+    def take(self, now=None):
+        """Return ``(allowed, seconds until the next token)``."""
+        now = now if now is not None else time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class TokenBuckets:
+    """
+    Named buckets in Redis when ``RATE_LIMIT_URL`` is set, else in this
+    process. Redis errors let requests through rather than failing them.
+    """
+
+    prefix = 'zotpot:ratelimit:'
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_clients = {}
+
+    def _url(self):
+        return getattr(settings, 'RATE_LIMIT_URL', None)
+
+    def take(self, key, rate, burst):
+        url = self._url()
+        if not url:
+            return self.take_local(key, rate, burst)
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(url)
+        try:
+            allowed, wait = self._client.eval(TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, rate, burst)
+        except Exception:
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+    async def atake(self, key, rate, burst):
+        url = self._url()
+        if not url:
+            return self.take_local(key, rate, burst)
+        # redis.asyncio clients are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            import redis.asyncio
+            client = self._async_clients[loop] = redis.asyncio.Redis.from_url(url)
+        try:
+            allowed, wait = await client.eval(TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, rate, burst)
+        except Exception:
+            return True, 0.0
+        return bool(allowed), float(wait)
+
+    def take_local(self, key, rate, burst):
+        """Take from this process's bucket only (no I/O, safe on the event loop)."""
+        with self._lock:
+            bucket = self._local.get(key)
+            if bucket is None:
+                if len(self._local) > 100000:
+                    self._local = {}
+                bucket = self._local[key] = TokenBucket(rate, burst)
+            return bucket.take()
+
+
+buckets = TokenBuckets()
+
+
+def budget(priority):
+    limits = dict(DEFAULT_RATE_LIMITS, **getattr(settings, 'RATE_LIMITS', {}))[priority]
+    return parse_rate(limits['rate']), limits['burst']
+
+
+# Load
+
+class LoadMonitor:
+    """In-flight requests and event-loop lag of this process."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self._lock = threading.Lock()
+        self._watched = set()
+
+    def _limits(self):
+        return dict(DEFAULT_LOAD_SHEDDING, **getattr(settings, 'LOAD_SHEDDING', {}))
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+        in_flight_gauge.set(self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+        in_flight_gauge.set(self.in_flight)
+
+    def load(self):
+        limits = self._limits()
+        return max(self.in_flight / limits['MAX_IN_FLIGHT'], self.loop_lag / limits['MAX_LOOP_LAG'])
+
+    def should_shed(self, priority):
+        threshold = self._limits()['SHED_AT'].get(priority)
+        return threshold is not None and self.load() >= threshold
+
+    def watch_event_loop(self, interval=0.05):
+        """Start sampling the running loop's lag, once per loop."""
+        loop = asyncio.get_running_loop()
+        if loop in self._watched:
+            return
+        self._watched.add(loop)
+        loop.create_task(self._sample_lag(loop, interval))
+
+    async def _sample_lag(self, loop, interval):
+        try:
+            while True:
+                start = loop.time()
+                await asyncio.sleep(interval)
+                # Decays quickly once the loop catches up
+                self.loop_lag = max(0.0, loop.time() - start - interval)
+                loop_lag_gauge.set(self.loop_lag)
+                load_gauge.set(self.load())
+        finally:
+            self._watched.discard(loop)
+
+
+load_monitor = LoadMonitor()
+
+
+def check(priority, key, source):
+    """
+    Return ``None`` if a request may proceed, else the seconds the client
+    should wait. Shedding is checked first; it needs no round trip.
+    """
+    if load_monitor.should_shed(priority):
+        requests_refused.inc(priority=priority, source=source, reason='shed')
+        return 1.0
+    rate, burst = budget(priority)
+    allowed, wait = buckets.take(f'{priority}:{key}', rate, burst)
+    if not allowed:
+        requests_refused.inc(priority=priority, source=source, reason='rate')
+        return wait
+    return None
+
+
+async def acheck(priority, key, source):
+    """``check`` for async views."""
+    if load_monitor.should_shed(priority):
+        requests_refused.inc(priority=priority, source=source, reason='shed')
+        return 1.0
+    rate, burst = budget(priority)
+    allowed, wait = await buckets.atake(f'{priority}:{key}', rate, burst)
+    if not allowed:
+        requests_refused.inc(priority=priority, source=source, reason='rate')
+        return wait
+    return None
+
+
+def view_priority(view_cls, action):
+    classes = getattr(view_cls, 'priority_classes', {})
+    if action in classes:
+        return classes[action]
+    return getattr(view_cls, 'priority_class', BROWSING)
+
+
+class PriorityThrottle(BaseThrottle):
+    """DRF throttle applying the view's priority class budget and shedding."""
+
+    def allow_request(self, request, view):
+        priority = view_priority(type(view), getattr(view, 'action', None))
+        user = request.user
+        key = f'user:{user.pk}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        self.wait_seconds = check(priority, key, type(view).__name__)
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoadMiddleware:
+    """
+    Counts in-flight requests for load shedding and, under ASGI, samples
+    event-loop lag. Place it first so the count covers the whole chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        load_monitor.enter()
+        try:
+            return self.get_response(request)
+        finally:
+            load_monitor.leave()
+
+    async def __acall__(self, request):
+        load_monitor.watch_event_loop()
+        load_monitor.enter()
+        try:
+            return await self.get_response(request)
+        finally:
+            load_monitor.leave()
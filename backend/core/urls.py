@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import MetricsView, TaskMetricsView
+
+urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('metrics/tasks/', TaskMetricsView.as_view(), name='task-metrics'),
+]
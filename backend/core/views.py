@@ -0,0 +1,24 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .celery_signals import task_summary
+from .metrics import render_prometheus
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class TaskMetricsView(APIView):
+    """Per-task summary of Celery metrics published by the workers."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(task_summary())
@@ -0,0 +1,247 @@
+"""
+Cold archive for finished orders.
+
+Delivered and cancelled orders older than ``ORDER_ARCHIVE_AFTER_DAYS`` are
+moved out of the hot tables into gzip-compressed NDJSON segment files, one
+per batch, one line per order holding the order with its items, tracking
+trail and payments. Segments are saved to ``ORDER_ARCHIVE_STORAGE``, which
+every web node must be able to read: a private bucket, or a local directory
+on a single host. Every line is its own gzip member, so a
+segment is still an ordinary ``.ndjson.gz`` file (``zcat`` reads it) while
+a single order can be read back by seeking to its offset. ``ArchivedOrder``
+rows are the index.
+
+Archived orders are read back as unsaved model instances with their
+related rows prefetched, so ``OrderSerializer`` renders them exactly like
+live ones.
+"""
+
+import gzip
+import io
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core import serializers
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ArchivedOrder, Order, OrderEvent, OrderItem, OrderTracking, Payment
+
+ARCHIVABLE_STATUSES = (Order.Status.DELIVERED, Order.Status.CANCELLED)
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def archive_storage():
+    """Return the process-wide segment storage configured by ``settings.ORDER_ARCHIVE_STORAGE``."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                config = getattr(settings, 'ORDER_ARCHIVE_STORAGE', {})
+                backend = import_string(
+                    config.get('BACKEND', 'django.core.files.storage.FileSystemStorage')
+                )
+                options = config.get('OPTIONS', {
+                    'location': os.path.join(settings.BASE_DIR, 'archive', 'orders'),
+                })
+                _storage = backend(**options)
+    return _storage
+
+
+def archivable_orders(days=None):
+    days = days if days is not None else getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90)
+    cutoff = timezone.now() - timezone.timedelta(days=days)
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff)
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds; keep timestamps exact
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _rows(objects):
+    return serializers.serialize('python', objects)
+
+
+def _record(order):
+    return {
+        'order': _rows([order])[0],
+        'items': _rows(order.items.all()),
+        'tracking': _rows(order.tracking_updates.all()),
+        'payments': _rows(order.payments.all()),
+    }
+
+
+class SegmentWriter:
+    """Builds one segment in memory; ``write`` returns each order's location in it."""
+
+    def __init__(self, storage=None):
+        now = timezone.now()
+        self.storage = storage or archive_storage()
+        self.segment = (
+            f'{now:%Y}/{now:%m}/orders-{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.gz'
+        )
+        self.buffer = io.BytesIO()
+
+    def write(self, record):
+        line = json.dumps(record, cls=ArchiveEncoder, separators=(',', ':')) + '\n'
+        member = gzip.compress(line.encode(), mtime=0)
+        offset = self.buffer.tell()
+        self.buffer.write(member)
+        return offset, len(member)
+
+    def save(self):
+        """Store the segment and return its name, which the storage may have changed."""
+        # Index rows are committed after this, so the segment must be stored first
+        self.segment = self.storage.save(self.segment, ContentFile(self.buffer.getvalue()))
+        return self.segment
+
+
+def archive_orders(days=None, batch_size=500, limit=None):
+    """
+    Move finished orders into the archive, one segment of up to
+    ``batch_size`` orders per transaction. Returns the number of orders
+    archived.
+
+    A batch's segment is stored before its index rows are committed and the
+    hot rows deleted; a crash in between leaves only an unreferenced
+    segment.
+    """
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        with transaction.atomic():
+            orders = list(
+                archivable_orders(days)
+                .order_by('id')
+                .select_for_update(skip_locked=True)[:size]
+            )
+            if not orders:
+                break
+            prefetch_related_objects(orders, 'items', 'tracking_updates', 'payments')
+
+            writer = SegmentWriter()
+            locations = [writer.write(_record(order)) for order in orders]
+            segment = writer.save()
+            entries = [
+                ArchivedOrder(
+                    id=order.id,
+                    customer_id=order.customer_id,
+                    delivery_agent_id=order.delivery_agent_id,
+                    status=order.status,
+                    total=order.total,
+                    segment=segment,
+                    offset=offset,
+                    length=length,
+                    created_at=order.created_at,
+                )
+                for order, (offset, length) in zip(orders, locations)
+            ]
+
+            ids = [order.id for order in orders]
+            ArchivedOrder.objects.bulk_create(entries, ignore_conflicts=True)
+            OrderTracking.objects.filter(order_id__in=ids).delete()
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Payment.objects.filter(order_id__in=ids).delete()
+            OrderEvent.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(id__in=ids).delete()
+        archived += len(orders)
+    return archived
+
+
+# Reading
+
+def archived_orders_for(user):
+    # Same scoping as OrderViewSet.get_queryset
+    if user.role == 'customer':
+        return ArchivedOrder.objects.filter(customer=user)
+    elif user.role == 'delivery_agent':
+        return ArchivedOrder.objects.filter(delivery_agent=user)
+    return ArchivedOrder.objects.all()
+
+
+def read_record(entry, storage=None):
+    with (storage or archive_storage()).open(entry.segment, 'rb') as segment:
+        segment.seek(entry.offset)
+        member = segment.read(entry.length)
+    return json.loads(gzip.decompress(member))
+
+
+def _objects(rows):
+    return [deserialized.object for deserialized in serializers.deserialize('python', rows)]
+
+
+def _prefetched(order, name, objects):
+    # What prefetch_related leaves behind: an evaluated related queryset
+    queryset = getattr(order, name).all()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    order._prefetched_objects_cache[name] = queryset
+
+
+def hydrate(entry, record):
+    """
+    Rebuild an archived order as an unsaved ``Order`` with everything
+    ``OrderSerializer`` reads already loaded. Users, addresses and products
+    still come from the live tables; ones deleted since read as ``None``.
+    """
+    order = _objects([record['order']])[0]
+    # Kept current by the index's foreign keys
+    order.customer_id = entry.customer_id
+    order.delivery_agent_id = entry.delivery_agent_id
+    order._state.adding = False
+    order._prefetched_objects_cache = {}
+
+    items = _objects(record['items'])
+    tracking = sorted(_objects(record['tracking']), key=lambda update: update.created_at, reverse=True)
+    payments = _objects(record['payments'])
+    for child in (*items, *tracking, *payments):
+        child.order = order
+        child._state.adding = False
+    _prefetched(order, 'items', items)
+    _prefetched(order, 'tracking_updates', tracking)
+    _prefetched(order, 'payments', payments)
+
+    # Same plan as the live order detail view
+    prefetch_related_objects(
+        [order],
+        'customer__delivery_profile',
+        'delivery_agent__delivery_profile',
+        'delivery_address',
+        'customer__addresses',
+        'delivery_agent__addresses',
+    )
+    # Archived before items carried a snapshot: take it from the live catalog
+    missing = [item for item in items if not item.product_name]
+    if missing:
+        prefetch_related_objects(missing, 'product__additional_images', 'variant')
+        for item in missing:
+            try:
+                item.take_snapshot()
+            except ObjectDoesNotExist:
+                pass
+    return order
+
+
+def load_archived_order(user, pk):
+    """The archived order ``pk`` visible to ``user``, or ``None``."""
+    try:
+        entry = archived_orders_for(user).get(pk=pk)
+    except (ArchivedOrder.DoesNotExist, TypeError, ValueError):
+        return None
+    return hydrate(entry, read_record(entry))
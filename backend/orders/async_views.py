@@ -0,0 +1,78 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from core.async_views import AsyncPageNumberPagination, authenticate, render, require_user
+from core.compiled import serialize
+from core.conditional import avalidators_for, not_modified, validator_headers
+from core.db_router import ais_pinned, allow_replica_reads
+from .archive import load_archived_order
+from .models import Order, OrderTracking
+from .serializers import OrderSerializer, OrderTrackingSerializer
+from .views import OrderViewSet, orders_for
+
+async def order_detail(request, pk):
+    """Async ``OrderViewSet.retrieve``."""
+    user = require_user(await authenticate(request))
+    if not await ais_pinned(user.id):
+        allow_replica_reads()
+
+    try:
+        validators = await avalidators_for(
+            orders_for(user).filter(pk=pk), OrderViewSet.conditional_fields, detail=True
+        )
+    except (TypeError, ValueError):
+        validators = None
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+
+    # Everything OrderSerializer reads, loaded before serializing on the loop
+    queryset = orders_for(user).select_related(
+        'customer__delivery_profile',
+        'delivery_agent__delivery_profile',
+        'delivery_address',
+    ).prefetch_related(
+        'customer__addresses',
+        'delivery_agent__addresses',
+        'items',
+        'tracking_updates',
+        'payments',
+    )
+    try:
+        order = await queryset.aget(pk=pk)
+    except (Order.DoesNotExist, TypeError, ValueError):
+        return await archived_order_detail(request, user, pk)
+
+    data = serialize(OrderSerializer, order, context={'request': request})
+    if validators is None:
+        return data
+    return render(data, headers=validator_headers(validators))
+
+@sync_to_async
+def archived_order_detail(request, user, pk):
+    # Rare enough to load and serialize off the event loop
+    order = load_archived_order(user, pk)
+    if order is None:
+        raise Http404
+    return serialize(OrderSerializer, order, context={'request': request})
+
+async def order_tracking_list(request, order_pk):
+    """Async ``OrderTrackingViewSet.list``."""
+    user = require_user(await authenticate(request))
+
+    # Only the trail of an order the user may see
+    try:
+        visible = await orders_for(user).filter(pk=order_pk).aexists()
+    except (TypeError, ValueError):
+        visible = False
+    if not visible:
+        raise Http404
+
+    queryset = OrderTracking.objects.filter(order_id=order_pk)
+    paginator = AsyncPageNumberPagination()
+    try:
+        page = await paginator.apaginate_queryset(queryset, request)
+    except ValueError:
+        raise Http404
+
+    data = serialize(OrderTrackingSerializer, page, many=True, context={'request': request})
+    return paginator.get_paginated_data(data)
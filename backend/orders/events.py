@@ -0,0 +1,225 @@
+"""
+Transactional outbox of order events.
+
+Every order change the app should hear about (a status change, an agent
+assignment, a payment, the agent arriving) calls ``record_order_event``
+in the transaction that makes the change, so an event exists if and only
+if the change committed. The relay (``relay_order_events`` task, kicked
+when an event commits and run by beat as a backstop) drains pending
+events in id order, in batches claimed with ``SKIP LOCKED`` so several
+workers can relay at once:
+
+- each event is sent to its ``order_{id}`` socket group as an
+  ``order_event`` frame carrying the event id, which the app uses to drop
+  the repeat it gets if a relay dies after sending but before committing,
+  and numbered in the order's stream for replay (tracking/streams.py);
+- notifiable events enqueue ``notify_order_event``, which claims the
+  event's ``notified_at`` before queueing its pushes, so each is queued
+  once; a push failing with a transient FCM error is retried with backoff
+  (``send_order_notification``).
+
+Events are recorded after the order row is written, so the row lock
+orders the events of one order by id. A batch leaves out events of orders
+with an earlier event claimed by another relay, which keeps each order's
+events in order on the socket.
+"""
+
+import datetime
+import math
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.metrics import registry
+from tracking.fanout import order_group_name
+from tracking.streams import get_stream_buffer
+
+from .models import Order, OrderEvent
+
+RELAY_KICK_KEY = 'orders:event_relay_kicked'
+
+events_published = registry.counter(
+    'zotpot_order_events_published_total',
+    'Order events relayed from the outbox to socket groups, by kind.',
+    ['kind'],
+)
+event_lag = registry.histogram(
+    'zotpot_order_event_lag_seconds',
+    'Time from an order event being recorded to it being relayed.',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+def record_order_event(order, kind, description=''):
+    """Add an event for ``order``'s current state to the outbox, in the caller's transaction."""
+    event = OrderEvent.objects.create(
+        order_id=order.pk,
+        kind=kind,
+        payload={
+            'status': order.status,
+            'payment_status': order.payment_status,
+            'delivery_agent_id': order.delivery_agent_id,
+            'description': description,
+        },
+    )
+    transaction.on_commit(kick_relay)
+    return event
+
+
+def kick_relay():
+    # One queued relay at a time; the relay clears the key before reading
+    if cache.add(RELAY_KICK_KEY, True, settings.ORDER_EVENT_KICK_TIMEOUT):
+        from .tasks import relay_order_events  # Import here to avoid circular import
+
+        relay_order_events.delay()
+
+
+def event_frame(event):
+    return {
+        'type': 'order_event',
+        'id': event.pk,
+        'order_id': event.order_id,
+        'kind': event.kind,
+        'created_at': event.created_at.isoformat(),
+        **event.payload,
+    }
+
+
+async def _send_messages(channel_layer, messages):
+    for order_id, message in messages:
+        await channel_layer.group_send(order_group_name(order_id), message)
+
+
+def _in_order(batch):
+    """The events of ``batch`` not preceded by an event another relay has claimed."""
+    claimed = {event.pk for event in batch}
+    blocked = {}
+    earlier = OrderEvent.objects.filter(
+        published_at__isnull=True,
+        order_id__in={event.order_id for event in batch},
+        pk__lt=batch[-1].pk,
+    ).exclude(pk__in=claimed).values_list('order_id', 'pk')
+    for order_id, pk in earlier:
+        blocked[order_id] = min(blocked.get(order_id, pk), pk)
+    return [event for event in batch if event.pk < blocked.get(event.order_id, math.inf)]
+
+
+def relay_events(limit=None):
+    """
+    Publish one batch of pending events; returns ``(claimed, published)``.
+    """
+    from .tasks import notify_order_event  # Import here to avoid circular import
+
+    limit = limit or settings.ORDER_EVENT_RELAY_BATCH
+    with transaction.atomic():
+        batch = list(
+            OrderEvent.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True)
+            .order_by('pk')[:limit]
+        )
+        if not batch:
+            return 0, 0
+        events = _in_order(batch)
+        channel_layer = get_channel_layer()
+        if channel_layer is not None and events:
+            streams = get_stream_buffer()
+            messages = [
+                (event.order_id, streams.append(event.order_id, {
+                    'type': 'order_event',
+                    'event': event_frame(event),
+                }))
+                for event in events
+            ]
+            async_to_sync(_send_messages)(channel_layer, messages)
+        for event in events:
+            if event.kind in NOTIFICATIONS:
+                notify_order_event.delay(event.pk)
+        now = timezone.now()
+        OrderEvent.objects.filter(pk__in=[event.pk for event in events]).update(published_at=now)
+    for event in events:
+        events_published.inc(kind=event.kind)
+        event_lag.observe((now - event.created_at).total_seconds())
+    return len(batch), len(events)
+
+
+def relay_pending():
+    """Relay batches until the outbox is drained; returns the events published."""
+    cache.delete(RELAY_KICK_KEY)
+    total = 0
+    while True:
+        claimed, published = relay_events()
+        total += published
+        # A short batch drained the outbox; one held back entirely is
+        # waiting on another relay, which will pick up after it
+        if claimed < settings.ORDER_EVENT_RELAY_BATCH or not published:
+            return total
+
+
+def _status_notification(event, order):
+    label = Order.Status(event.payload['status']).label
+    return [(order.customer, "Order Update", f"Your order is now {str(label).lower()}.")]
+
+
+def _assigned_notification(event, order):
+    messages = [(
+        order.customer,
+        "Order Confirmed",
+        "Your order has been confirmed and assigned to a delivery agent.",
+    )]
+    if order.delivery_agent:
+        messages.append((
+            order.delivery_agent,
+            "New Delivery Assignment",
+            f"You have been assigned to deliver order #{order.id}",
+        ))
+    return messages
+
+
+def _paid_notification(event, order):
+    return [(order.customer, "Payment Received", f"We received your payment for order #{order.id}.")]
+
+
+def _arrived_notification(event, order):
+    return [(order.customer, "Your order has arrived", "Your delivery agent is at your address.")]
+
+
+# Builders of the (user, title, body) pushes sent for each kind of event
+NOTIFICATIONS = {
+    OrderEvent.Kind.STATUS: _status_notification,
+    OrderEvent.Kind.ASSIGNED: _assigned_notification,
+    OrderEvent.Kind.PAID: _paid_notification,
+    OrderEvent.Kind.ARRIVED: _arrived_notification,
+}
+
+
+def notifications_for(event_id):
+    """
+    Claim the event's notifications; returns the order id and the pushes as
+    ``(token, title, body)``, none when already claimed, so each event
+    notifies once.
+    """
+    claimed = OrderEvent.objects.filter(pk=event_id, notified_at__isnull=True).update(
+        notified_at=timezone.now()
+    )
+    if not claimed:
+        return None, []
+    event = OrderEvent.objects.select_related('order__customer', 'order__delivery_agent').get(pk=event_id)
+    build = NOTIFICATIONS.get(event.kind)
+    if build is None:
+        return event.order_id, []
+    return event.order_id, [
+        (user.fcm_token, title, body)
+        for user, title, body in build(event, event.order)
+        if user.fcm_token
+    ]
+
+
+def prune_events(now=None):
+    """Delete events published more than ``ORDER_EVENT_KEEP_HOURS`` ago."""
+    oldest = (now or timezone.now()) - datetime.timedelta(hours=settings.ORDER_EVENT_KEEP_HOURS)
+    deleted, _ = OrderEvent.objects.filter(published_at__lt=oldest).delete()
+    return deleted
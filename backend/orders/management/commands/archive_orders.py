@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from orders.archive import archivable_orders, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered and cancelled orders older than N days into the cold archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive orders finished more than this many days ago '
+                                 '(default: ORDER_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{archivable_orders(options["days"]).count()} orders would be archived.')
+            return
+        archived = archive_orders(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders.'))
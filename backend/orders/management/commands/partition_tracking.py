@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage monthly partitions of the order tracking table. --convert turns '
+        'the existing table into a partitioned one (once, in a maintenance window).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true')
+        parser.add_argument('--months-ahead', type=int, default=2)
+        parser.add_argument('--drop-empty', action='store_true',
+                            help='Drop empty partitions older than --keep-months')
+        parser.add_argument('--keep-months', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                partitions.convert(months_ahead=options['months_ahead'])
+                self.stdout.write(self.style.SUCCESS('Tracking table converted.'))
+            for name in partitions.ensure_partitions(options['months_ahead']):
+                self.stdout.write(f'Created {name}')
+            if options['drop_empty']:
+                for name in partitions.drop_empty_partitions(options['keep_months']):
+                    self.stdout.write(f'Dropped {name}')
+        except partitions.PartitioningError as exc:
+            raise CommandError(str(exc))
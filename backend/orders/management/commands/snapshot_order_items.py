@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import prefetch_related_objects
+
+from orders.models import OrderItem
+
+SNAPSHOT_FIELDS = ['product_name', 'variant_name', 'product_image']
+
+
+class Command(BaseCommand):
+    help = 'Backfill the product snapshot of order items placed before items carried one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the items missing a snapshot')
+
+    def handle(self, *args, **options):
+        pending = OrderItem.objects.filter(product_name='')
+        if options['dry_run']:
+            self.stdout.write(f'{pending.count()} order items have no snapshot.')
+            return
+
+        done = 0
+        last_id = 0
+        while True:
+            # Keyset pagination: stays fast however far the backfill has got
+            items = list(
+                pending.filter(id__gt=last_id)
+                .select_related('product', 'variant')
+                .order_by('id')[:options['batch_size']]
+            )
+            if not items:
+                break
+            prefetch_related_objects(items, 'product__additional_images')
+            for item in items:
+                item.take_snapshot()
+            OrderItem.objects.bulk_update(items, SNAPSHOT_FIELDS)
+            done += len(items)
+            last_id = items[-1].id
+            self.stdout.write(f'{done} items snapshotted...')
+
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {done} order items.'))
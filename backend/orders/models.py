@@ -9,6 +9,7 @@ class Order(models.Model):
         CONFIRMED = 'confirmed', _('Confirmed')
         PREPARING = 'preparing', _('Preparing')
         OUT_FOR_DELIVERY = 'out_for_delivery', _('Out for Delivery')
+        ARRIVED = 'arrived', _('Arrived')
         DELIVERED = 'delivered', _('Delivered')
         CANCELLED = 'cancelled', _('Cancelled')
 
@@ -85,13 +86,24 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2)
+    # The product as it was at checkout; order reads show these, not the live catalog
+    product_name = models.CharField(max_length=255, blank=True)
+    variant_name = models.CharField(max_length=100, blank=True)
+    product_image = models.CharField(max_length=500, blank=True)
 
     def __str__(self):
-        return f"{self.quantity}x {self.product.name}"
+        return f"{self.quantity}x {self.product_name or self.product.name}"
+
+    def take_snapshot(self):
+        self.product_name = self.product.name
+        self.variant_name = self.variant.name if self.variant else ''
+        self.product_image = self.product.primary_image_url()
 
     def save(self, *args, **kwargs):
         if not self.price:
             self.price = self.variant.final_price if self.variant else self.product.price
+        if not self.product_name:
+            self.take_snapshot()
         self.total = self.price * self.quantity
         super().save(*args, **kwargs)
         self.order.calculate_total()
@@ -113,6 +125,34 @@ class OrderTracking(models.Model):
     def __str__(self):
         return f"Order #{self.order.id} - {self.status}"
 
+class OrderEvent(models.Model):
+    """
+    An order change waiting in the outbox to be pushed to the order's socket
+    group and the notification pipeline (see orders/events.py).
+    """
+    class Kind(models.TextChoices):
+        STATUS = 'status', _('Status changed')
+        ASSIGNED = 'assigned', _('Delivery agent assigned')
+        PAID = 'paid', _('Payment completed')
+        ARRIVED = 'arrived', _('Delivery agent arrived')
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='events'
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Order #{self.order_id} - {self.kind}"
+
 class Payment(models.Model):
     class Provider(models.TextChoices):
         STRIPE = 'stripe', _('Stripe')
@@ -131,4 +171,38 @@ class Payment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Payment {self.payment_id} for Order #{self.order.id}" 
\ No newline at end of file
+        return f"Payment {self.payment_id} for Order #{self.order.id}"
+
+class ArchivedOrder(models.Model):
+    """
+    Index entry for an order moved to the cold archive (see orders/archive.py).
+
+    The order, its items, tracking trail and payments live in a compressed
+    NDJSON segment file; ``offset``/``length`` locate its record there.
+    """
+    id = models.BigIntegerField(primary_key=True)  # The archived order's id
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    delivery_agent = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='archived_deliveries',
+        null=True,
+        blank=True
+    )
+    status = models.CharField(max_length=20, choices=Order.Status.choices)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    segment = models.CharField(max_length=255)
+    offset = models.BigIntegerField()
+    length = models.PositiveIntegerField()
+    created_at = models.DateTimeField()  # The order's
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Archived order #{self.id} ({self.segment})"
@@ -0,0 +1,219 @@
+"""
+Monthly range partitioning of the order tracking table (PostgreSQL).
+
+``OrderTracking`` is the fastest-growing table: every agent ping adds a row
+per active order. Partitioned by ``created_at``, each month lives in its
+own table (``orders_ordertracking_p2024_05``), so the rows of recent orders
+stay in small, hot indexes and old months can be dropped whole once the
+archiver (orders/archive.py) has emptied them, instead of being deleted
+row by row and vacuumed.
+
+The table is converted once, in a maintenance window, with
+``manage.py partition_tracking --convert``. After that the
+``maintain_tracking_partitions`` task keeps partitions created ahead of
+time and drops empty old ones. A default partition catches any row that
+falls outside the monthly ones so inserts never fail; its rows move to
+their month's partition when that is created.
+
+``orders_order`` is not partitioned: a partitioned table's primary key must
+include the partition key, and items, payments and tracking all reference
+the order by id alone.
+"""
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import OrderTracking
+
+PARENT = OrderTracking._meta.db_table
+DEFAULT = f'{PARENT}_default'
+SEQUENCE = f'{PARENT}_part_id_seq'
+PARTITION_NAME = re.compile(rf'^{PARENT}_p(\d{{4}})_(\d{{2}})$')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{PARENT}_p{month:%Y_%m}'
+
+
+def _require_postgres():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Table partitioning needs PostgreSQL.')
+
+
+def is_partitioned(cursor):
+    cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [PARENT])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions(cursor):
+    """Names of the monthly partitions, as ``{month_start: table}``."""
+    cursor.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = %s',
+        [PARENT],
+    )
+    found = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            found[datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)] = name
+    return found
+
+
+def _create_partition(cursor, month):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(partition_name(month))} '
+        f'PARTITION OF {connection.ops.quote_name(PARENT)} FOR VALUES FROM (%s) TO (%s)',
+        [month, _add_months(month, 1)],
+    )
+
+
+def _create_partition_from_default(cursor, month):
+    """
+    Create ``month``'s partition, first moving out any of its rows the
+    default partition caught (e.g. while the maintenance task was not
+    running); Postgres refuses to add a partition those rows belong in.
+    """
+    quote = connection.ops.quote_name
+    bounds = [month, _add_months(month, 1)]
+    with transaction.atomic():
+        # Keeps inserts from reaching the default partition until committed
+        cursor.execute(f'LOCK TABLE {quote(DEFAULT)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {quote(DEFAULT)} WHERE created_at >= %s AND created_at < %s)',
+            bounds,
+        )
+        if not cursor.fetchone()[0]:
+            _create_partition(cursor, month)
+            return
+        cursor.execute(f'CREATE TEMPORARY TABLE tracking_moving (LIKE {quote(PARENT)}) ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(DEFAULT)} WHERE created_at >= %s AND created_at < %s '
+            f'RETURNING *) INSERT INTO tracking_moving SELECT * FROM moved',
+            bounds,
+        )
+        _create_partition(cursor, month)
+        # Postgres routes the rows to the new partition
+        cursor.execute(f'INSERT INTO {quote(PARENT)} SELECT * FROM tracking_moving')
+        # Not left for the commit, in case the caller creates another month first
+        cursor.execute('DROP TABLE tracking_moving')
+
+
+def ensure_partitions(months_ahead=2, now=None):
+    """Create the partitions for this month and ``months_ahead`` after it."""
+    _require_postgres()
+    start = _month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise PartitioningError(f'{PARENT} is not partitioned; run partition_tracking --convert.')
+        existing = partitions(cursor)
+        for offset in range(months_ahead + 1):
+            month = _add_months(start, offset)
+            if month not in existing:
+                _create_partition_from_default(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def drop_empty_partitions(keep_months=3, now=None):
+    """
+    Detach and drop monthly partitions that ended more than ``keep_months``
+    ago and hold no rows. Partitions with rows are left for the archiver.
+    """
+    _require_postgres()
+    cutoff = _add_months(_month_start(now or datetime.now(dt_timezone.utc)), -keep_months)
+    dropped = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(partitions(cursor).items()):
+            if _add_months(month, 1) > cutoff:
+                continue
+            table = connection.ops.quote_name(name)
+            with transaction.atomic():
+                # Blocks inserts routed to this month while we check and detach
+                cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {table})')
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(
+                    f'ALTER TABLE {connection.ops.quote_name(PARENT)} DETACH PARTITION {table}'
+                )
+                cursor.execute(f'DROP TABLE {table}')
+            dropped.append(name)
+    return dropped
+
+
+def _column_definitions():
+    columns = []
+    for field in OrderTracking._meta.local_concrete_fields:
+        column = f'{connection.ops.quote_name(field.column)} {field.db_type(connection)}'
+        if field.primary_key:
+            column += f" NOT NULL DEFAULT nextval('{SEQUENCE}')"
+        else:
+            column += ' NULL' if field.null else ' NOT NULL'
+        columns.append(column)
+    return columns
+
+
+def convert(months_ahead=2):
+    """
+    Replace the plain tracking table with a partitioned one holding the same
+    rows. Ids continue from the old table's highest one. Takes an
+    exclusive lock on the table for the duration of the copy.
+    """
+    _require_postgres()
+    quote = connection.ops.quote_name
+    legacy = f'{PARENT}_legacy'
+    order_table = OrderTracking._meta.get_field('order').related_model._meta.db_table
+    columns = ', '.join(quote(field.column) for field in OrderTracking._meta.local_concrete_fields)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            raise PartitioningError(f'{PARENT} is already partitioned.')
+        cursor.execute(f'LOCK TABLE {quote(PARENT)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min(created_at), max(id) FROM {quote(PARENT)}')
+        oldest, max_id = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE {quote(PARENT)} RENAME TO {quote(legacy)}')
+
+        cursor.execute(f'CREATE SEQUENCE {quote(SEQUENCE)}')
+        cursor.execute('SELECT setval(%s, %s)', [SEQUENCE, max(max_id or 0, 1)])
+        cursor.execute(
+            f'CREATE TABLE {quote(PARENT)} ({", ".join(_column_definitions())}, '
+            f'PRIMARY KEY (id, created_at), '
+            f'FOREIGN KEY (order_id) REFERENCES {quote(order_table)} (id) DEFERRABLE INITIALLY DEFERRED'
+            f') PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(PARENT)}.id')
+        cursor.execute(
+            f'CREATE INDEX {quote(PARENT + "_order_created")} '
+            f'ON {quote(PARENT)} (order_id, created_at DESC)'
+        )
+        cursor.execute(f'CREATE TABLE {quote(DEFAULT)} PARTITION OF {quote(PARENT)} DEFAULT')
+
+        now = _month_start(datetime.now(dt_timezone.utc))
+        month = _month_start(oldest) if oldest else now
+        while month <= _add_months(now, months_ahead):
+            _create_partition(cursor, month)
+            month = _add_months(month, 1)
+        # Postgres routes each row to its month
+        cursor.execute(f'INSERT INTO {quote(PARENT)} ({columns}) SELECT {columns} FROM {quote(legacy)}')
+        cursor.execute(f'DROP TABLE {quote(legacy)}')
@@ -1,37 +1,65 @@
+from decimal import Decimal
 from rest_framework import serializers
 from django.db import transaction
-from .models import Order, OrderItem, OrderTracking, Payment
+from .events import record_order_event
+from .models import Order, OrderEvent, OrderItem, OrderTracking, Payment
+from users.models import Address
 from users.serializers import UserSerializer, AddressSerializer
-from products.serializers import ProductSerializer, ProductVariantSerializer
+from products.inventory import OutOfStock, release, reserve
+from products.models import Product, ProductVariant
+from tracking.fanout import invalidate_active_orders
+from core.relations import BulkListSerializer, BulkPrimaryKeyRelatedField
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
-    variant = ProductVariantSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(
+    # Resolved for all lines of an order at once (core/relations.py); images
+    # come along for the snapshot
+    product_id = BulkPrimaryKeyRelatedField(
         source='product',
-        queryset=Product.objects.all(),
-        write_only=True
+        queryset=Product.objects.prefetch_related('additional_images')
     )
-    variant_id = serializers.PrimaryKeyRelatedField(
+    variant_id = BulkPrimaryKeyRelatedField(
         source='variant',
         queryset=ProductVariant.objects.all(),
-        write_only=True,
         required=False
     )
+    # Snapshot taken at checkout
+    name = serializers.CharField(source='product_name', read_only=True)
+    image = serializers.CharField(source='product_image', read_only=True)
 
     class Meta:
         model = OrderItem
         fields = [
             'id',
-            'product',
             'product_id',
-            'variant',
             'variant_id',
+            'name',
+            'variant_name',
+            'image',
             'quantity',
             'price',
             'total',
         ]
-        read_only_fields = ['price', 'total']
+        read_only_fields = ['variant_name', 'price', 'total']
+        list_serializer_class = BulkListSerializer
+
+    def validate(self, attrs):
+        variant = attrs.get('variant')
+        if variant is not None:
+            product = attrs.get('product', getattr(self.instance, 'product', None))
+            if variant.product_id != getattr(product, 'pk', None):
+                raise serializers.ValidationError({'variant_id': 'Variant does not belong to this product.'})
+            # Saves the variant a query for its product when pricing the line
+            variant.product = product
+        return attrs
+
+class CustomerAddressField(serializers.PrimaryKeyRelatedField):
+    """An address of the requesting user."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return Address.objects.none()
+        return Address.objects.filter(user=request.user)
 
 class OrderTrackingSerializer(serializers.ModelSerializer):
     class Meta:
@@ -68,9 +96,8 @@ class OrderSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True)
 
     # Write-only fields
-    delivery_address_id = serializers.PrimaryKeyRelatedField(
+    delivery_address_id = CustomerAddressField(
         source='delivery_address',
-        queryset=Address.objects.all(),
         write_only=True
     )
     order_items = OrderItemSerializer(many=True, write_only=True)
@@ -97,6 +124,9 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
+        extra_kwargs = {
+            'delivery_fee': {'required': False},
+        }
         read_only_fields = [
             'customer',
             'delivery_agent',
@@ -111,8 +141,22 @@ class OrderSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         order_items = validated_data.pop('order_items')
-        delivery_fee = validated_data.get('delivery_fee', 40.00)  # Default delivery fee
-        
+        delivery_fee = validated_data.pop('delivery_fee', Decimal('40.00'))  # Default delivery fee
+
+        # Take the stock first, in product order so concurrent checkouts
+        # lock stock rows in the same order
+        products = {}
+        quantities = {}
+        for item_data in order_items:
+            product = item_data['product']
+            products[product.pk] = product
+            quantities[product.pk] = quantities.get(product.pk, 0) + item_data['quantity']
+        for product_id in sorted(quantities):
+            try:
+                reserve(products[product_id], quantities[product_id])
+            except OutOfStock as exc:
+                raise serializers.ValidationError({'order_items': [f'{exc.product.name} is out of stock.']})
+
         # Create order
         order = Order.objects.create(
             customer=self.context['request'].user,
@@ -134,16 +178,24 @@ class OrderStatusUpdateSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status']
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         old_status = instance.status
         new_status = validated_data.get('status')
         
+        if new_status == Order.Status.CANCELLED and old_status != new_status:
+            for item in instance.items.select_related('product'):
+                release(item.product, item.quantity)
+
+        order = super().update(instance, validated_data)
         if old_status != new_status:
             # Create tracking update
+            description = f"Order status changed from {old_status} to {new_status}"
             OrderTracking.objects.create(
-                order=instance,
+                order=order,
                 status=new_status,
-                description=f"Order status changed from {old_status} to {new_status}"
+                description=description
             )
-        
-        return super().update(instance, validated_data) 
\ No newline at end of file
+            record_order_event(order, OrderEvent.Kind.STATUS, description)
+            invalidate_active_orders(order.delivery_agent_id)
+        return order 
\ No newline at end of file
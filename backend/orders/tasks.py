@@ -1,38 +1,70 @@
+import logging
 from celery import shared_task
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
-from firebase_admin import messaging
-from .models import Order, OrderTracking
+from firebase_admin import exceptions, messaging
+from tracking.fanout import invalidate_active_orders
+from tracking.location_store import get_location_store
+from .events import record_order_event
+from .models import Order, OrderEvent, OrderTracking
 
-@shared_task
-def send_order_notification(order_id, title, body, user_ids):
-    """Send push notification to users about order updates."""
-    try:
-        # Create message
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=body,
-            ),
-            tokens=user_ids,  # FCM tokens of users
-            data={
-                'order_id': str(order_id),
-                'type': 'order_update',
-            }
-        )
+logger = logging.getLogger(__name__)
 
-        # Send message
-        response = messaging.send_multicast(message)
-        return {
-            'success_count': response.success_count,
-            'failure_count': response.failure_count,
+# FCM errors worth sending again; others (e.g. an unregistered token) are final
+RETRYABLE_PUSH_ERRORS = (
+    exceptions.UnavailableError,
+    exceptions.InternalError,
+    exceptions.DeadlineExceededError,
+    exceptions.ResourceExhaustedError,
+    exceptions.UnknownError,
+)
+
+@shared_task(bind=True, max_retries=settings.ORDER_PUSH_MAX_RETRIES)
+def send_order_notification(self, order_id, title, body, user_ids):
+    """
+    Send push notification to users about order updates. Tokens failing
+    with a transient error are sent again with backoff, up to
+    ``ORDER_PUSH_MAX_RETRIES`` times.
+    """
+    # Create message
+    message = messaging.MulticastMessage(
+        notification=messaging.Notification(
+            title=title,
+            body=body,
+        ),
+        tokens=user_ids,  # FCM tokens of users
+        data={
+            'order_id': str(order_id),
+            'type': 'order_update',
         }
-    except Exception as e:
-        print(f"Error sending notification: {str(e)}")
+    )
+
+    # Send message
+    try:
+        response = messaging.send_multicast(message)
+        failed = [
+            token for token, result in zip(user_ids, response.responses)
+            if not result.success and isinstance(result.exception, RETRYABLE_PUSH_ERRORS)
+        ]
+    except RETRYABLE_PUSH_ERRORS:
+        response, failed = None, user_ids
+    if failed:
+        if self.request.retries < self.max_retries:
+            raise self.retry(
+                args=(order_id, title, body, failed),
+                countdown=settings.ORDER_PUSH_RETRY_DELAY * 2 ** self.request.retries,
+            )
+        logger.error('Gave up on %d push(es) for order %s: %s', len(failed), order_id, title)
+    if response is None:
         return None
+    return {
+        'success_count': response.success_count,
+        'failure_count': response.failure_count,
+    }
 
-@shared_task
+@shared_task(database='primary')
 def assign_delivery_agent(order_id):
     """Automatically assign delivery agent to order."""
     from users.models import DeliveryAgent  # Import here to avoid circular import
@@ -40,55 +72,64 @@ def assign_delivery_agent(order_id):
     try:
         order = Order.objects.get(id=order_id)
         
-        # Find available delivery agent
-        available_agent = DeliveryAgent.objects.filter(
-            is_available=True
-        ).order_by('total_deliveries').first()
+        # Find the closest available delivery agent
+        available_agent = DeliveryAgent.find_available(order.delivery_address)
 
         if available_agent:
-            # Assign delivery agent
-            order.delivery_agent = available_agent.user
-            order.status = Order.Status.CONFIRMED
-            order.save()
-
-            # Create tracking update
-            OrderTracking.objects.create(
-                order=order,
-                status=order.status,
-                description=f"Order assigned to {available_agent.user.get_full_name()}"
-            )
+            with transaction.atomic():
+                # Assign delivery agent
+                order.delivery_agent = available_agent.user
+                order.status = Order.Status.CONFIRMED
+                order.save()
 
-            # Update delivery agent status
-            available_agent.is_available = False
-            available_agent.total_deliveries += 1
-            available_agent.save()
-
-            # Send notifications
-            customer_token = order.customer.fcm_token
-            agent_token = available_agent.user.fcm_token
-            
-            if customer_token:
-                send_order_notification.delay(
-                    order_id,
-                    "Order Confirmed",
-                    "Your order has been confirmed and assigned to a delivery agent.",
-                    [customer_token]
-                )
-            
-            if agent_token:
-                send_order_notification.delay(
-                    order_id,
-                    "New Delivery Assignment",
-                    f"You have been assigned to deliver order #{order.id}",
-                    [agent_token]
+                # Create tracking update
+                description = f"Order assigned to {available_agent.user.get_full_name()}"
+                OrderTracking.objects.create(
+                    order=order,
+                    status=order.status,
+                    description=description
                 )
+                # The customer and the agent are notified by the event relay
+                record_order_event(order, OrderEvent.Kind.ASSIGNED, description)
+
+                # Update delivery agent status
+                available_agent.is_available = False
+                available_agent.total_deliveries += 1
+                available_agent.save()
+            get_location_store().set_available(available_agent.user_id, False)
+            invalidate_active_orders(available_agent.user_id)
 
             return True
         return False
     except Order.DoesNotExist:
         return False
 
-@shared_task
+@shared_task(database='primary')
+def relay_order_events():
+    """Push pending order events to socket groups and notifications."""
+    from .events import relay_pending
+
+    return relay_pending()
+
+@shared_task(database='primary')
+def notify_order_event(event_id):
+    """Send the push notifications of an order event, once."""
+    from .events import notifications_for
+
+    order_id, messages = notifications_for(event_id)
+    # Claimed once above; each push then retries on its own
+    for token, title, body in messages:
+        send_order_notification.delay(order_id, title, body, [token])
+    return len(messages)
+
+@shared_task(database='primary')
+def prune_order_events():
+    """Delete relayed order events past their retention."""
+    from .events import prune_events
+
+    return prune_events()
+
+@shared_task(database='replica')
 def check_pending_orders():
     """Check and process pending orders."""
     # Get orders that have been pending for more than 5 minutes
@@ -101,7 +142,7 @@ def check_pending_orders():
     for order in pending_orders:
         assign_delivery_agent.delay(order.id)
 
-@shared_task
+@shared_task(database='replica')
 def update_delivery_status():
     """Update status of orders in delivery."""
     # Get orders that are out for delivery
@@ -109,21 +150,42 @@ def update_delivery_status():
         status=Order.Status.OUT_FOR_DELIVERY
     ).select_related('delivery_agent')
 
+    store = get_location_store()
     for order in delivering_orders:
-        if order.delivery_agent and order.delivery_agent.delivery_profile.current_location:
+        if not order.delivery_agent:
+            continue
+        # Prefer the live position; fall back to the last checkpoint
+        location = (
+            store.get(order.delivery_agent_id)
+            or order.delivery_agent.delivery_profile.current_location
+        )
+        if location:
             # Create tracking update
             OrderTracking.objects.create(
                 order=order,
                 status=order.status,
-                location=order.delivery_agent.delivery_profile.current_location,
+                location=location,
                 description="Delivery location updated"
             )
+            # The customer heard "out for delivery" from the order event outbox
+
+
+@shared_task(database='primary')
+def archive_finished_orders():
+    """Move old delivered/cancelled orders into the cold archive."""
+    from .archive import archive_orders
+
+    return archive_orders(limit=settings.ORDER_ARCHIVE_BATCH_LIMIT)
 
-            # Send notification to customer
-            if order.customer.fcm_token:
-                send_order_notification.delay(
-                    order.id,
-                    "Order Update",
-                    "Your order is on the way!",
-                    [order.customer.fcm_token]
-                ) 
\ No newline at end of file
+@shared_task(database='primary')
+def maintain_tracking_partitions():
+    """Create upcoming tracking partitions and drop emptied old ones."""
+    from .partitions import PartitioningError, drop_empty_partitions, ensure_partitions
+
+    try:
+        created = ensure_partitions(settings.TRACKING_PARTITION_MONTHS_AHEAD)
+    except PartitioningError:
+        # Not converted (or not PostgreSQL); nothing to maintain
+        return None
+    dropped = drop_empty_partitions(settings.TRACKING_PARTITION_KEEP_MONTHS)
+    return {'created': created, 'dropped': dropped}
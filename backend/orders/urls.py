@@ -6,6 +6,8 @@ from .views import (
     OrderTrackingViewSet,
     PaymentViewSet,
 )
+from .async_views import order_detail, order_tracking_list
+from core.async_views import async_reads
 
 router = routers.DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
@@ -16,7 +18,8 @@ orders_router.register(r'items', OrderItemViewSet, basename='order-items')
 orders_router.register(r'tracking', OrderTrackingViewSet, basename='order-tracking')
 orders_router.register(r'payments', PaymentViewSet, basename='order-payments')
 
+# GET on the hottest read routes is served by native async views
 urlpatterns = [
-    path('', include(router.urls)),
-    path('', include(orders_router.urls)),
+    path('', include(async_reads(router.urls, {'order-detail': order_detail}))),
+    path('', include(async_reads(orders_router.urls, {'order-tracking-list': order_tracking_list}))),
 ] 
\ No newline at end of file
@@ -1,10 +1,15 @@
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
 from django.db.models import Q
+from django.http import Http404
 from django.utils import timezone
-from .models import Order, OrderItem, OrderTracking, Payment
+from .archive import load_archived_order
+from .events import record_order_event
+from .models import Order, OrderEvent, OrderItem, OrderTracking, Payment
 from .serializers import (
     OrderSerializer,
     OrderItemSerializer,
@@ -13,24 +18,65 @@ from .serializers import (
     OrderStatusUpdateSerializer,
 )
 from users.models import DeliveryAgent
-
-class OrderViewSet(viewsets.ModelViewSet):
+from tracking.fanout import invalidate_active_orders
+from tracking.location_store import get_location_store
+from core.compiled import CompiledSerializerMixin
+from core.conditional import ConditionalGetMixin
+from core.db_router import ReplicaReadMixin
+from core.idempotency import idempotent
+from core.throttling import BROWSING, CHECKOUT, TRACKING
+
+def orders_for(user):
+    """The orders ``user`` may see."""
+    if user.role == 'customer':
+        return Order.objects.filter(customer=user)
+    elif user.role == 'delivery_agent':
+        return Order.objects.filter(delivery_agent=user)
+    return Order.objects.all()  # For admin users
+
+class OrderViewSet(ReplicaReadMixin, ConditionalGetMixin, CompiledSerializerMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    # Everything OrderSerializer nests. Item edits recalculate and save the
+    # order, bumping its updated_at; deleted items change the items count
+    conditional_fields = (
+        'updated_at',
+        'items__id',
+        'tracking_updates__created_at',
+        'payments__updated_at',
+        'customer__updated_at',
+        'customer__addresses__updated_at',
+        'customer__delivery_profile__updated_at',
+        'delivery_agent__updated_at',
+        'delivery_agent__addresses__updated_at',
+        'delivery_agent__delivery_profile__updated_at',
+        'delivery_address__updated_at',
+    )
+    priority_class = CHECKOUT
+    priority_classes = {'list': BROWSING, 'retrieve': BROWSING, 'update_location': TRACKING}
 
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'customer':
-            return Order.objects.filter(customer=user)
-        elif user.role == 'delivery_agent':
-            return Order.objects.filter(delivery_agent=user)
-        return Order.objects.all()  # For admin users
+        return orders_for(self.request.user)
 
     def get_serializer_class(self):
         if self.action == 'update_status':
             return OrderStatusUpdateSerializer
         return self.serializer_class
 
+    @idempotent()
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Old finished orders are served from the cold archive
+            order = load_archived_order(request.user, kwargs[self.lookup_field])
+            if order is None:
+                raise
+            return Response(self.get_serializer(order).data)
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         order = self.get_object()
@@ -40,13 +86,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(OrderSerializer(order).data)
 
     @action(detail=True, methods=['post'])
+    @idempotent()
     def assign_delivery_agent(self, request, pk=None):
         order = self.get_object()
         
-        # Find available delivery agent
-        available_agent = DeliveryAgent.objects.filter(
-            is_available=True
-        ).order_by('total_deliveries').first()
+        # Find the closest available delivery agent
+        available_agent = DeliveryAgent.find_available(order.delivery_address)
 
         if not available_agent:
             return Response(
@@ -54,25 +99,31 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.delivery_agent = available_agent.user
-        order.status = Order.Status.CONFIRMED
-        order.save()
-
-        # Create tracking update
-        OrderTracking.objects.create(
-            order=order,
-            status=order.status,
-            description=f"Order assigned to {available_agent.user.get_full_name()}"
-        )
+        with transaction.atomic():
+            order.delivery_agent = available_agent.user
+            order.status = Order.Status.CONFIRMED
+            order.save()
+
+            # Create tracking update
+            description = f"Order assigned to {available_agent.user.get_full_name()}"
+            OrderTracking.objects.create(
+                order=order,
+                status=order.status,
+                description=description
+            )
+            record_order_event(order, OrderEvent.Kind.ASSIGNED, description)
 
-        # Update delivery agent status
-        available_agent.is_available = False
-        available_agent.total_deliveries += 1
-        available_agent.save()
+            # Update delivery agent status
+            available_agent.is_available = False
+            available_agent.total_deliveries += 1
+            available_agent.save()
+        get_location_store().set_available(available_agent.user_id, False)
+        invalidate_active_orders(available_agent.user_id)
 
         return Response(OrderSerializer(order).data)
 
     @action(detail=True, methods=['post'])
+    @idempotent()
     def update_location(self, request, pk=None):
         order = self.get_object()
         location = request.data.get('location')
@@ -106,13 +157,22 @@ class OrderItemViewSet(mixins.RetrieveModelMixin,
             order__customer=self.request.user
         )
 
-class OrderTrackingViewSet(mixins.ListModelMixin,
+class OrderTrackingViewSet(CompiledSerializerMixin,
+                          mixins.ListModelMixin,
                           mixins.RetrieveModelMixin,
                           viewsets.GenericViewSet):
     serializer_class = OrderTrackingSerializer
     permission_classes = [IsAuthenticated]
+    priority_class = TRACKING
 
     def get_queryset(self):
+        # Only the trail of an order the user may see
+        try:
+            visible = orders_for(self.request.user).filter(pk=self.kwargs['order_pk']).exists()
+        except (TypeError, ValueError):
+            visible = False
+        if not visible:
+            raise Http404
         return OrderTracking.objects.filter(
             order_id=self.kwargs['order_pk']
         ).select_related('order')
@@ -123,6 +183,7 @@ class PaymentViewSet(mixins.ListModelMixin,
                     viewsets.GenericViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    priority_class = CHECKOUT
 
     def get_queryset(self):
         return Payment.objects.filter(
@@ -130,8 +191,14 @@ class PaymentViewSet(mixins.ListModelMixin,
             order__customer=self.request.user
         )
 
+    @idempotent()
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        order = Order.objects.get(id=self.kwargs['order_pk'])
+        # Only the customer pays for an order
+        order = get_object_or_404(Order, id=self.kwargs['order_pk'], customer=self.request.user)
         serializer.save(order=order)
 
         # Update order payment status
@@ -143,4 +210,5 @@ class PaymentViewSet(mixins.ListModelMixin,
             order=order,
             status=order.status,
             description="Payment completed"
-        ) 
\ No newline at end of file
+        )
+        record_order_event(order, OrderEvent.Kind.PAID, "Payment completed") 
\ No newline at end of file
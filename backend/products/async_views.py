@@ -0,0 +1,55 @@
+from django.http import Http404
+from core.async_views import authenticate, render
+from core.compiled import serialize
+from core.conditional import avalidators_for, not_modified, validator_headers
+from core.db_router import ais_pinned, allow_replica_reads
+from .models import Product
+from .serializers import ProductSerializer
+from .views import ProductViewSet
+
+async def product_detail(request, pk):
+    """Async ``ProductViewSet.retrieve`` (public, like the sync view)."""
+    # An invalid token is still rejected, as DRF does for AllowAny views
+    user = await authenticate(request)
+    if user is None or not await ais_pinned(user.id):
+        allow_replica_reads()
+
+    queryset = Product.objects.select_related('category').prefetch_related(
+        'variants',
+        'additional_images',
+    )
+
+    # Same query parameter filters as ProductViewSet.get_queryset
+    category = request.GET.get('category', None)
+    min_price = request.GET.get('min_price', None)
+    max_price = request.GET.get('max_price', None)
+    in_stock = request.GET.get('in_stock', None)
+
+    if category:
+        queryset = queryset.filter(category_id=category)
+    if min_price:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price:
+        queryset = queryset.filter(price__lte=max_price)
+    if in_stock:
+        queryset = queryset.filter(stock__gt=0)
+
+    try:
+        validators = await avalidators_for(
+            queryset.filter(pk=pk), ProductViewSet.conditional_fields, detail=True
+        )
+    except (TypeError, ValueError):
+        validators = None
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+
+    try:
+        product = await queryset.aget(pk=pk)
+    except (Product.DoesNotExist, TypeError, ValueError):
+        raise Http404
+
+    data = serialize(ProductSerializer, product, context={'request': request})
+    if validators is None:
+        return data
+    return render(data, headers=validator_headers(validators))
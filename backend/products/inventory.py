@@ -0,0 +1,187 @@
+"""
+Product stock, sharded for hot products.
+
+Checkout takes its products' stock inside the order's transaction, so the
+row it decrements stays locked until the order commits. For a product on
+promotion selling hundreds of units a minute that one row serializes every
+checkout. A product with ``stock_shards`` set keeps its stock in that many
+``StockShard`` rows instead; a checkout decrements a shard picked at
+random, so concurrent checkouts mostly lock different rows. Only when the
+shards it tries are short does it lock all of them (in index order) and
+take from several.
+
+``Product.stock`` of a sharded product is the total of its shards as of the
+last ``aggregate_stock`` run, every few seconds from Celery beat, and
+``is_in_stock``, listings and ``in_stock`` filters read it as before. That
+run also spreads the total evenly over the shards again when some have run
+low. ``shard_stock`` (and the ``shard_stock`` command) turns sharding on or
+off for a product; restocking a sharded product goes through ``set_stock``.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from core.metrics import registry
+
+from .models import Product, StockShard
+
+SHARD_ATTEMPTS = 2  # Random shards tried before locking them all
+
+shard_fallbacks = registry.counter(
+    'zotpot_stock_shard_fallbacks_total',
+    'Reservations of sharded stock that locked all shards of the product.',
+)
+
+
+class OutOfStock(Exception):
+    def __init__(self, product):
+        super().__init__(f'{product} is out of stock')
+        self.product = product
+
+
+def _spread(total, shards):
+    base, extra = divmod(total, shards)
+    return [base + (index < extra) for index in range(shards)]
+
+
+def _current_shards(product_id):
+    return Product.objects.filter(pk=product_id).values_list('stock_shards', flat=True).first()
+
+
+def _take_from_shards(product_id, shards, quantity):
+    rows = StockShard.objects.filter(product_id=product_id)
+    for index in random.sample(range(shards), min(SHARD_ATTEMPTS, shards)):
+        if rows.filter(index=index, count__gte=quantity).update(count=F('count') - quantity):
+            return True
+    shard_fallbacks.inc()
+    locked = list(rows.select_for_update().order_by('index'))
+    if sum(shard.count for shard in locked) < quantity:
+        return False
+    remaining = quantity
+    changed = []
+    for shard in locked:
+        taken = min(shard.count, remaining)
+        if taken:
+            shard.count -= taken
+            remaining -= taken
+            changed.append(shard)
+        if not remaining:
+            break
+    StockShard.objects.bulk_update(changed, ['count'])
+    return True
+
+
+def reserve(product, quantity):
+    """
+    Take ``quantity`` units of ``product`` within the caller's transaction.
+    Raises ``OutOfStock`` when there aren't that many.
+    """
+    shards = product.stock_shards
+    for _ in range(2):
+        if shards:
+            taken = _take_from_shards(product.pk, shards, quantity)
+        else:
+            taken = Product.objects.filter(
+                pk=product.pk, stock_shards=0, stock__gte=quantity
+            ).update(stock=F('stock') - quantity, updated_at=timezone.now())
+        if taken:
+            return
+        # Out of stock, unless the product was (un)sharded since it was read
+        current = _current_shards(product.pk)
+        if current is None or current == shards:
+            break
+        shards = current
+    raise OutOfStock(product)
+
+
+def release(product, quantity):
+    """Put ``quantity`` units of ``product`` back, e.g. from a cancelled order."""
+    shards = product.stock_shards
+    for _ in range(2):
+        if shards:
+            returned = StockShard.objects.filter(
+                product_id=product.pk, index=random.randrange(shards)
+            ).update(count=F('count') + quantity)
+        else:
+            returned = Product.objects.filter(pk=product.pk, stock_shards=0).update(
+                stock=F('stock') + quantity, updated_at=timezone.now()
+            )
+        if returned:
+            return
+        current = _current_shards(product.pk)
+        if current is None or current == shards:
+            return
+        shards = current
+
+
+@transaction.atomic
+def set_stock(product, stock):
+    """Set ``product``'s stock to ``stock``, as a restock or a count correction."""
+    if product.stock_shards:
+        shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+        for shard, count in zip(shards, _spread(stock, len(shards))):
+            shard.count = count
+        StockShard.objects.bulk_update(shards, ['count'])
+    Product.objects.filter(pk=product.pk).update(stock=stock, updated_at=timezone.now())
+    product.stock = stock
+
+
+@transaction.atomic
+def shard_stock(product_id, shards):
+    """
+    Move the stock of the product into ``shards`` shard rows, or with 0 back
+    into ``Product.stock``. Returns the stock moved.
+    """
+    product = Product.objects.select_for_update().get(pk=product_id)
+    existing = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+    total = sum(shard.count for shard in existing) if product.stock_shards else product.stock
+    StockShard.objects.filter(product=product).delete()
+    if shards:
+        StockShard.objects.bulk_create([
+            StockShard(product=product, index=index, count=count)
+            for index, count in enumerate(_spread(total, shards))
+        ])
+    Product.objects.filter(pk=product.pk).update(
+        stock=total, stock_shards=shards, updated_at=timezone.now()
+    )
+    return total
+
+
+@transaction.atomic
+def rebalance(product_id):
+    """Spread the product's stock evenly over its shards; returns the total."""
+    shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('index'))
+    total = sum(shard.count for shard in shards)
+    changed = []
+    for shard, count in zip(shards, _spread(total, len(shards))):
+        if shard.count != count:
+            shard.count = count
+            changed.append(shard)
+    StockShard.objects.bulk_update(changed, ['count'])
+    return total
+
+
+def aggregate_stock():
+    """
+    Write the shard totals of sharded products to ``Product.stock``, first
+    rebalancing products with a shard below half its even share. Returns the
+    number of products whose stock changed.
+    """
+    current = dict(Product.objects.filter(stock_shards__gt=0).values_list('pk', 'stock'))
+    totals = (
+        StockShard.objects.filter(product_id__in=current).order_by().values('product')
+        .annotate(total=Sum('count'), low=Min('count'), shards=Count('pk'))
+        .values_list('product', 'total', 'low', 'shards')
+    )
+    changed = 0
+    for product_id, total, low, shards in totals:
+        if low * 2 < total // shards:
+            total = rebalance(product_id)
+        if total != current[product_id]:
+            changed += Product.objects.filter(pk=product_id, stock_shards__gt=0).update(
+                stock=total, updated_at=timezone.now()
+            )
+    return changed
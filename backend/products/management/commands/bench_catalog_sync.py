@@ -0,0 +1,160 @@
+import datetime
+import gzip
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from products.models import Category, Product, ProductImage, ProductVariant
+from products.sync import encode_token
+from products.views import CategoryViewSet, ProductViewSet
+
+PREFIX = 'Sync bench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bytes and latency of a catalog delta sync after a typical day '
+        'of changes with the full refetch of the product and category lists '
+        'the app did on every launch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--updated', type=float, default=0.05,
+                            help='Fraction of products changed (price, stock) in the day')
+        parser.add_argument('--variant-edits', type=int, default=30, help='Products with an edited variant')
+        parser.add_argument('--created', type=int, default=10)
+        parser.add_argument('--deleted', type=int, default=5)
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+        self._seed(options['products'], options['categories'])
+        # The app last synced yesterday, before any of today's changes
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        token = encode_token(yesterday + datetime.timedelta(hours=1))
+        Product.objects.filter(name__startswith=PREFIX).update(updated_at=yesterday)
+        Category.objects.filter(name__startswith=PREFIX).update(updated_at=yesterday)
+        changes = self._change(options)
+
+        factory = RequestFactory()
+        product_list = ProductViewSet.as_view({'get': 'list'}, throttle_classes=[])
+        category_list = CategoryViewSet.as_view({'get': 'list'}, throttle_classes=[])
+        sync = ProductViewSet.as_view({'get': 'sync'}, throttle_classes=[])
+
+        def full_refetch():
+            responses = [self._get(category_list, factory, '/api/v1/products/categories/')]
+            page = 1
+            while True:
+                response = self._get(product_list, factory, '/api/v1/products/products/', {'page': page})
+                responses.append(response)
+                if response.data.get('next') is None:
+                    return responses
+                page += 1
+
+        def delta_sync():
+            responses = []
+            since = token
+            while True:
+                response = self._get(sync, factory, '/api/v1/products/products/sync/', {'since': since})
+                responses.append(response)
+                if not response.data['more']:
+                    return responses
+                since = response.data['token']
+
+        self.stdout.write(
+            f'catalog: {Product.objects.count()} products, {Category.objects.count()} categories; '
+            f'changes: {changes}'
+        )
+        self.stdout.write(
+            f'{"fetch":6} {"requests":>8} {"bytes":>10} {"gzip":>9} {"p50 ms":>8} {"rows":>6}'
+        )
+        results = {}
+        for label, fetch in (('full', full_refetch), ('delta', delta_sync)):
+            timings = []
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                responses = fetch()
+                timings.append((time.perf_counter() - start) * 1000)
+            content = b''.join(response.content for response in responses)
+            if label == 'full':
+                rows = sum(len(response.data['results']) for response in responses[1:])
+            else:
+                rows = sum(len(response.data['products']) for response in responses)
+            results[label] = (len(content), statistics.median(timings))
+            self.stdout.write(
+                f'{label:6} {len(responses):>8} {len(content):>10} {len(gzip.compress(content)):>9} '
+                f'{statistics.median(timings):>8.1f} {rows:>6}'
+            )
+        self.stdout.write(
+            f'delta/full: {results["delta"][0] / results["full"][0]:.1%} of the bytes, '
+            f'{results["delta"][1] / results["full"][1]:.1%} of the time'
+        )
+
+    def _get(self, view, factory, path, params=None):
+        response = view(factory.get(path, params or {}, HTTP_ACCEPT='application/json'))
+        response.render()
+        return response
+
+    def _seed(self, products, categories):
+        existing = Product.objects.filter(name__startswith=PREFIX).count()
+        if existing >= products:
+            return
+        category_ids = list(
+            Category.objects.filter(name__startswith=PREFIX).values_list('pk', flat=True)
+        ) or [
+            Category.objects.create(name=f'{PREFIX} category {index}').pk
+            for index in range(categories)
+        ]
+        created = Product.objects.bulk_create([
+            Product(
+                category_id=category_ids[index % len(category_ids)],
+                name=f'{PREFIX} product {index}',
+                description='Synthetic product for catalog sync benchmarks',
+                price=Decimal(20 + index % 480),
+                image=f'products/{index}.jpg',
+                stock=100 + index % 400,
+            )
+            for index in range(existing, products)
+        ])
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, name=name, price_adjustment=adjustment, stock=50)
+            for product in created
+            for name, adjustment in (('Regular', Decimal('0')), ('Large', Decimal('15')))
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'products/{product.pk}-1.jpg', is_primary=True)
+            for product in created
+        ])
+
+    def _change(self, options):
+        """A day's worth of edits, sales and catalog churn."""
+        ids = list(Product.objects.filter(name__startswith=PREFIX).order_by('pk').values_list('pk', flat=True))
+        step = max(int(1 / options['updated']), 1) if options['updated'] else len(ids) + 1
+        updated = ids[::step]
+        Product.objects.filter(pk__in=updated).update(stock=7, updated_at=timezone.now())
+        edited = ids[1::max(len(ids) // max(options['variant_edits'], 1), 1)][:options['variant_edits']]
+        for variant in ProductVariant.objects.filter(product_id__in=edited, name='Large'):
+            variant.price_adjustment += 1
+            variant.save()
+        category = Category.objects.filter(name__startswith=PREFIX).first()
+        for index in range(options['created']):
+            Product.objects.create(
+                category=category, name=f'{PREFIX} new product {index}', description='New today',
+                price=Decimal('99'), image='products/new.jpg', stock=10,
+            )
+        for product in Product.objects.filter(pk__in=ids[-options['deleted']:]):
+            product.delete()
+        return (
+            f'{len(updated)} updated, {len(edited)} variant edits, '
+            f'{options["created"]} created, {options["deleted"]} deleted'
+        )
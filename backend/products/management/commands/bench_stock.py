@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections, transaction
+
+from core import loadtest
+from products import inventory
+from products.models import Product
+
+STOCK = 10 ** 7
+
+
+def counter_total(counter):
+    return sum(value for _, value in counter.snapshot()['values'])
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare checkout throughput on one hot product with its stock in the '
+        'product row and split over counter shards. Each worker takes one unit '
+        'per transaction and holds it for --hold-ms, standing in for the rest '
+        'of checkout. Needs PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true', help='Create tables before seeding')
+        parser.add_argument('--checkouts', type=int, default=2000, help='Checkouts per run')
+        parser.add_argument('--concurrency', default='8,32,64',
+                            help='Comma-separated worker thread counts')
+        parser.add_argument('--shards', type=int, default=16)
+        parser.add_argument('--hold-ms', type=float, default=5.0,
+                            help='Milliseconds each checkout transaction stays open after taking stock')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('bench_stock needs a PostgreSQL default database.')
+        if options['setup']:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+        fixtures = loadtest.seed(customers=1, agents=1, products=1)
+        product_id = fixtures['product_ids'][0]
+
+        self.stdout.write(
+            f'{"mode":8} {"threads":>7} {"checkouts/s":>11} {"p50 ms":>7} {"p99 ms":>7} '
+            f'{"fallbacks":>9} {"errors":>6} {"lost":>5}'
+        )
+        for concurrency in [int(level) for level in options['concurrency'].split(',')]:
+            for mode, shards in (('row', 0), ('sharded', options['shards'])):
+                inventory.shard_stock(product_id, shards)
+                inventory.set_stock(Product.objects.get(pk=product_id), STOCK)
+                result = self._run(product_id, concurrency, options['checkouts'], options['hold_ms'] / 1000)
+                inventory.aggregate_stock()
+                # Units taken that the aggregated stock doesn't account for
+                lost = STOCK - result['taken'] - Product.objects.get(pk=product_id).stock
+                self.stdout.write(
+                    f'{mode:8} {concurrency:>7} {result["rate"]:>11.0f} {result["p50"]:>7.2f} '
+                    f'{result["p99"]:>7.2f} {result["fallbacks"]:>9} {result["errors"]:>6} {lost:>5}'
+                )
+        inventory.shard_stock(product_id, 0)
+
+    def _run(self, product_id, concurrency, total, hold):
+        product = Product.objects.get(pk=product_id)
+        fallbacks = counter_total(inventory.shard_fallbacks)
+        timings = []
+        errors = []
+        taken = [0]
+        remaining = iter(range(total))
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    index = next(remaining, None)
+                if index is None:
+                    break
+                start = time.perf_counter()
+                try:
+                    close_old_connections()
+                    with transaction.atomic():
+                        inventory.reserve(product, 1)
+                        time.sleep(hold)
+                    with lock:
+                        taken[0] += 1
+                except Exception as exc:
+                    errors.append(exc)
+                timings.append(time.perf_counter() - start)
+            connections.close_all()
+
+        workers = [threading.Thread(target=work) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        timings.sort()
+        return {
+            'rate': total / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p99': loadtest.percentile(timings, 0.99) * 1000,
+            'fallbacks': counter_total(inventory.shard_fallbacks) - fallbacks,
+            'errors': len(errors),
+            'taken': taken[0],
+        }
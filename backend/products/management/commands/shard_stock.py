@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import inventory
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Split the stock of hot products over counter shards so concurrent '
+        'checkouts lock different rows, or with --shards 0 fold it back into '
+        'the product row.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', type=int)
+        parser.add_argument('--shards', type=int, default=8, help='Shards per product; 0 unshards')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if not 0 <= shards <= 256:
+            raise CommandError('--shards must be between 0 and 256.')
+        for product_id in options['product_ids']:
+            try:
+                stock = inventory.shard_stock(product_id, shards)
+            except Product.DoesNotExist:
+                raise CommandError(f'Product {product_id} does not exist.')
+            self.stdout.write(f'Product {product_id}: {stock} in stock over {shards or "no"} shards')
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_delete
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class Category(models.Model):
@@ -12,7 +14,8 @@ class Category(models.Model):
     )
     is_active = models.BooleanField(_('active'), default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for catalog sync (products/sync.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = _('category')
@@ -40,9 +43,13 @@ class Product(models.Model):
         upload_to='products/'
     )
     stock = models.PositiveIntegerField(_('stock'), default=0)
+    # Hot products keep their stock in this many StockShard rows, and stock
+    # is their total as of the last aggregation; see products/inventory.py
+    stock_shards = models.PositiveSmallIntegerField(_('stock shards'), default=0)
     is_available = models.BooleanField(_('available'), default=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for catalog sync (products/sync.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = _('product')
@@ -56,6 +63,59 @@ class Product(models.Model):
     def is_in_stock(self):
         return self.stock > 0
 
+    def primary_image_url(self):
+        """URL of the primary additional image, else of the main image."""
+        image = next((image.image for image in self.additional_images.all() if image.is_primary), None)
+        image = image or self.image
+        return image.url if image else ''
+
+class StockShard(models.Model):
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='shards'
+    )
+    index = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('product', 'index')]
+
+    def __str__(self):
+        return f"{self.product_id}/{self.index}: {self.count}"
+
+class CatalogTombstone(models.Model):
+    """A deleted category or product, for apps syncing the catalog (products/sync.py)."""
+
+    class Kind(models.TextChoices):
+        CATEGORY = 'category', _('Category')
+        PRODUCT = 'product', _('Product')
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+def record_tombstone(sender, instance, **kwargs):
+    if sender is Category:
+        CatalogTombstone.objects.create(kind=CatalogTombstone.Kind.CATEGORY, object_id=instance.pk)
+        return
+    CatalogTombstone.objects.create(kind=CatalogTombstone.Kind.PRODUCT, object_id=instance.pk)
+    # Its product count changed
+    Category.objects.filter(pk=instance.category_id).update(updated_at=timezone.now())
+
+# Also sent for products deleted along with their category
+post_delete.connect(record_tombstone, sender=Category)
+post_delete.connect(record_tombstone, sender=Product)
+
+def touch_product(product_id):
+    # Variants and images are part of the product's representation but have
+    # no updated_at of their own; cached product responses are validated
+    # against the product's (core/conditional.py)
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+
 class ProductVariant(models.Model):
     product = models.ForeignKey(
         Product,
@@ -83,6 +143,15 @@ class ProductVariant(models.Model):
     def final_price(self):
         return self.product.price + self.price_adjustment
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        touch_product(self.product_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        touch_product(self.product_id)
+        return result
+
 class ProductImage(models.Model):
     product = models.ForeignKey(
         Product,
@@ -105,4 +174,11 @@ class ProductImage(models.Model):
         if self.is_primary:
             # Set all other images of this product as non-primary
             ProductImage.objects.filter(product=self.product).update(is_primary=False)
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs)
+        touch_product(self.product_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        touch_product(self.product_id)
+        return result
+ 
\ No newline at end of file
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .inventory import set_stock
 from .models import Category, Product, ProductVariant, ProductImage
 
 class ProductImageSerializer(serializers.ModelSerializer):
@@ -49,6 +50,14 @@ class ProductSerializer(serializers.ModelSerializer):
             'updated_at',
         ]
 
+    def update(self, instance, validated_data):
+        # A sharded product's stock lives in its shards
+        stock = validated_data.pop('stock', None) if instance.stock_shards else None
+        instance = super().update(instance, validated_data)
+        if stock is not None:
+            set_stock(instance, stock)
+        return instance
+
 class CategorySerializer(serializers.ModelSerializer):
     products_count = serializers.IntegerField(
         source='products.count',
@@ -0,0 +1,108 @@
+"""
+Delta sync of the catalog for the mobile app.
+
+Instead of downloading the whole product list on every launch, the app
+keeps the ``token`` of its last sync and asks for what changed since. A
+change is found from the indexed ``updated_at`` of categories and
+products; variant and image writes bump their product's, so a product comes
+back whole, with its current variants and images, whenever any of them
+changed, along with its category. Deleted categories and products leave a
+``CatalogTombstone``.
+
+Rows are stamped when saved, before their transaction commits, so every
+sync repeats the last ``CATALOG_SYNC_LAG`` seconds of
+changes rather than miss a write that committed late (or reached a replica
+late). Clients apply results as upserts, which makes the repeats harmless.
+
+Products come in pages of ``CATALOG_SYNC_PAGE_SIZE`` ordered by
+``(updated_at, id)``; while ``more`` is set, the returned token continues
+the same sync. A missing token, or a final one older than the tombstones
+kept (``CATALOG_SYNC_RETENTION_DAYS``), gets ``reset``: the whole catalog,
+to replace the app's copy.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CatalogTombstone, Category, Product
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_token(moment, after_id=0):
+    micros = (moment - EPOCH) // datetime.timedelta(microseconds=1)
+    return f'{micros}.{after_id}' if after_id else str(micros)
+
+
+def decode_token(token):
+    """``(moment, after_id)`` from a sync token, or ``None`` if it isn't one."""
+    micros, _, after_id = str(token).partition('.')
+    try:
+        moment = EPOCH + datetime.timedelta(microseconds=int(micros))
+        after_id = int(after_id) if after_id else 0
+    except (ValueError, OverflowError):
+        return None
+    if after_id < 0:
+        return None
+    return moment, after_id
+
+
+def catalog_changes(token=None, page_size=None, now=None):
+    """
+    Categories and products changed since ``token`` and the ids of those
+    deleted, with the token to send next time.
+    """
+    now = now or timezone.now()
+    page_size = page_size or settings.CATALOG_SYNC_PAGE_SIZE
+    position = decode_token(token) if token else None
+    oldest = now - datetime.timedelta(days=settings.CATALOG_SYNC_RETENTION_DAYS)
+    # Tokens continuing a paged sync stay valid however old their position
+    reset = position is None or position[0] > now or (not position[1] and position[0] < oldest)
+    since, after_id = (EPOCH, 0) if reset else position
+
+    products = list(
+        Product.objects.filter(Q(updated_at__gt=since) | Q(updated_at=since, pk__gt=after_id))
+        .select_related('category')
+        .prefetch_related('variants', 'additional_images')
+        .order_by('updated_at', 'pk')[:page_size + 1]
+    )
+    more = len(products) > page_size
+    changed = Q(updated_at__gte=since)
+    tombstones = CatalogTombstone.objects.filter(deleted_at__gte=since)
+    if more:
+        products = products[:page_size]
+        until = products[-1].updated_at
+        changed &= Q(updated_at__lte=until)
+        tombstones = tombstones.filter(deleted_at__lte=until)
+        next_token = encode_token(until, products[-1].pk)
+    else:
+        next_token = encode_token(now - datetime.timedelta(seconds=settings.CATALOG_SYNC_LAG))
+    # Categories of changed products too, whose product counts may have moved
+    categories = Category.objects.filter(
+        changed | Q(pk__in={product.category_id for product in products})
+    ).order_by('updated_at', 'pk')
+
+    deleted = {'categories': [], 'products': []}
+    if not reset:
+        for kind, object_id in tombstones.values_list('kind', 'object_id'):
+            key = 'categories' if kind == CatalogTombstone.Kind.CATEGORY else 'products'
+            deleted[key].append(object_id)
+
+    return {
+        'token': next_token,
+        'reset': reset,
+        'more': more,
+        'categories': list(categories),
+        'products': products,
+        'deleted': deleted,
+    }
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones no valid sync token can need any more."""
+    oldest = (now or timezone.now()) - datetime.timedelta(days=settings.CATALOG_SYNC_RETENTION_DAYS)
+    deleted, _ = CatalogTombstone.objects.filter(deleted_at__lt=oldest).delete()
+    return deleted
@@ -0,0 +1,13 @@
+from celery import shared_task
+from .inventory import aggregate_stock
+from .sync import prune_tombstones
+
+@shared_task(database='primary')
+def aggregate_stock_shards():
+    """Refresh sharded products' stock from their shards and rebalance them."""
+    return aggregate_stock()
+
+@shared_task(database='primary')
+def prune_catalog_tombstones():
+    """Delete tombstones older than the oldest sync token still honoured."""
+    return prune_tombstones()
@@ -6,6 +6,8 @@ from .views import (
     ProductVariantViewSet,
     ProductImageViewSet,
 )
+from .async_views import product_detail
+from core.async_views import async_reads
 
 router = routers.DefaultRouter()
 router.register(r'categories', CategoryViewSet)
@@ -17,6 +19,7 @@ products_router.register(r'variants', ProductVariantViewSet, basename='product-v
 products_router.register(r'images', ProductImageViewSet, basename='product-images')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    # GET product detail is served by a native async view
+    path('', include(async_reads(router.urls, {'product-detail': product_detail}))),
     path('', include(products_router.urls)),
 ] 
\ No newline at end of file
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.db.models import Q
 from .models import Category, Product, ProductVariant, ProductImage
+from .sync import catalog_changes
 from .serializers import (
     CategorySerializer,
     CategoryDetailSerializer,
@@ -11,10 +12,15 @@ from .serializers import (
     ProductVariantSerializer,
     ProductImageSerializer,
 )
+from core.compiled import CompiledSerializerMixin, serialize
+from core.conditional import ConditionalGetMixin
+from core.db_router import ReplicaReadMixin
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, ConditionalGetMixin, CompiledSerializerMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    # Lists show product counts, detail the products themselves
+    conditional_fields = ('updated_at', 'products__updated_at')
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
 
@@ -28,14 +34,17 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return CategoryDetailSerializer
         return self.serializer_class
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, CompiledSerializerMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    conditional_fields = ('updated_at', 'category__updated_at')
+    replica_actions = ('list', 'retrieve', 'search', 'sync')
+    compiled_actions = ('list', 'retrieve', 'search')
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description', 'category__name']
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'search']:
+        if self.action in ['list', 'retrieve', 'search', 'sync']:
             return [AllowAny()]
         return [IsAdminUser()]
 
@@ -77,6 +86,20 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """Catalog changes since the ``since`` token of the last sync (products/sync.py)."""
+        changes = catalog_changes(request.query_params.get('since'))
+        context = self.get_serializer_context()
+        return Response({
+            'token': changes['token'],
+            'reset': changes['reset'],
+            'more': changes['more'],
+            'categories': serialize(CategorySerializer, changes['categories'], many=True, context=context),
+            'products': serialize(ProductSerializer, changes['products'], many=True, context=context),
+            'deleted': changes['deleted'],
+        })
+
 class ProductVariantViewSet(viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all()
     serializer_class = ProductVariantSerializer
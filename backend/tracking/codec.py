@@ -0,0 +1,154 @@
+"""
+Wire codecs for the tracking WebSocket.
+
+Clients negotiate the compact binary format by offering
+``MSGPACK_SUBPROTOCOL`` in ``Sec-WebSocket-Protocol``; anyone else keeps the
+original JSON text frames. Binary frames are MessagePack arrays carrying
+coordinates quantized to 1e-5 degrees (about 1.1 m) and delta-encoded
+against the previous frame on the same socket:
+
+    [KEYFRAME, lat_e5, lng_e5]            absolute position
+    [DELTA, dlat_e5, dlng_e5]             offset from the previous frame
+    [..., ..., ..., {"address": ...}]     optional extra keys, sent on change
+    [..., ..., ..., extras or nil, seq]   the order stream's sequence number
+                                          (see tracking/streams.py)
+
+The codec objects are stateful and must be used for one direction of one
+socket only. The same classes are used by the server and by tests/clients.
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = 'zotpot.tracking.msgpack.v1'
+JSON_SUBPROTOCOL = 'zotpot.tracking.json.v1'
+
+KEYFRAME = 0
+DELTA = 1
+
+SCALE = 100000
+# Send an absolute position periodically so a decoder never drifts far
+KEYFRAME_INTERVAL = 100
+
+
+def msgpack_available():
+    return msgpack is not None
+
+
+def choose_subprotocol(offered):
+    """Pick the best subprotocol from the list a client offered, if any."""
+    if MSGPACK_SUBPROTOCOL in offered and msgpack_available():
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+def quantize(value):
+    return int(round(float(value) * SCALE))
+
+
+class JsonLocationCodec:
+    """The original text format, kept as the fallback."""
+
+    binary = False
+
+    def encode(self, location, user_id=None, seq=None):
+        frame = {
+            'type': 'location_update',
+            'location': location,
+            'user_id': user_id,
+        }
+        if seq is not None:
+            frame['seq'] = seq
+        return json.dumps(frame)
+
+    def decode(self, frame):
+        data = json.loads(frame)
+        if data.get('type') != 'location_update':
+            return None
+        return data.get('location')
+
+
+class MsgpackLocationEncoder:
+    binary = True
+
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._last = None
+        self._extras = None
+        self._since_keyframe = 0
+
+    def encode(self, location, user_id=None, seq=None):
+        lat = quantize(location['latitude'])
+        lng = quantize(location['longitude'])
+        extras = {
+            key: value for key, value in location.items()
+            if key not in ('latitude', 'longitude')
+        }
+
+        if self._last is None or self._since_keyframe >= self.keyframe_interval:
+            frame = [KEYFRAME, lat, lng]
+            self._since_keyframe = 0
+            self._extras = None
+        else:
+            frame = [DELTA, lat - self._last[0], lng - self._last[1]]
+            self._since_keyframe += 1
+
+        changed = extras != (self._extras or {})
+        if changed:
+            self._extras = extras
+        if seq is not None:
+            frame.extend([extras if changed else None, seq])
+        elif changed:
+            frame.append(extras)
+
+        self._last = (lat, lng)
+        return msgpack.packb(frame, use_bin_type=True)
+
+
+class MsgpackLocationDecoder:
+    binary = True
+
+    def __init__(self):
+        self._last = None
+        self._extras = {}
+        self.seq = None  # Of the last decoded frame, if it had one
+
+    def decode(self, frame):
+        data = msgpack.unpackb(frame, raw=False)
+        if not isinstance(data, list) or len(data) < 3:
+            raise ValueError('Malformed location frame')
+
+        kind, lat, lng = data[0], data[1], data[2]
+        if kind == KEYFRAME:
+            self._extras = {}
+        elif kind == DELTA:
+            if self._last is None:
+                raise ValueError('Delta frame received before a keyframe')
+            lat += self._last[0]
+            lng += self._last[1]
+        else:
+            raise ValueError(f'Unknown frame kind {kind!r}')
+
+        if len(data) > 3 and isinstance(data[3], dict):
+            self._extras = data[3]
+        self.seq = data[4] if len(data) > 4 else None
+
+        self._last = (lat, lng)
+        location = dict(self._extras)
+        location['latitude'] = lat / SCALE
+        location['longitude'] = lng / SCALE
+        return location
+
+
+def codecs_for(subprotocol):
+    """Return ``(encoder, decoder)`` for a negotiated subprotocol."""
+    if subprotocol == MSGPACK_SUBPROTOCOL:
+        return MsgpackLocationEncoder(), MsgpackLocationDecoder()
+    codec = JsonLocationCodec()
+    return codec, codec
@@ -1,15 +1,85 @@
 import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from core.throttling import TRACKING, budget, buckets, load_monitor, requests_refused
 from orders.models import Order, OrderTracking
+from orders.serializers import OrderTrackingSerializer
+from .codec import choose_subprotocol, codecs_for
+from .fanout import fan_out_location, order_group_name
+from .ingest import record_agent_location
+from .location_store import get_location_store
+from .streams import get_stream_buffer, replay_messages
 
 User = get_user_model()
 
-class LocationTrackingConsumer(AsyncWebsocketConsumer):
+SNAPSHOT_TRACKING_UPDATES = 20  # Newest tracking updates sent in a snapshot
+
+class TrackingConsumer(AsyncWebsocketConsumer):
+    """Negotiates the wire format (MessagePack or JSON) for tracking sockets."""
+
+    async def accept_with_codec(self):
+        subprotocol = choose_subprotocol(self.scope.get('subprotocols', []))
+        self.encoder, self.decoder = codecs_for(subprotocol)
+        load_monitor.watch_event_loop()
+        await self.accept(subprotocol=subprotocol)
+
+    def allow_frame(self):
+        """
+        Tracking-class rate limit (per user in this process) and load
+        shedding for inbound socket frames; refused frames are dropped.
+        Outbound location frames are shed in ``fan_out_location``, before
+        they are numbered.
+        """
+        source = type(self).__name__
+        if load_monitor.should_shed(TRACKING):
+            requests_refused.inc(priority=TRACKING, source=source, reason='shed')
+            return False
+        # The shared buckets would need a Redis round trip on the event loop
+        allowed, _ = buckets.take_local(f'{TRACKING}:user:{self.user.id}', *budget(TRACKING))
+        if not allowed:
+            requests_refused.inc(priority=TRACKING, source=source, reason='rate')
+            return False
+        return True
+
+    @property
+    def user(self):
+        user = self.scope.get('user')
+        return user if user is not None and user.is_authenticated else None
+
+    def decode_location(self, text_data=None, bytes_data=None):
+        """Return the location from an inbound frame, or ``None``."""
+        if bytes_data is not None:
+            if not self.decoder.binary:
+                return None
+            try:
+                return self.decoder.decode(bytes_data)
+            except (ValueError, TypeError):
+                return None
+
+        text_data_json = json.loads(text_data)
+        if text_data_json.get('type') != 'location_update':
+            return None
+        return text_data_json.get('location')
+
+    async def send_location(self, location, user_id, seq=None):
+        if self.encoder.binary:
+            await self.send(bytes_data=self.encoder.encode(location, seq=seq))
+        else:
+            await self.send(text_data=self.encoder.encode(location, user_id, seq))
+
+class LocationTrackingConsumer(TrackingConsumer):
     async def connect(self):
         self.order_id = self.scope['url_route']['kwargs']['order_id']
-        self.room_group_name = f'order_{self.order_id}'
+        self.room_group_name = order_group_name(self.order_id)
+
+        # Only the customer, the assigned agent and admins may watch an order
+        if self.user is None or not await self.can_access_order():
+            await self.close()
+            return
 
         # Join room group
         await self.channel_layer.group_add(
@@ -17,7 +87,49 @@ class LocationTrackingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept_with_codec()
+
+        # A reconnecting client catches up before any live frame
+        last_seq = self.last_seq()
+        if last_seq is not None:
+            await self.resume(last_seq)
+
+    def last_seq(self):
+        """The ``last_seq`` query parameter the client reconnected with, if any."""
+        values = parse_qs(self.scope.get('query_string', b'').decode()).get('last_seq')
+        try:
+            return max(int(values[-1]), 0) if values else None
+        except ValueError:
+            return None
+
+    async def resume(self, last_seq):
+        """Replay the frames missed since ``last_seq``, or send a snapshot (tracking/streams.py)."""
+        streams = get_stream_buffer()
+        if streams.io_bound:
+            missed, current = await sync_to_async(streams.since, thread_sensitive=False)(
+                int(self.order_id), last_seq
+            )
+        else:
+            missed, current = streams.since(int(self.order_id), last_seq)
+        if missed is None:
+            await self.send(text_data=json.dumps(await self.snapshot(current)))
+            return
+        for message in replay_messages(missed):
+            await self.dispatch(message)
+        # Everything up to here has been sent: the client's new watermark
+        await self.send(text_data=json.dumps({'type': 'replayed', 'seq': current}))
+
+    def resume_request(self, text_data):
+        """The ``last_seq`` of a ``resume`` text frame, or ``None``."""
+        if text_data is None:
+            return None
+        try:
+            message = json.loads(text_data)
+            if message.get('type') != 'resume':
+                return None
+            return max(int(message['last_seq']), 0)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
 
     async def disconnect(self, close_code):
         # Leave room group
@@ -26,57 +138,94 @@ class LocationTrackingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message_type = text_data_json.get('type')
-        
-        if message_type == 'location_update':
-            location = text_data_json.get('location')
-            user_id = text_data_json.get('user_id')
-
-            # Save location update
-            await self.save_location_update(user_id, location)
-
-            # Broadcast location to group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'location_update',
-                    'location': location,
-                    'user_id': user_id
-                }
-            )
+    async def receive(self, text_data=None, bytes_data=None):
+        # A client that noticed a gap in the stream asks for it again
+        last_seq = self.resume_request(text_data)
+        if last_seq is not None:
+            if self.allow_frame():
+                await self.resume(last_seq)
+            return
 
-    async def location_update(self, event):
-        location = event['location']
-        user_id = event['user_id']
+        location = self.decode_location(text_data, bytes_data)
+
+        if (location is not None and self.user.role == User.Role.DELIVERY_AGENT
+                and self.allow_frame()):
+            # Save location update once for all of the agent's orders
+            order_ids = await self.save_location_update(location)
 
+            # Broadcast location to every order group the agent is serving
+            if order_ids:
+                await fan_out_location(self.channel_layer, self.user.id, location, order_ids)
+
+    async def location_update(self, event):
         # Send location update to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'location_update',
-            'location': location,
-            'user_id': user_id
-        }))
+        await self.send_location(event['location'], event['user_id'], event.get('seq'))
+
+    async def order_event(self, event):
+        # Relayed from the order event outbox (orders/events.py); sent as a
+        # JSON text frame whatever the negotiated location codec
+        await self.send(text_data=json.dumps({**event['event'], 'seq': event.get('seq')}))
 
     @database_sync_to_async
-    def save_location_update(self, user_id, location):
+    def can_access_order(self):
+        user = self.user
+        if user.role == User.Role.ADMIN or user.is_staff:
+            return True
         try:
-            order = Order.objects.get(id=self.order_id)
-            user = User.objects.get(id=user_id)
-
-            if user.role == 'delivery_agent' and order.delivery_agent_id == user.id:
-                # Update delivery agent's location
-                delivery_profile = user.delivery_profile
-                delivery_profile.current_location = location
-                delivery_profile.save()
-
-                # Create tracking update
-                OrderTracking.objects.create(
-                    order=order,
-                    status=order.status,
-                    location=location,
-                    description="Delivery agent location updated"
-                )
-        except (Order.DoesNotExist, User.DoesNotExist):
-            pass  # Silently ignore if order or user doesn't exist
- 
\ No newline at end of file
+            return Order.objects.filter(
+                Q(customer_id=user.id) | Q(delivery_agent_id=user.id),
+                id=self.order_id
+            ).exists()
+        except ValueError:
+            return False
+
+    @database_sync_to_async
+    def snapshot(self, seq):
+        """The order's current state, for a client too far behind to replay."""
+        order = Order.objects.filter(id=self.order_id).values(
+            'status', 'payment_status', 'delivery_agent_id'
+        ).first() or {}
+        agent_id = order.get('delivery_agent_id')
+        tracking = OrderTracking.objects.filter(order_id=self.order_id)[:SNAPSHOT_TRACKING_UPDATES]
+        return {
+            'type': 'snapshot',
+            'seq': seq,
+            'order_id': int(self.order_id),
+            'status': order.get('status'),
+            'payment_status': order.get('payment_status'),
+            'location': get_location_store().get(agent_id) if agent_id else None,
+            'tracking_updates': OrderTrackingSerializer(tracking, many=True).data,
+        }
+
+    @database_sync_to_async
+    def save_location_update(self, location):
+        # Only the agent assigned to this order may publish on its socket
+        if Order.objects.filter(id=self.order_id, delivery_agent_id=self.user.id).exists():
+            return record_agent_location(self.user.id, location)
+        return None
+
+class AgentLocationConsumer(TrackingConsumer):
+    """
+    Single socket per delivery agent.
+
+    The agent publishes each position once and the server fans it out to
+    every active order group, instead of the app sending one ping per order.
+    """
+
+    async def connect(self):
+        if self.user is None or self.user.role != User.Role.DELIVERY_AGENT:
+            await self.close()
+            return
+
+        self.agent_id = self.user.id
+        await self.accept_with_codec()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        location = self.decode_location(text_data, bytes_data)
+
+        if location is not None and self.allow_frame():
+            order_ids = await database_sync_to_async(record_agent_location)(
+                self.agent_id, location
+            )
+            if order_ids:
+                await fan_out_location(self.channel_layer, self.agent_id, location, order_ids)
@@ -0,0 +1,154 @@
+"""
+Agent-level fan-out of location updates.
+
+An agent publishes each position once; the server looks up the agent's
+active orders and forwards the frame to every ``order_{id}`` group, subject
+to a per-group rate limit. A frame over the limit is held back and the
+newest held frame is sent when the interval ends. Each frame sent carries
+the order stream's sequence number (tracking/streams.py).
+"""
+
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from core.throttling import TRACKING, buckets, load_monitor, requests_refused
+
+from .streams import get_stream_buffer
+
+ACTIVE_ORDER_STATUSES = ('confirmed', 'preparing', 'out_for_delivery', 'arrived')
+
+
+def order_group_name(order_id):
+    return f'order_{order_id}'
+
+
+def _cache_key(agent_id):
+    return f'tracking:agent_orders:{agent_id}'
+
+
+def get_active_order_ids(agent_id):
+    """Ids of orders the agent is currently carrying, cached briefly."""
+    order_ids = cache.get(_cache_key(agent_id))
+    if order_ids is None:
+        from orders.models import Order  # Import here to avoid circular import
+
+        order_ids = list(
+            Order.objects.filter(
+                delivery_agent_id=agent_id,
+                status__in=ACTIVE_ORDER_STATUSES
+            ).values_list('id', flat=True)
+        )
+        cache.set(
+            _cache_key(agent_id),
+            order_ids,
+            getattr(settings, 'TRACKING_AGENT_ORDERS_TTL', 30)
+        )
+    return order_ids
+
+
+def invalidate_active_orders(agent_id):
+    """Drop the cached order list after an assignment or status change."""
+    if agent_id:
+        cache.delete(_cache_key(agent_id))
+
+
+class GroupRateLimiter:
+    """
+    Allow at most one frame per ``interval`` seconds to each group.
+
+    Counted in the shared token buckets (core/throttling.py), so the socket
+    consumers, the REST API and Celery workers share each group's limit.
+    """
+
+    def __init__(self, interval=None):
+        if interval is None:
+            interval = getattr(settings, 'TRACKING_GROUP_MIN_INTERVAL', 1.0)
+        self.interval = interval
+
+    async def allow(self, group):
+        """Return ``(allowed, seconds until the group may be sent to again)``."""
+        if not self.interval:
+            return True, 0.0
+        return await buckets.atake(f'tracking:group:{group}', 1 / self.interval, 1)
+
+
+group_rate_limiter = GroupRateLimiter()
+
+HELD_TTL = 60
+
+
+def _held_key(order_id):
+    return f'tracking:held_location:{order_id}'
+
+
+def _flush_key(order_id):
+    return f'tracking:held_location_flush:{order_id}'
+
+
+async def hold_location(order_id, event, wait):
+    """
+    Keep the newest throttled frame of an order and have it sent when the
+    group's interval ends, so the agent's last position is always pushed.
+    """
+    await cache.aset(_held_key(order_id), event, HELD_TTL)
+    # One flush queued per order at a time; the flush clears the key first
+    if await cache.aadd(_flush_key(order_id), True, math.ceil(wait) + 5):
+        from .tasks import flush_held_location  # Import here to avoid circular import
+
+        await sync_to_async(flush_held_location.apply_async, thread_sensitive=False)(
+            (order_id,), countdown=wait
+        )
+
+
+def held_location(order_id):
+    """The frame held back for ``order_id``, or ``None``."""
+    cache.delete(_flush_key(order_id))
+    return cache.get(_held_key(order_id))
+
+
+async def fan_out_location(channel_layer, agent_id, location, order_ids, limiter=None, streams=None,
+                           hold=True):
+    """
+    Send one location frame to each order group; return the groups reached.
+
+    Frames over a group's limit are held for the trailing flush when
+    ``hold``, else dropped. Nothing is sent while the process sheds
+    tracking load.
+    """
+    if load_monitor.should_shed(TRACKING):
+        # Shed before numbering, so a dropped frame leaves no gap in the
+        # order streams for clients to resume; the next ping supersedes it
+        requests_refused.inc(priority=TRACKING, source='fan_out_location', reason='shed')
+        return []
+    limiter = limiter or group_rate_limiter
+    streams = streams or get_stream_buffer()
+    event = {
+        'type': 'location_update',
+        'location': location,
+        'user_id': agent_id,
+    }
+    allowed = []
+    for order_id in order_ids:
+        ok, wait = await limiter.allow(order_group_name(order_id))
+        if ok:
+            allowed.append(order_id)
+        elif hold:
+            await hold_location(order_id, event, wait)
+    if streams.io_bound:
+        messages = await sync_to_async(stamp_messages, thread_sensitive=False)(streams, allowed, event)
+    else:
+        messages = stamp_messages(streams, allowed, event)
+    sent = []
+    for order_id, message in zip(allowed, messages):
+        group = order_group_name(order_id)
+        await channel_layer.group_send(group, message)
+        sent.append(group)
+    return sent
+
+
+def stamp_messages(streams, order_ids, message):
+    """``message`` for each order, numbered and kept for replay (tracking/streams.py)."""
+    return [streams.append(order_id, message) for order_id in order_ids]
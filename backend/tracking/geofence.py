@@ -0,0 +1,160 @@
+"""
+Geofences around the delivery addresses of orders out for delivery.
+
+Every process keeps a ``FenceIndex``: a circle of ``GEOFENCE_RADIUS_M``
+around the address of each order that is out for delivery, reloaded from
+the database every ``GEOFENCE_REFRESH_SECONDS``. Cells are at least as wide
+as a fence, and each fence is registered in every cell its circle
+overlaps, so a ping is checked with one dict lookup and a distance test
+against the few fences in its cell, however many orders are on the road.
+
+``record_agent_location`` runs each stored ping through ``check_arrivals``.
+When the assigned agent enters an order's fence the order moves to
+``arrived`` (once, whichever process sees the ping first), with an arrival
+tracking update and an ``arrived`` order event, which the event relay
+pushes to the order's socket group and the customer (orders/events.py).
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.metrics import registry
+
+from .fanout import invalidate_active_orders
+from .location_store import KM_PER_DEGREE, haversine_km
+
+arrivals = registry.counter(
+    'zotpot_geofence_arrivals_total',
+    'Orders moved to arrived by the assigned agent entering their fence.',
+)
+
+
+class FenceIndex:
+    """Circular fences of one radius, bucketed into a lat/lng grid."""
+
+    def __init__(self, radius_m=75, cell_size=0.005):
+        self.radius_km = radius_m / 1000
+        # A fence must fit in a 2x2 block of cells
+        self.cell_size = max(cell_size, 2 * self.radius_km / KM_PER_DEGREE)
+        self._cells = {}
+        self._fences = {}
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def add(self, order_id, agent_id, lat, lng):
+        self.remove(order_id)
+        lat_span = self.radius_km / KM_PER_DEGREE
+        lng_span = lat_span / max(math.cos(math.radians(lat)), 0.01)
+        low = self._cell(lat - lat_span, lng - lng_span)
+        high = self._cell(lat + lat_span, lng + lng_span)
+        cells = [
+            (row, col)
+            for row in range(low[0], high[0] + 1)
+            for col in range(low[1], high[1] + 1)
+        ]
+        fence = (order_id, agent_id, lat, lng)
+        # Cells hold tuples, replaced rather than mutated, so pings can be
+        # checked while another thread removes a fence
+        for cell in cells:
+            self._cells[cell] = self._cells.get(cell, ()) + (fence,)
+        self._fences[order_id] = cells
+
+    def remove(self, order_id):
+        for cell in self._fences.pop(order_id, ()):
+            remaining = tuple(fence for fence in self._cells.get(cell, ()) if fence[0] != order_id)
+            if remaining:
+                self._cells[cell] = remaining
+            else:
+                self._cells.pop(cell, None)
+
+    def hits(self, agent_id, lat, lng):
+        """Ids of orders assigned to ``agent_id`` whose fence contains the point."""
+        fences = self._cells.get(self._cell(lat, lng))
+        if not fences:
+            return []
+        return [
+            order_id for order_id, fence_agent_id, fence_lat, fence_lng in fences
+            if fence_agent_id == agent_id
+            and haversine_km(lat, lng, fence_lat, fence_lng) <= self.radius_km
+        ]
+
+    def __len__(self):
+        return len(self._fences)
+
+
+def load_fences(radius_m=None):
+    """A ``FenceIndex`` of the orders out for delivery to addresses with coordinates."""
+    from orders.models import Order  # Import here to avoid circular import
+
+    index = FenceIndex(settings.GEOFENCE_RADIUS_M if radius_m is None else radius_m)
+    rows = Order.objects.filter(
+        status=Order.Status.OUT_FOR_DELIVERY,
+        delivery_agent__isnull=False,
+        delivery_address__latitude__isnull=False,
+        delivery_address__longitude__isnull=False,
+    ).values_list('id', 'delivery_agent_id', 'delivery_address__latitude', 'delivery_address__longitude')
+    for order_id, agent_id, lat, lng in rows.iterator():
+        index.add(order_id, agent_id, float(lat), float(lng))
+    return index
+
+
+_index = None
+_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_fence_index():
+    """This process's fences, reloaded when older than ``GEOFENCE_REFRESH_SECONDS``."""
+    global _index, _loaded_at
+    if _index is not None and time.monotonic() - _loaded_at < settings.GEOFENCE_REFRESH_SECONDS:
+        return _index
+    # One thread reloads; the others keep using the current index meanwhile
+    if _index_lock.acquire(blocking=_index is None):
+        try:
+            if _index is None or time.monotonic() - _loaded_at >= settings.GEOFENCE_REFRESH_SECONDS:
+                _index = load_fences()
+                _loaded_at = time.monotonic()
+        finally:
+            _index_lock.release()
+    return _index
+
+
+def mark_arrived(order_id, agent_id, location):
+    """Move the order to arrived unless another ping already did; returns whether it did."""
+    from orders.events import record_order_event  # Import here to avoid circular import
+    from orders.models import Order, OrderEvent, OrderTracking
+
+    with transaction.atomic():
+        updated = Order.objects.filter(
+            pk=order_id, delivery_agent_id=agent_id, status=Order.Status.OUT_FOR_DELIVERY
+        ).update(status=Order.Status.ARRIVED, updated_at=timezone.now())
+        if not updated:
+            return False
+        OrderTracking.objects.create(
+            order_id=order_id,
+            status=Order.Status.ARRIVED,
+            location=location,
+            description="Delivery agent arrived"
+        )
+        order = Order.objects.get(pk=order_id)
+        record_order_event(order, OrderEvent.Kind.ARRIVED, "Delivery agent arrived")
+        transaction.on_commit(lambda: invalidate_active_orders(agent_id))
+    arrivals.inc()
+    return True
+
+
+def check_arrivals(agent_id, lat, lng, location):
+    """Handle the agent entering the fences of its orders; returns the arrived order ids."""
+    index = get_fence_index()
+    arrived = []
+    for order_id in index.hits(agent_id, lat, lng):
+        index.remove(order_id)
+        if mark_arrived(order_id, agent_id, location):
+            arrived.append(order_id)
+    return arrived
@@ -0,0 +1,162 @@
+"""
+Location ingestion path shared by the tracking sockets and the REST API.
+"""
+
+import datetime
+import math
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fanout import fan_out_location, get_active_order_ids
+from .geofence import check_arrivals
+from .location_store import get_location_store, parse_location
+
+
+MAX_BATCH_PINGS = 500
+CLOCK_SKEW = 60  # Seconds a device clock may run ahead of ours
+LAST_PING_TTL = 24 * 60 * 60
+
+
+def _last_ping_key(agent_id):
+    return f'tracking:agent_last_ping:{agent_id}'
+
+
+def record_agent_location(agent_id, location, available=None):
+    """
+    Store one agent ping, check it against the fences of the agent's orders
+    and add it to the trail of every active order.
+
+    Returns the ids of the agent's active orders, or ``None`` if the
+    location was rejected.
+    """
+    from orders.models import Order, OrderTracking  # Import here to avoid circular import
+
+    if not get_location_store().update(agent_id, location, available=available, timestamp=time.time()):
+        return None
+
+    order_ids = get_active_order_ids(agent_id)
+    if order_ids:
+        check_arrivals(agent_id, *parse_location(location), location)
+        statuses = dict(
+            Order.objects.filter(id__in=order_ids).values_list('id', 'status')
+        )
+        OrderTracking.objects.bulk_create([
+            OrderTracking(
+                order_id=order_id,
+                status=order_status,
+                location=location,
+                description="Delivery agent location updated"
+            )
+            for order_id, order_status in statuses.items()
+        ])
+    return order_ids
+
+
+def ping_time(value):
+    """Seconds since the epoch from a ping's ``timestamp`` (a number or ISO 8601), or ``None``."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            return None
+        if parsed is None:
+            return None
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+        return parsed.timestamp()
+    return None
+
+
+def clean_pings(pings, after=None, now=None):
+    """
+    Validate a batch of timestamped pings in one pass, in the order sent.
+
+    Returns ``(kept, dropped)``: ``kept`` lists ``(timestamp, (lat, lng),
+    location)`` for pings to record, ``dropped`` counts the others as
+    ``invalid`` (bad position or time, or in the future), ``duplicates``
+    (the same time as the ping before, or as ``after``, the newest ping of
+    an earlier batch) and ``out_of_order`` (older than those).
+    """
+    limit = (now or time.time()) + CLOCK_SKEW
+    kept = []
+    dropped = {'invalid': 0, 'duplicates': 0, 'out_of_order': 0}
+    last = after
+    for location in pings:
+        coords = parse_location(location)
+        timestamp = ping_time(location.get('timestamp')) if coords is not None else None
+        if timestamp is None or timestamp > limit:
+            dropped['invalid'] += 1
+        elif last is not None and timestamp == last:
+            dropped['duplicates'] += 1
+        elif last is not None and timestamp < last:
+            dropped['out_of_order'] += 1
+        else:
+            kept.append((timestamp, coords, location))
+            last = timestamp
+    return kept, dropped
+
+
+def record_agent_locations(agent_id, pings, available=None):
+    """
+    Record pings an agent buffered while offline, oldest first.
+
+    Pings at or before the newest one of the agent's previous batch are
+    dropped as repeats. Every other ping is checked against the agent's
+    fences and added to the trail of each active order with one bulk
+    insert, even if live pings arrived meanwhile; only the newest moves the
+    agent's live position, and only if it is still fresh and newer than the
+    stored one. Returns the counts from ``clean_pings`` with
+    ``accepted``, the active ``order_ids`` and ``latest``, the location to
+    broadcast (``None`` if there is none).
+    """
+    from orders.models import Order, OrderTracking  # Import here to avoid circular import
+
+    kept, result = clean_pings(pings, after=cache.get(_last_ping_key(agent_id)))
+    result.update(accepted=len(kept), order_ids=[], latest=None)
+    if not kept:
+        return result
+
+    timestamp, _, location = kept[-1]
+    cache.set(_last_ping_key(agent_id), timestamp, LAST_PING_TTL)
+    store = get_location_store()
+    # A live ping stored meanwhile (e.g. the socket reconnected before the
+    # buffer was flushed) is newer than anything in the batch
+    current = store.last_seen(agent_id)
+    if store.is_fresh(timestamp) and (current is None or timestamp > current):
+        store.update(agent_id, location, available=available, timestamp=timestamp)
+        result['latest'] = location
+
+    order_ids = get_active_order_ids(agent_id)
+    if order_ids:
+        for _, coords, ping in kept:
+            check_arrivals(agent_id, *coords, ping)
+        statuses = dict(
+            Order.objects.filter(id__in=order_ids).values_list('id', 'status')
+        )
+        OrderTracking.objects.bulk_create([
+            OrderTracking(
+                order_id=order_id,
+                status=order_status,
+                location=ping,
+                description="Delivery agent location updated"
+            )
+            for _, _, ping in kept
+            for order_id, order_status in statuses.items()
+        ], batch_size=1000)
+    result['order_ids'] = order_ids
+    return result
+
+
+def publish_agent_location(agent_id, location, order_ids):
+    """Fan a stored ping out to the order groups from synchronous code."""
+    if order_ids:
+        async_to_sync(fan_out_location)(get_channel_layer(), agent_id, location, order_ids)
@@ -0,0 +1,416 @@
+"""
+Live delivery agent location store.
+
+Pings from agents land here instead of being written to
+``DeliveryAgent.current_location`` one row at a time. Positions are bucketed
+into a lat/lng grid (in memory) or a Redis GEO set, expire after a TTL, and
+are checkpointed back to the database periodically by
+``tracking.tasks.checkpoint_agent_locations``.
+"""
+
+import json
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_location(location):
+    """Return ``(lat, lng)`` from a location dict, or ``None`` if invalid."""
+    if not isinstance(location, dict):
+        return None
+    try:
+        lat = float(location['latitude'])
+        lng = float(location['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+class BaseLocationStore:
+    """Interface shared by the in-memory and Redis location stores."""
+
+    def __init__(self, ttl=120):
+        self.ttl = ttl
+
+    def update(self, agent_id, location, available=None, timestamp=None):
+        raise NotImplementedError
+
+    def set_available(self, agent_id, available):
+        raise NotImplementedError
+
+    def get(self, agent_id):
+        raise NotImplementedError
+
+    def last_seen(self, agent_id):
+        """Timestamp of the agent's stored position, or ``None``."""
+        raise NotImplementedError
+
+    def remove(self, agent_id):
+        raise NotImplementedError
+
+    def nearest(self, latitude, longitude, k=5, radius_km=None, available_only=True):
+        """Return up to ``k`` fresh agents as ``(agent_id, distance_km)``, closest first."""
+        raise NotImplementedError
+
+    def pop_dirty(self):
+        """Return ``{agent_id: location}`` changed since the previous call."""
+        raise NotImplementedError
+
+    def expire_stale(self):
+        """Drop agents whose last ping is older than the TTL; returns how many."""
+        raise NotImplementedError
+
+    def is_fresh(self, timestamp, now=None):
+        return (now or time.time()) - timestamp <= self.ttl
+
+
+class InMemoryLocationStore(BaseLocationStore):
+    """
+    Grid-bucketed store for a single process (development, tests, benchmarks).
+
+    Each agent lives in one ``cell_size`` x ``cell_size`` degree bucket;
+    nearest-k queries walk rings of buckets outward from the query point.
+    """
+
+    def __init__(self, ttl=120, cell_size=0.01):
+        super().__init__(ttl=ttl)
+        self.cell_size = cell_size
+        self._agents = {}
+        self._cells = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size)))
+
+    def update(self, agent_id, location, available=None, timestamp=None):
+        coords = parse_location(location)
+        if coords is None:
+            return False
+        timestamp = timestamp or time.time()
+        cell = self._cell(*coords)
+
+        with self._lock:
+            previous = self._agents.get(agent_id)
+            if previous is not None:
+                if available is None:
+                    available = previous['available']
+                if previous['cell'] != cell:
+                    self._discard_from_cell(agent_id, previous['cell'])
+            elif available is None:
+                available = True
+
+            self._agents[agent_id] = {
+                'lat': coords[0],
+                'lng': coords[1],
+                'location': location,
+                'available': available,
+                'timestamp': timestamp,
+                'cell': cell,
+            }
+            self._cells.setdefault(cell, set()).add(agent_id)
+            self._dirty.add(agent_id)
+        return True
+
+    def set_available(self, agent_id, available):
+        with self._lock:
+            entry = self._agents.get(agent_id)
+            if entry is not None:
+                entry['available'] = available
+
+    def get(self, agent_id):
+        entry = self._agents.get(agent_id)
+        if entry is None or not self.is_fresh(entry['timestamp']):
+            return None
+        return entry['location']
+
+    def last_seen(self, agent_id):
+        entry = self._agents.get(agent_id)
+        return entry['timestamp'] if entry is not None else None
+
+    def remove(self, agent_id):
+        with self._lock:
+            entry = self._agents.pop(agent_id, None)
+            if entry is not None:
+                self._discard_from_cell(agent_id, entry['cell'])
+            self._dirty.discard(agent_id)
+
+    def expire_stale(self):
+        now = time.time()
+        with self._lock:
+            stale = [
+                agent_id for agent_id, entry in self._agents.items()
+                if not self.is_fresh(entry['timestamp'], now)
+            ]
+            for agent_id in stale:
+                entry = self._agents.pop(agent_id)
+                self._discard_from_cell(agent_id, entry['cell'])
+                self._dirty.discard(agent_id)
+        return len(stale)
+
+    def _discard_from_cell(self, agent_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(agent_id)
+            if not members:
+                del self._cells[cell]
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield row, col
+            return
+        for dc in range(-radius, radius + 1):
+            yield row - radius, col + dc
+            yield row + radius, col + dc
+        for dr in range(-radius + 1, radius):
+            yield row + dr, col - radius
+            yield row + dr, col + radius
+
+    def _scan(self, cells, latitude, longitude, now, available_only, radius_km, found):
+        stale = []
+        for cell in cells:
+            for agent_id in self._cells.get(cell, ()):
+                entry = self._agents[agent_id]
+                if not self.is_fresh(entry['timestamp'], now):
+                    stale.append(agent_id)
+                    continue
+                if available_only and not entry['available']:
+                    continue
+                distance = haversine_km(latitude, longitude, entry['lat'], entry['lng'])
+                if radius_km is None or distance <= radius_km:
+                    found.append((distance, agent_id))
+        return stale
+
+    def nearest(self, latitude, longitude, k=5, radius_km=None, available_only=True):
+        if k < 1:
+            return []
+        now = time.time()
+        row, col = self._cell(latitude, longitude)
+        # Smallest width of one cell in km at this latitude, used to bound
+        # how far away the next ring of cells can possibly start.
+        cell_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)
+        max_radius = None
+        if radius_km is not None:
+            max_radius = int(math.ceil(radius_km / cell_km)) + 1
+
+        found = []
+        stale = []
+        with self._lock:
+            radius = 0
+            while True:
+                if (2 * radius + 1) ** 2 >= len(self._cells):
+                    # The ring walk would touch more buckets than exist; scan
+                    # the occupied ones that are still outside the rings.
+                    remaining = [
+                        cell for cell in self._cells
+                        if max(abs(cell[0] - row), abs(cell[1] - col)) >= radius
+                    ]
+                    stale += self._scan(
+                        remaining, latitude, longitude, now, available_only, radius_km, found
+                    )
+                    break
+
+                stale += self._scan(
+                    self._ring(row, col, radius),
+                    latitude, longitude, now, available_only, radius_km, found,
+                )
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= radius * cell_km:
+                        break
+                if max_radius is not None and radius >= max_radius:
+                    break
+                radius += 1
+
+            for agent_id in stale:
+                entry = self._agents.pop(agent_id)
+                self._discard_from_cell(agent_id, entry['cell'])
+
+        found.sort()
+        return [(agent_id, distance) for distance, agent_id in found[:k]]
+
+    def pop_dirty(self):
+        with self._lock:
+            dirty = {
+                agent_id: self._agents[agent_id]['location']
+                for agent_id in self._dirty
+                if agent_id in self._agents
+            }
+            self._dirty.clear()
+        return dirty
+
+    def __len__(self):
+        return len(self._agents)
+
+
+class RedisLocationStore(BaseLocationStore):
+    """
+    Store backed by Redis GEO sets, shared by web, ASGI and Celery processes.
+
+    Keys (all under ``prefix``):
+      ``geo``        GEO set of every agent with a known position
+      ``geo:avail``  GEO set of agents currently available for assignment
+      ``seen``       sorted set of last ping timestamps, used for the TTL
+      ``loc``        hash of agent id -> JSON location payload
+      ``dirty``      set of agent ids not yet checkpointed to the database
+    """
+
+    def __init__(self, ttl=120, url=None, prefix='zotpot:agents', client=None):
+        super().__init__(ttl=ttl)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def update(self, agent_id, location, available=None, timestamp=None):
+        coords = parse_location(location)
+        if coords is None:
+            return False
+        lat, lng = coords
+        timestamp = timestamp or time.time()
+
+        pipe = self.client.pipeline()
+        pipe.geoadd(self._key('geo'), (lng, lat, agent_id))
+        if available is True:
+            pipe.geoadd(self._key('geo:avail'), (lng, lat, agent_id))
+        elif available is False:
+            pipe.zrem(self._key('geo:avail'), agent_id)
+        pipe.zadd(self._key('seen'), {agent_id: timestamp})
+        pipe.hset(self._key('loc'), agent_id, json.dumps(location))
+        pipe.sadd(self._key('dirty'), agent_id)
+        pipe.execute()
+
+        if available is None:
+            # Keep the availability index in step with the new position
+            # without knowing the flag here.
+            if self.client.zscore(self._key('geo:avail'), agent_id) is not None:
+                self.client.geoadd(self._key('geo:avail'), (lng, lat, agent_id))
+        return True
+
+    def set_available(self, agent_id, available):
+        if not available:
+            self.client.zrem(self._key('geo:avail'), agent_id)
+            return
+        position = self.client.geopos(self._key('geo'), agent_id)
+        if position and position[0]:
+            lng, lat = position[0]
+            self.client.geoadd(self._key('geo:avail'), (lng, lat, agent_id))
+
+    def get(self, agent_id):
+        pipe = self.client.pipeline()
+        pipe.zscore(self._key('seen'), agent_id)
+        pipe.hget(self._key('loc'), agent_id)
+        seen, payload = pipe.execute()
+        if seen is None or payload is None or not self.is_fresh(seen):
+            return None
+        return json.loads(payload)
+
+    def last_seen(self, agent_id):
+        return self.client.zscore(self._key('seen'), agent_id)
+
+    def remove(self, agent_id):
+        pipe = self.client.pipeline()
+        for name in ('geo', 'geo:avail', 'seen'):
+            pipe.zrem(self._key(name), agent_id)
+        pipe.hdel(self._key('loc'), agent_id)
+        pipe.srem(self._key('dirty'), agent_id)
+        pipe.execute()
+
+    def expire_stale(self):
+        cutoff = time.time() - self.ttl
+        stale = self.client.zrangebyscore(self._key('seen'), '-inf', cutoff)
+        if stale:
+            pipe = self.client.pipeline()
+            for name in ('geo', 'geo:avail', 'seen'):
+                pipe.zrem(self._key(name), *stale)
+            pipe.hdel(self._key('loc'), *stale)
+            pipe.execute()
+        return len(stale)
+
+    def nearest(self, latitude, longitude, k=5, radius_km=None, available_only=True):
+        if k < 1:
+            return []
+        key = self._key('geo:avail' if available_only else 'geo')
+        radius = radius_km if radius_km is not None else 2 * math.pi * EARTH_RADIUS_KM
+        count = k * 2
+        cutoff = time.time() - self.ttl
+
+        while True:
+            results = self.client.geosearch(
+                key,
+                longitude=longitude,
+                latitude=latitude,
+                radius=radius,
+                unit='km',
+                sort='ASC',
+                count=count,
+                withdist=True,
+            )
+            if not results:
+                return []
+            members = [member for member, _ in results]
+            seen = self.client.zmscore(self._key('seen'), members)
+            fresh = [
+                (self._decode(member), distance)
+                for (member, distance), score in zip(results, seen)
+                if score is not None and score >= cutoff
+            ]
+            if len(fresh) >= k or len(results) < count:
+                return fresh[:k]
+            count *= 4
+
+    def pop_dirty(self):
+        agent_ids = self.client.spop(self._key('dirty'), self.client.scard(self._key('dirty')))
+        if not agent_ids:
+            return {}
+        payloads = self.client.hmget(self._key('loc'), agent_ids)
+        return {
+            self._decode(agent_id): json.loads(payload)
+            for agent_id, payload in zip(agent_ids, payloads)
+            if payload is not None
+        }
+
+    def _decode(self, member):
+        if isinstance(member, bytes):
+            member = member.decode()
+        return int(member) if member.isdigit() else member
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_location_store():
+    """Return the process-wide store configured by ``settings.LOCATION_STORE``."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = getattr(settings, 'LOCATION_STORE', {})
+                backend = import_string(
+                    config.get('BACKEND', 'tracking.location_store.InMemoryLocationStore')
+                )
+                _store = backend(**config.get('OPTIONS', {}))
+    return _store
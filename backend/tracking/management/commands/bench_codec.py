@@ -0,0 +1,68 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracking.codec import (
+    JsonLocationCodec,
+    MsgpackLocationDecoder,
+    MsgpackLocationEncoder,
+    msgpack_available,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bytes and CPU per tracking frame for the JSON and MessagePack codecs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not msgpack_available():
+            raise CommandError('msgpack is not installed')
+
+        locations = self._route(options['frames'], random.Random(options['seed']))
+
+        json_codec = JsonLocationCodec()
+        self._report('json', json_codec, json_codec, locations, user_id=1042)
+        self._report('msgpack', MsgpackLocationEncoder(), MsgpackLocationDecoder(), locations)
+
+    def _route(self, count, rng):
+        # An agent riding at ~30 km/h pinging every 2 seconds
+        lat, lng, heading = 12.9716, 77.5946, rng.uniform(0, 2 * math.pi)
+        locations = []
+        for _ in range(count):
+            heading += rng.gauss(0, 0.2)
+            lat += 0.00015 * math.cos(heading)
+            lng += 0.00015 * math.sin(heading)
+            locations.append({
+                'latitude': round(lat, 6),
+                'longitude': round(lng, 6),
+                'address': '80 Feet Road, Koramangala',
+            })
+        return locations
+
+    def _report(self, label, encoder, decoder, locations, user_id=None):
+        start = time.perf_counter()
+        frames = [encoder.encode(location, user_id) for location in locations]
+        encode_us = (time.perf_counter() - start) * 1e6 / len(locations)
+
+        start = time.perf_counter()
+        decoded = [decoder.decode(frame) for frame in frames]
+        decode_us = (time.perf_counter() - start) * 1e6 / len(frames)
+
+        sizes = [len(frame.encode() if isinstance(frame, str) else frame) for frame in frames]
+        error_m = max(
+            max(abs(a['latitude'] - b['latitude']), abs(a['longitude'] - b['longitude']))
+            for a, b in zip(locations, decoded)
+        ) * 111320
+
+        self.stdout.write(
+            f'{label:8s} bytes/frame mean {statistics.mean(sizes):6.1f}  '
+            f'median {statistics.median(sizes):5.0f}  '
+            f'encode {encode_us:5.2f} us  decode {decode_us:5.2f} us  '
+            f'max error {error_m:.2f} m'
+        )
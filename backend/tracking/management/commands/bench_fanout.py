@@ -0,0 +1,57 @@
+import asyncio
+import statistics
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from core.throttling import TokenBucket
+from tracking.fanout import GroupRateLimiter, fan_out_location, order_group_name
+from tracking.streams import InMemoryStreamBuffer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark agent-level fan-out of location frames to order groups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-orders', type=int, default=10)
+        parser.add_argument('--pings', type=int, default=2000)
+        parser.add_argument('--subscribers', type=int, default=2, help='Sockets per order group')
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        location = {'latitude': 12.9716, 'longitude': 77.5946, 'address': 'MG Road'}
+        self.stdout.write('orders  per-ping us  per-group us  frames/ping  throttled frames/ping')
+
+        for order_count in range(1, options['max_orders'] + 1):
+            layer = InMemoryChannelLayer(capacity=options['pings'] * 2)
+            order_ids = list(range(1, order_count + 1))
+            for order_id in order_ids:
+                for _ in range(options['subscribers']):
+                    channel = await layer.new_channel()
+                    await layer.group_add(order_group_name(order_id), channel)
+
+            unlimited = GroupRateLimiter(interval=0)
+            streams = InMemoryStreamBuffer()
+            timings = []
+            for _ in range(options['pings']):
+                start = time.perf_counter()
+                await fan_out_location(layer, 1, location, order_ids, limiter=unlimited, streams=streams)
+                timings.append((time.perf_counter() - start) * 1e6)
+
+            # Agent pinging every 200ms against a 1s per-group limit, which
+            # takes one token a second from each group's bucket
+            throttled = {order_id: TokenBucket(1.0, 1) for order_id in order_ids}
+            sent = 0
+            start = time.monotonic()
+            for tick in range(options['pings']):
+                now = start + tick * 0.2
+                sent += sum(bucket.take(now=now)[0] for bucket in throttled.values())
+
+            per_ping = statistics.median(timings)
+            self.stdout.write(
+                f'{order_count:6d}  {per_ping:11.1f}  {per_ping / order_count:12.1f}  '
+                f'{order_count * options["subscribers"]:11d}  {sent / options["pings"]:21.2f}'
+            )
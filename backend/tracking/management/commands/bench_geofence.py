@@ -0,0 +1,106 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracking.geofence import FenceIndex
+from tracking.location_store import KM_PER_DEGREE, haversine_km
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the geofence check every agent ping goes through, against '
+        'a target ping rate, with a scan of all fences as the baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fences', type=int, default=20000, help='Orders out for delivery')
+        parser.add_argument('--pings', type=int, default=200000)
+        parser.add_argument('--radius-m', type=int, default=75)
+        parser.add_argument('--inside', type=float, default=0.02,
+                            help='Fraction of pings inside their order\'s fence')
+        parser.add_argument('--target', type=int, default=10000, help='Pings per second to sustain')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius_km = options['radius_m'] / 1000
+
+        # Addresses clustered around a handful of city hubs, one agent per order
+        hubs = [(12.9716, 77.5946), (12.9352, 77.6245), (13.0358, 77.5970), (12.9121, 77.6446)]
+        fences = []
+        for order_id in range(1, options['fences'] + 1):
+            lat, lng = rng.choice(hubs)
+            fences.append((order_id, order_id, lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05)))
+
+        index = FenceIndex(options['radius_m'])
+        start = time.perf_counter()
+        for fence in fences:
+            index.add(*fence)
+        build = time.perf_counter() - start
+
+        pings = []
+        for _ in range(options['pings']):
+            _, agent_id, lat, lng = rng.choice(fences)
+            # Inside the fence, or somewhere on the way to it
+            distance = radius_km * rng.random() if rng.random() < options['inside'] else rng.uniform(radius_km, 3)
+            bearing = rng.uniform(0, 2 * math.pi)
+            pings.append((
+                agent_id,
+                lat + distance * math.cos(bearing) / KM_PER_DEGREE,
+                lng + distance * math.sin(bearing) / (KM_PER_DEGREE * math.cos(math.radians(lat))),
+            ))
+
+        hits = 0
+        start = time.perf_counter()
+        for agent_id, lat, lng in pings:
+            hits += len(index.hits(agent_id, lat, lng))
+        elapsed = time.perf_counter() - start
+        rate = len(pings) / elapsed
+        timings = self._time(index.hits, pings[:20000])
+
+        # Baseline: test the ping against every fence
+        def full_scan(agent_id, lat, lng):
+            return [
+                order_id for order_id, fence_agent_id, fence_lat, fence_lng in fences
+                if fence_agent_id == agent_id and haversine_km(lat, lng, fence_lat, fence_lng) <= radius_km
+            ]
+
+        baseline = self._time(full_scan, pings[:max(len(pings) // 1000, 20)])
+
+        self.stdout.write(
+            f"fences: {len(index)}  radius: {options['radius_m']} m  cell: {index.cell_size:.4f} deg  "
+            f'build: {build * 1000:.0f} ms'
+        )
+        self.stdout.write(
+            f'pings: {len(pings)}  arrivals: {hits}  '
+            f'throughput: {rate:,.0f} pings/s on one core'
+        )
+        self.stdout.write(
+            f"target {options['target']:,} pings/s: "
+            f"{'met' if rate >= options['target'] else 'missed'}, "
+            f"{options['target'] / rate:.1%} of a core"
+        )
+        self._report('grid index', timings)
+        self._report('full scan', baseline)
+        self.stdout.write(
+            f'speedup (p50): {statistics.median(baseline) / statistics.median(timings):,.0f}x'
+        )
+
+    def _time(self, fn, pings):
+        timings = []
+        for agent_id, lat, lng in pings:
+            start = time.perf_counter()
+            fn(agent_id, lat, lng)
+            timings.append((time.perf_counter() - start) * 1e6)
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{label}: p50 {statistics.median(timings):.2f} us  '
+            f'p99 {p99:.2f} us  mean {statistics.mean(timings):.2f} us'
+        )
@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from tracking.location_store import (
+    InMemoryLocationStore,
+    RedisLocationStore,
+    haversine_km,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nearest-k agent lookups in the live location store.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--backend', choices=['memory', 'redis'], default='memory')
+        parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['backend'] == 'redis':
+            store = RedisLocationStore(url=options['redis_url'], prefix='zotpot:bench')
+            store.client.delete(*[store._key(name) for name in ('geo', 'geo:avail', 'seen', 'loc', 'dirty')])
+        else:
+            store = InMemoryLocationStore()
+
+        # Agents clustered around a handful of city hubs
+        hubs = [(12.9716, 77.5946), (12.9352, 77.6245), (13.0358, 77.5970), (12.9121, 77.6446)]
+        positions = {}
+        start = time.perf_counter()
+        for agent_id in range(1, options['agents'] + 1):
+            lat, lng = rng.choice(hubs)
+            location = {
+                'latitude': lat + rng.gauss(0, 0.05),
+                'longitude': lng + rng.gauss(0, 0.05),
+            }
+            positions[agent_id] = location
+            store.update(agent_id, location, available=rng.random() < 0.6)
+        ingest = time.perf_counter() - start
+
+        queries = []
+        for _ in range(options['queries']):
+            lat, lng = rng.choice(hubs)
+            queries.append((lat + rng.gauss(0, 0.05), lng + rng.gauss(0, 0.05)))
+
+        indexed = self._time_queries(
+            lambda lat, lng: store.nearest(lat, lng, k=options['k'], available_only=False),
+            queries,
+        )
+
+        # Baseline: load every agent and sort in Python, as the JSONField
+        # column forces today
+        def full_scan(lat, lng):
+            return sorted(
+                (haversine_km(lat, lng, loc['latitude'], loc['longitude']), agent_id)
+                for agent_id, loc in positions.items()
+            )[:options['k']]
+
+        baseline = self._time_queries(full_scan, queries[:max(len(queries) // 20, 10)])
+
+        self.stdout.write(f"backend: {options['backend']}  agents: {options['agents']}  k: {options['k']}")
+        self.stdout.write(f'ingest: {options["agents"] / ingest:,.0f} updates/s')
+        self._report('nearest-k (store)', indexed)
+        self._report('nearest-k (full scan)', baseline)
+        self.stdout.write(
+            f'speedup (p50): {statistics.median(baseline) / statistics.median(indexed):.1f}x'
+        )
+
+    def _time_queries(self, fn, queries):
+        timings = []
+        for lat, lng in queries:
+            start = time.perf_counter()
+            fn(lat, lng)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{label}: p50 {statistics.median(timings):.3f} ms  '
+            f'p99 {p99:.3f} ms  mean {statistics.mean(timings):.3f} ms'
+        )
@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/tracking/order/(?P<order_id>\w+)/$', consumers.LocationTrackingConsumer.as_asgi()),
-] 
\ No newline at end of file
+    re_path(r'ws/tracking/agent/$', consumers.AgentLocationConsumer.as_asgi()),
+]
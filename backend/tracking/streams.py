@@ -0,0 +1,186 @@
+"""
+Sequence numbers and replay buffers for order socket streams.
+
+Every frame published to an ``order_{id}`` group (agent locations from
+``fan_out_location``, order events from the outbox relay) is stamped with
+the next number of that order's sequence and kept in a bounded per-order
+buffer of the last ``size`` frames, in memory or in Redis.
+
+A client connecting with ``?last_seq=N`` (``0`` on its first connect) is
+sent what it has not seen before any live frame: the order events after
+``N`` and the newest location after ``N`` (older positions are
+superseded), then a ``replayed`` frame carrying the order's current
+``seq``. When frames after ``N`` have already left the buffer, or the
+sequence is unknown, it gets a ``snapshot`` frame instead, with the same
+``seq``. An open socket can ask again with a ``{"type": "resume",
+"last_seq": N}`` text frame.
+
+Sequence numbers are unique per order but the frames are not sent in
+order: the socket and REST pings and the Celery relay each stamp a frame
+and then send it, so a location stamped ``N + 1`` can overtake an order
+event stamped ``N``. Clients therefore keep a watermark, the ``seq`` up to
+which they have seen every frame (set from ``replayed`` and ``snapshot``
+frames), and the ``seq``s seen above it:
+
+- a frame at or below the watermark, or already seen, is a repeat and is
+  dropped; any other is applied, a location only when its ``seq`` is above
+  the newest location applied, and order events are also deduplicated by
+  their event ``id``;
+- the watermark moves up while the next ``seq`` has been seen;
+- a gap that stays open for a few seconds, or a reconnect, is filled by
+  resuming from the watermark.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseStreamBuffer:
+    """Interface shared by the stream buffer backends."""
+
+    io_bound = False  # Whether calls should be kept off the event loop
+
+    def __init__(self, size=100, ttl=6 * 60 * 60):
+        self.size = size
+        self.ttl = ttl  # Seconds an order's stream is kept after its last frame
+
+    def append(self, order_id, message):
+        """Stamp ``message`` with the order's next sequence number, keep it and return it."""
+        raise NotImplementedError
+
+    def since(self, order_id, last_seq):
+        """
+        ``(messages, current_seq)``: the kept messages after ``last_seq``,
+        with messages ``None`` when some of them are no longer kept.
+        """
+        raise NotImplementedError
+
+
+class InMemoryStreamBuffer(BaseStreamBuffer):
+    """Per-process buffers; only for a single process with the in-memory channel layer."""
+
+    def __init__(self, size=100, ttl=6 * 60 * 60, max_orders=10000):
+        super().__init__(size=size, ttl=ttl)
+        self.max_orders = max_orders
+        self._streams = OrderedDict()  # order id -> [last seq, frames, last append]
+        self._lock = threading.Lock()
+
+    def append(self, order_id, message):
+        now = time.monotonic()
+        with self._lock:
+            stream = self._streams.pop(order_id, None)
+            if stream is None or now - stream[2] > self.ttl:
+                stream = [0, deque(maxlen=self.size), now]
+            stream[0] += 1
+            stream[2] = now
+            message = dict(message, seq=stream[0])
+            stream[1].append(message)
+            self._streams[order_id] = stream
+            while len(self._streams) > self.max_orders:
+                self._streams.popitem(last=False)
+        return message
+
+    def since(self, order_id, last_seq):
+        with self._lock:
+            stream = self._streams.get(order_id)
+            if stream is None or time.monotonic() - stream[2] > self.ttl:
+                return _after([], last_seq, 0), 0
+            current, frames = stream[0], list(stream[1])
+        return _after(frames, last_seq, current), current
+
+
+class RedisStreamBuffer(BaseStreamBuffer):
+    """
+    Buffers in Redis, shared by the ASGI and Celery processes.
+
+    Keys (under ``prefix``): ``{order_id}:seq`` holds the last sequence
+    number and ``{order_id}:frames`` a sorted set of ``"seq:json"`` members
+    scored by sequence number.
+    """
+
+    io_bound = True
+
+    APPEND_SCRIPT = """
+        local seq = redis.call('INCR', KEYS[1])
+        redis.call('ZADD', KEYS[2], seq, seq .. ':' .. ARGV[1])
+        redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        redis.call('EXPIRE', KEYS[2], ARGV[3])
+        return seq
+    """
+
+    def __init__(self, size=100, ttl=6 * 60 * 60, url=None, prefix='zotpot:streams', client=None):
+        super().__init__(size=size, ttl=ttl)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.prefix = prefix
+        self._append = client.register_script(self.APPEND_SCRIPT)
+
+    def _keys(self, order_id):
+        return [f'{self.prefix}:{order_id}:seq', f'{self.prefix}:{order_id}:frames']
+
+    def append(self, order_id, message):
+        seq = self._append(
+            keys=self._keys(order_id),
+            args=[json.dumps(message), self.size, self.ttl],
+        )
+        return dict(message, seq=int(seq))
+
+    def since(self, order_id, last_seq):
+        seq_key, frames_key = self._keys(order_id)
+        pipe = self.client.pipeline()
+        pipe.get(seq_key)
+        pipe.zrangebyscore(frames_key, f'({last_seq}', '+inf')
+        current, members = pipe.execute()
+        current = int(current or 0)
+        frames = []
+        for member in members:
+            if isinstance(member, bytes):
+                member = member.decode()
+            seq, _, payload = member.partition(':')
+            frames.append(dict(json.loads(payload), seq=int(seq)))
+        return _after(frames, last_seq, current), current
+
+
+def _after(frames, last_seq, current):
+    if last_seq > current:
+        # From a sequence that has since expired and restarted
+        return None
+    missed = [frame for frame in frames if frame['seq'] > last_seq]
+    if len(missed) < current - last_seq:
+        return None
+    return missed
+
+
+def replay_messages(missed):
+    """The messages to resend of those missed: every order event, the newest location."""
+    locations = [message for message in missed if message['type'] == 'location_update']
+    return [
+        message for message in missed
+        if message['type'] != 'location_update' or message is locations[-1]
+    ]
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_stream_buffer():
+    """Return the process-wide buffer configured by ``settings.ORDER_STREAM``."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = getattr(settings, 'ORDER_STREAM', {})
+                backend = import_string(
+                    config.get('BACKEND', 'tracking.streams.InMemoryStreamBuffer')
+                )
+                _buffer = backend(**config.get('OPTIONS', {}))
+    return _buffer
@@ -0,0 +1,39 @@
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.utils import timezone
+from .fanout import fan_out_location, held_location
+from .location_store import get_location_store
+
+@shared_task(database='primary')
+def checkpoint_agent_locations():
+    """Write live agent positions back to the database and drop stale ones from the store."""
+    from users.models import DeliveryAgent  # Import here to avoid circular import
+
+    store = get_location_store()
+    locations = store.pop_dirty()
+    # Agents that went offline would otherwise stay in the store for good
+    store.expire_stale()
+    if not locations:
+        return 0
+
+    now = timezone.now()
+    agents = list(DeliveryAgent.objects.filter(user_id__in=locations.keys()))
+    for agent in agents:
+        agent.current_location = locations[agent.user_id]
+        agent.updated_at = now  # bulk_update skips auto_now
+
+    DeliveryAgent.objects.bulk_update(agents, ['current_location', 'updated_at'], batch_size=500)
+    return len(agents)
+
+@shared_task
+def flush_held_location(order_id):
+    """Send the newest location frame held back by an order group's rate limit."""
+    event = held_location(order_id)
+    if event is None:
+        return 0
+    # A frame sent since took the group's slot and is newer; drop this one
+    sent = async_to_sync(fan_out_location)(
+        get_channel_layer(), event['user_id'], event['location'], [order_id], hold=False
+    )
+    return len(sent)
@@ -0,0 +1,5 @@
+from django.urls import path
+
+# REST endpoints for tracking live under orders/ and auth/delivery-agents/;
+# the live feed is served over the websocket routes in routing.py.
+urlpatterns = []
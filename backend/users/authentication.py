@@ -0,0 +1,172 @@
+"""
+JWT authentication for WebSocket connections and async HTTP views.
+
+Sockets authenticate with the same SimpleJWT access tokens as the REST API,
+passed either as ``?token=<jwt>`` or as a ``bearer.<jwt>`` entry in
+``Sec-WebSocket-Protocol`` (clients doing this must also offer a real
+subprotocol, e.g. ``zotpot.tracking.json.v1``, for the server to echo).
+
+Users are resolved through a short-lived principal cache keyed by the
+token's user id, so a reconnect storm after a deploy costs one query per
+user rather than one per socket.
+"""
+
+import threading
+import time
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+BEARER_SUBPROTOCOL_PREFIX = 'bearer.'
+PRINCIPAL_FIELDS = (
+    'id',
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'role',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+
+
+class PrincipalCache:
+    """
+    Two-level cache of user principals: a per-process TTL table in front of
+    the shared Django cache, with one in-flight database load per user.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'WEBSOCKET_PRINCIPAL_CACHE_TTL', 60)
+        self._local = {}
+        # Striped locks: concurrent loads of one user serialize, others don't
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def _cache_key(self, user_id):
+        return f'principal:{user_id}'
+
+    def get(self, user_id):
+        entry = self._local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return self._build(entry[1])
+
+        # Concurrent reconnects for the same user wait for a single load
+        with self._locks[hash(user_id) % len(self._locks)]:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                return self._build(entry[1])
+
+            fields = cache.get(self._cache_key(user_id))
+            if fields is None:
+                fields = (
+                    User.objects.filter(id=user_id, is_active=True)
+                    .values(*PRINCIPAL_FIELDS)
+                    .first()
+                )
+                if fields is None:
+                    return None
+                cache.set(self._cache_key(user_id), fields, self.ttl)
+
+            self._remember(user_id, fields)
+        return self._build(fields)
+
+    async def aget(self, user_id):
+        """``get`` for async views: a local hit never leaves the event loop."""
+        entry = self._local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return self._build(entry[1])
+
+        fields = await cache.aget(self._cache_key(user_id))
+        if fields is None:
+            fields = await (
+                User.objects.filter(id=user_id, is_active=True)
+                .values(*PRINCIPAL_FIELDS)
+                .afirst()
+            )
+            if fields is None:
+                return None
+            await cache.aset(self._cache_key(user_id), fields, self.ttl)
+
+        self._remember(user_id, fields)
+        return self._build(fields)
+
+    def _remember(self, user_id, fields):
+        now = time.monotonic()
+        if len(self._local) > 10000:
+            self._local = {
+                key: value for key, value in self._local.items() if value[0] > now
+            }
+        self._local[user_id] = (now + self.ttl, fields)
+
+    def invalidate(self, user_id):
+        self._local.pop(user_id, None)
+        cache.delete(self._cache_key(user_id))
+
+    def _build(self, fields):
+        # An unsaved-looking instance built from cached columns; enough for
+        # permission checks without touching the users table.
+        user = User(**fields)
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
+
+
+principal_cache = PrincipalCache()
+
+
+def user_for_token(raw_token):
+    """Validate an access token and return its user, or ``AnonymousUser``."""
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return AnonymousUser()
+
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return AnonymousUser()
+    return principal_cache.get(user_id) or AnonymousUser()
+
+
+def extract_token(scope):
+    """Return ``(token, subprotocols)`` with any bearer entry removed."""
+    subprotocols = []
+    token = None
+    for subprotocol in scope.get('subprotocols', []):
+        if subprotocol.startswith(BEARER_SUBPROTOCOL_PREFIX):
+            token = subprotocol[len(BEARER_SUBPROTOCOL_PREFIX):]
+        else:
+            subprotocols.append(subprotocol)
+
+    if token is None:
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token = query.get('token', [None])[0]
+    return token, subprotocols
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populate ``scope['user']`` from a SimpleJWT access token, if one is sent."""
+
+    async def __call__(self, scope, receive, send):
+        token, subprotocols = extract_token(scope)
+        if token:
+            scope = dict(scope, subprotocols=subprotocols)
+            scope['user'] = await database_sync_to_async(user_for_token)(token)
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    # Session auth runs first so browser admin sockets keep working; a token
+    # sent on the connection takes precedence.
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class User(AbstractUser):
@@ -23,7 +24,11 @@ class User(AbstractUser):
         blank=True
     )
     is_active = models.BooleanField(default=True)
+    # Firebase Cloud Messaging token of the user's device, for push notifications
+    fcm_token = models.CharField(max_length=255, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Validates cached order responses that nest the user (core/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -52,10 +57,29 @@ class DeliveryAgent(models.Model):
         default=0.00
     )
     total_deliveries = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.vehicle_number}"
 
+    @classmethod
+    def find_available(cls, address=None, candidates=10):
+        """Closest available agent to the address, falling back to the least busy one."""
+        from tracking.location_store import get_location_store
+
+        available = cls.objects.filter(is_available=True).select_related('user')
+        if address is not None and address.latitude is not None and address.longitude is not None:
+            nearest = get_location_store().nearest(
+                float(address.latitude), float(address.longitude), k=candidates
+            )
+            if nearest:
+                agents = available.in_bulk([agent_id for agent_id, _ in nearest], field_name='user_id')
+                for agent_id, _ in nearest:
+                    if agent_id in agents:
+                        return agents[agent_id]
+
+        return available.order_by('total_deliveries').first()
+
 class Address(models.Model):
     user = models.ForeignKey(
         User,
@@ -82,6 +106,7 @@ class Address(models.Model):
         null=True,
         blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = _('address')
@@ -93,5 +118,5 @@ class Address(models.Model):
     def save(self, *args, **kwargs):
         if self.is_default:
             # Set all other addresses of the user as non-default
-            Address.objects.filter(user=self.user).update(is_default=False)
+            Address.objects.filter(user=self.user).update(is_default=False, updated_at=timezone.now())
         super().save(*args, **kwargs) 
\ No newline at end of file
@@ -20,6 +20,7 @@ class UserSerializer(serializers.ModelSerializer):
     addresses = AddressSerializer(many=True, read_only=True)
     delivery_profile = DeliveryAgentSerializer(read_only=True)
     password = serializers.CharField(write_only=True, required=False)
+    fcm_token = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = User
@@ -33,6 +34,7 @@ class UserSerializer(serializers.ModelSerializer):
             'role',
             'avatar',
             'password',
+            'fcm_token',
             'addresses',
             'delivery_profile',
             'date_joined',
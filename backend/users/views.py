@@ -3,10 +3,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import get_user_model
+from core.throttling import TRACKING
+from tracking.ingest import (
+    MAX_BATCH_PINGS,
+    publish_agent_location,
+    record_agent_location,
+    record_agent_locations,
+)
+from tracking.location_store import get_location_store
 from .models import DeliveryAgent, Address
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
+    DeliveryAgentSerializer,
     DeliveryAgentRegistrationSerializer,
     AddressSerializer,
     PasswordChangeSerializer,
@@ -78,17 +87,97 @@ class DeliveryAgentViewSet(viewsets.ModelViewSet):
     queryset = DeliveryAgent.objects.all()
     serializer_class = DeliveryAgentSerializer
     permission_classes = [IsAuthenticated]
+    priority_classes = {'update_location': TRACKING, 'upload_locations': TRACKING}
 
     @action(detail=False, methods=['patch'])
     def update_location(self, request):
         agent = request.user.delivery_profile
-        agent.current_location = request.data.get('location')
-        agent.save()
+        location = request.data.get('location')
+
+        # Positions go to the live store; the database copy is checkpointed
+        # periodically by tracking.tasks.checkpoint_agent_locations
+        order_ids = record_agent_location(
+            request.user.id, location, available=agent.is_available
+        )
+        if order_ids is None:
+            return Response(
+                {'error': 'Location must include valid latitude and longitude'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Publish once; the server fans out to each active order's group
+        publish_agent_location(request.user.id, location, order_ids)
+
+        agent.current_location = location
         return Response(self.get_serializer(agent).data)
 
+    @action(detail=False, methods=['post'])
+    def upload_locations(self, request):
+        """
+        Pings buffered while offline, as a list of locations with a
+        ``timestamp`` (epoch seconds or ISO 8601), bare or under ``pings``.
+        """
+        agent = request.user.delivery_profile
+        pings = request.data if isinstance(request.data, list) else request.data.get('pings')
+        if not isinstance(pings, list) or not 0 < len(pings) <= MAX_BATCH_PINGS:
+            return Response(
+                {'error': f'pings must be a list of 1 to {MAX_BATCH_PINGS} locations'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = record_agent_locations(request.user.id, pings, available=agent.is_available)
+        # One frame with the newest position, not one per ping
+        if result['latest'] is not None:
+            publish_agent_location(request.user.id, result['latest'], result['order_ids'])
+
+        return Response({
+            'accepted': result['accepted'],
+            'duplicates': result['duplicates'],
+            'out_of_order': result['out_of_order'],
+            'invalid': result['invalid'],
+        })
+
     @action(detail=False, methods=['patch'])
     def toggle_availability(self, request):
         agent = request.user.delivery_profile
         agent.is_available = not agent.is_available
         agent.save()
-        return Response(self.get_serializer(agent).data) 
\ No newline at end of file
+        get_location_store().set_available(request.user.id, agent.is_available)
+        return Response(self.get_serializer(agent).data)
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        try:
+            latitude = float(request.query_params['latitude'])
+            longitude = float(request.query_params['longitude'])
+            radius_km = request.query_params.get('radius_km')
+            radius_km = float(radius_km) if radius_km else None
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'latitude and longitude are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            k = max(1, min(int(request.query_params.get('k', 5)), 50))
+        except ValueError:
+            return Response(
+                {'error': 'k must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store = get_location_store()
+        nearest = store.nearest(latitude, longitude, k=k, radius_km=radius_km)
+        agents = DeliveryAgent.objects.select_related('user').in_bulk(
+            [agent_id for agent_id, _ in nearest], field_name='user_id'
+        )
+
+        results = []
+        for agent_id, distance in nearest:
+            agent = agents.get(agent_id)
+            if agent is None:
+                continue
+            agent.current_location = store.get(agent_id)
+            data = self.get_serializer(agent).data
+            data['distance_km'] = round(distance, 3)
+            results.append(data)
+        return Response(results) 
\ No newline at end of file
@@ -5,14 +5,17 @@ ASGI config for zotpot project.
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from tracking.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zotpot.settings')
+django_asgi_app = get_asgi_application()
+
+# Imported after Django is set up, as they load models
+from users.authentication import JWTAuthMiddlewareStack  # noqa: E402
+from tracking.routing import websocket_urlpatterns  # noqa: E402
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": django_asgi_app,
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
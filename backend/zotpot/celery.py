@@ -14,6 +14,10 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Record per-task metrics and route task reads (database='replica'/'primary')
+import core.celery_signals  # noqa: E402,F401
+import core.db_router  # noqa: E402,F401
+
 # Configure periodic tasks
 app.conf.beat_schedule = {
     'check-pending-orders': {
@@ -24,6 +28,34 @@ app.conf.beat_schedule = {
         'task': 'orders.tasks.update_delivery_status',
         'schedule': crontab(minute='*/2'),  # Run every 2 minutes
     },
+    'checkpoint-agent-locations': {
+        'task': 'tracking.tasks.checkpoint_agent_locations',
+        'schedule': 30.0,  # Run every 30 seconds
+    },
+    'aggregate-stock-shards': {
+        'task': 'products.tasks.aggregate_stock_shards',
+        'schedule': 5.0,  # Bounds how stale a sharded product's stock is
+    },
+    'relay-order-events': {
+        'task': 'orders.tasks.relay_order_events',
+        'schedule': 5.0,  # Backstop; committed events kick the relay themselves
+    },
+    'prune-order-events': {
+        'task': 'orders.tasks.prune_order_events',
+        'schedule': crontab(minute=15),  # Run hourly
+    },
+    'archive-finished-orders': {
+        'task': 'orders.tasks.archive_finished_orders',
+        'schedule': crontab(hour=3, minute=0),  # Run nightly
+    },
+    'maintain-tracking-partitions': {
+        'task': 'orders.tasks.maintain_tracking_partitions',
+        'schedule': crontab(hour=3, minute=30),  # Run nightly, after archiving
+    },
+    'prune-catalog-tombstones': {
+        'task': 'products.tasks.prune_catalog_tombstones',
+        'schedule': crontab(hour=4, minute=0),  # Run nightly
+    },
 }
 
 @app.task(bind=True)
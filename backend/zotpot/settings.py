@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 import environ
+from corsheaders.defaults import default_headers
 
 # Initialize environment variables
 env = environ.Env()
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
     'channels',
     'storages',
     # Local apps
+    'core',
     'users',
     'orders',
     'products',
@@ -43,9 +45,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.throttling.LoadMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +91,45 @@ DATABASES = {
         'PORT': env('POSTGRES_PORT', default='5432'),
     }
 }
+if env('DATABASE_URL', default=None):
+    DATABASES['default'] = env.db('DATABASE_URL')
+
+# Read replicas, as comma-separated database URLs; see core/db_router.py
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica_{index}'] = dict(env.db_url_config(url), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+# Per-process connection pooling for PostgreSQL; see core/db_pool.py. Off
+# until manage.py bench_db_pool has been run against the production database
+if env.bool('DB_POOL_ENABLED', default=False):
+    DATABASE_POOL = {
+        'MAX_SIZE': env.int('DB_POOL_MAX_SIZE', default=10),
+        'MIN_IDLE': env.int('DB_POOL_MIN_IDLE', default=0),
+        'TIMEOUT': env.float('DB_POOL_TIMEOUT', default=10.0),
+        'MAX_LIFETIME': env.float('DB_POOL_MAX_LIFETIME', default=1800.0),
+        'MAX_IDLE': env.float('DB_POOL_MAX_IDLE', default=300.0),
+        'CHECK_AFTER': env.float('DB_POOL_CHECK_AFTER', default=30.0),
+    }
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.postgresql':
+            database.update(ENGINE='core.postgresql_pool', POOL=DATABASE_POOL, CONN_MAX_AGE=0)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Seconds a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=5)
+
+# Cache, shared by all processes (replica pins, websocket principals,
+# agents' active orders)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env(
+            'CACHE_URL',
+            default=f"redis://{env('REDIS_HOST', default='localhost')}:6379/3"
+        ),
+    },
+}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -132,8 +176,37 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed JSON when installed; see core/renderers.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.PriorityThrottle',
+    ),
+}
+
+# Rate limits per priority class and load shedding; see core/throttling.py
+RATE_LIMIT_URL = env(
+    'RATE_LIMIT_URL',
+    default=f"redis://{env('REDIS_HOST', default='localhost')}:6379/4"
+)
+RATE_LIMITS = {
+    'checkout': {'rate': env('RATE_LIMIT_CHECKOUT', default='30/min'), 'burst': 10},
+    'tracking': {'rate': env('RATE_LIMIT_TRACKING', default='60/min'), 'burst': 10},
+    'browsing': {'rate': env('RATE_LIMIT_BROWSING', default='120/min'), 'burst': 40},
+}
+LOAD_SHEDDING = {
+    'MAX_IN_FLIGHT': env.int('LOAD_SHEDDING_MAX_IN_FLIGHT', default=200),
+    'MAX_LOOP_LAG': env.float('LOAD_SHEDDING_MAX_LOOP_LAG', default=0.2),
+    'SHED_AT': {'browsing': 0.7, 'tracking': 0.9},
 }
 
 # JWT settings
@@ -144,9 +217,14 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Seconds a websocket principal (user resolved from a JWT) is cached
+WEBSOCKET_PRINCIPAL_CACHE_TTL = 60
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Change this in production
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'if-none-match', 'if-modified-since')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed', 'ETag']
 
 # Channels settings
 CHANNEL_LAYERS = {
@@ -158,6 +236,60 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Metrics
+# Redis URL where each process publishes its metrics for the metrics endpoint
+METRICS_SHARED_URL = env(
+    'METRICS_SHARED_URL',
+    default=f"redis://{env('REDIS_HOST', default='localhost')}:6379/2"
+)
+METRICS_PUBLISH_INTERVAL = 15  # Seconds
+METRICS_SLOW_QUERY_MS = env.int('METRICS_SLOW_QUERY_MS', default=100)
+# Log slow queries for every request, not only staff ones sending X-Slow-Query-Log
+METRICS_SLOW_QUERY_LOG = env.bool('METRICS_SLOW_QUERY_LOG', default=False)
+
+# Live delivery agent locations
+LOCATION_STORE = {
+    'BACKEND': env(
+        'LOCATION_STORE_BACKEND',
+        default='tracking.location_store.RedisLocationStore'
+    ),
+    'OPTIONS': {
+        'ttl': env.int('LOCATION_STORE_TTL', default=120),  # Seconds before a ping is stale
+    },
+}
+if LOCATION_STORE['BACKEND'].endswith('RedisLocationStore'):
+    LOCATION_STORE['OPTIONS']['url'] = env(
+        'LOCATION_STORE_URL',
+        default=f"redis://{env('REDIS_HOST', default='localhost')}:6379/1"
+    )
+
+# Numbered frames of each order's socket group, replayed to reconnecting
+# clients; see tracking/streams.py
+ORDER_STREAM = {
+    'BACKEND': env(
+        'ORDER_STREAM_BACKEND',
+        default='tracking.streams.RedisStreamBuffer'
+    ),
+    'OPTIONS': {
+        'size': env.int('ORDER_STREAM_SIZE', default=100),  # Frames kept per order
+        'ttl': 6 * 60 * 60,  # Seconds an order's stream outlives its last frame
+    },
+}
+if ORDER_STREAM['BACKEND'].endswith('RedisStreamBuffer'):
+    ORDER_STREAM['OPTIONS']['url'] = env(
+        'ORDER_STREAM_URL',
+        default=f"redis://{env('REDIS_HOST', default='localhost')}:6379/1"
+    )
+
+# Minimum seconds between location frames sent to one order group, counted
+# in the RATE_LIMIT_URL buckets; the newest frame held back is sent after it
+TRACKING_GROUP_MIN_INTERVAL = env.float('TRACKING_GROUP_MIN_INTERVAL', default=1.0)
+# Seconds an agent's active order list is cached for fan-out
+TRACKING_AGENT_ORDERS_TTL = 30
+# Arrival fences around delivery addresses; see tracking/geofence.py
+GEOFENCE_RADIUS_M = env.int('GEOFENCE_RADIUS_M', default=75)
+GEOFENCE_REFRESH_SECONDS = 10  # How often each process reloads the fences
+
 # Celery settings
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -165,6 +297,52 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Seconds a periodic task's "running" marker lives; runs longer than this
+# are no longer reported as overlapping
+CELERY_TASK_OVERLAP_TIMEOUT = 3600
+
+# Idempotency-Key handling for retried POSTs; see core/idempotency.py
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60)
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # Seconds before a crashed attempt's claim expires
+IDEMPOTENCY_WAIT = 10  # Seconds a duplicate waits for the attempt in progress
+
+# Order history: cold archive and tracking partitions; see orders/archive.py
+# and orders/partitions.py
+# Segments are written by Celery and read by every web node: keep them in a
+# private bucket (ORDER_ARCHIVE_BUCKET), or in a local directory on one host
+if env('ORDER_ARCHIVE_BUCKET', default=None):
+    ORDER_ARCHIVE_STORAGE = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': env('ORDER_ARCHIVE_BUCKET'),
+            'location': 'orders',
+            'default_acl': 'private',
+            'file_overwrite': False,
+        },
+    }
+else:
+    ORDER_ARCHIVE_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': env('ORDER_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive', 'orders')),
+        },
+    }
+ORDER_ARCHIVE_AFTER_DAYS = env.int('ORDER_ARCHIVE_AFTER_DAYS', default=90)
+ORDER_ARCHIVE_BATCH_LIMIT = env.int('ORDER_ARCHIVE_BATCH_LIMIT', default=50000)  # Orders per nightly run
+TRACKING_PARTITION_MONTHS_AHEAD = 2
+TRACKING_PARTITION_KEEP_MONTHS = env.int('TRACKING_PARTITION_KEEP_MONTHS', default=3)
+
+# Order event outbox relayed to sockets and notifications; see orders/events.py
+ORDER_EVENT_RELAY_BATCH = 200  # Events per relay transaction
+ORDER_EVENT_KICK_TIMEOUT = 5  # Seconds before a lost relay kick can be queued again
+ORDER_EVENT_KEEP_HOURS = env.int('ORDER_EVENT_KEEP_HOURS', default=24)  # Relayed events kept for inspection
+ORDER_PUSH_MAX_RETRIES = 5  # Retries of a push failing with a transient FCM error
+ORDER_PUSH_RETRY_DELAY = 30  # Seconds before the first retry, doubled after each
+
+# Catalog delta sync for the app; see products/sync.py
+CATALOG_SYNC_PAGE_SIZE = 500  # Products per sync response
+CATALOG_SYNC_LAG = 60  # Seconds of changes each sync repeats, for writes committed late
+CATALOG_SYNC_RETENTION_DAYS = env.int('CATALOG_SYNC_RETENTION_DAYS', default=30)  # Older tokens get the whole catalog
 
 # Stripe settings
 STRIPE_PUBLIC_KEY = env('STRIPE_PUBLIC_KEY', default='')
@@ -0,0 +1,48 @@
+"""
+Settings for the bundled load-test harness (``manage.py loadtest``).
+
+Runs against a local SQLite file by default, or the database in
+``LOADTEST_DATABASE_URL`` (e.g. a local Postgres), with in-memory channel
+layer, cache, location store and order stream buffer so no Redis is needed.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, env
+
+DEBUG = False
+
+DATABASES = {
+    'default': env.db('LOADTEST_DATABASE_URL', default=f'sqlite:///{BASE_DIR / "loadtest.sqlite3"}'),
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+LOCATION_STORE = {
+    'BACKEND': 'tracking.location_store.InMemoryLocationStore',
+    'OPTIONS': {'ttl': 120},
+}
+
+ORDER_STREAM = {
+    'BACKEND': 'tracking.streams.InMemoryStreamBuffer',
+    'OPTIONS': {'size': 100},
+}
+
+# Every frame should reach the group so round trips can be timed
+TRACKING_GROUP_MIN_INTERVAL = 0
+
+METRICS_SHARED_URL = None
+
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# Seeding creates many users; hashing strength is irrelevant here
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -22,6 +22,7 @@ urlpatterns = [
         path('products/', include('products.urls')),
         path('orders/', include('orders.urls')),
         path('tracking/', include('tracking.urls')),
+        path('', include('core.urls')),
     ])),
 ]
 
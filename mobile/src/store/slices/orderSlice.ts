@@ -17,7 +17,7 @@ export interface Order {
   id: string;
   items: OrderItem[];
   total: number;
-  status: 'pending' | 'confirmed' | 'preparing' | 'out_for_delivery' | 'delivered' | 'cancelled';
+  status: 'pending' | 'confirmed' | 'preparing' | 'out_for_delivery' | 'arrived' | 'delivered' | 'cancelled';
   deliveryLocation: Location;
   deliveryAgent?: {
     id: string;